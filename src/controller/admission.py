@@ -0,0 +1,121 @@
+"""
+Admission control for PACKET_IN.
+
+A flooding host or a forwarding loop can send PACKET_INs faster than the
+controller handles them. Every PACKET_IN has to pass a token bucket for
+its switch and one for its ingress port before it is handled, so a
+single port cannot use up its switch's share and a single switch cannot
+starve the others. Repeated misses for the same unicast (src, dst) are
+coalesced while the first one's flood is still in flight; frames to a
+group address are distinct frames (ARP requests, DHCP, ...) and are
+never coalesced.
+"""
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+# PACKET_INs per second (and burst) admitted from one switch
+DATAPATH_RATE = 10_000
+DATAPATH_BURST = 2_000
+# PACKET_INs per second (and burst) admitted from one ingress port
+PORT_RATE = 2_000
+PORT_BURST = 500
+# an identical miss within this many seconds of the first one is dropped
+COALESCE_SECONDS = 0.1
+# cap on remembered pending misses
+MAX_PENDING_MISSES = 65536
+
+
+class TokenBucket:
+    """Allows `rate` events per second with bursts of up to `burst`"""
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = now
+
+    def take(self, now: float) -> bool:
+        tokens = self.tokens + (now - self.last) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        self.last = now
+        if tokens >= 1:
+            self.tokens = tokens - 1
+            return True
+        self.tokens = tokens
+        return False
+
+
+@dataclass
+class AdmissionStats:
+    admitted: int = 0
+    # dropped by the switch's bucket
+    dropped_datapath: int = 0
+    # dropped by the ingress port's bucket
+    dropped_port: int = 0
+    # identical misses dropped while the first one was pending
+    coalesced: int = 0
+
+
+class AdmissionControl:
+    def __init__(self, datapath_rate=DATAPATH_RATE, datapath_burst=DATAPATH_BURST,
+                 port_rate=PORT_RATE, port_burst=PORT_BURST, coalesce_seconds=COALESCE_SECONDS):
+        self.datapath_rate = datapath_rate
+        self.datapath_burst = datapath_burst
+        self.port_rate = port_rate
+        self.port_burst = port_burst
+        self.coalesce_seconds = coalesce_seconds
+        self.stats = AdmissionStats()
+        self._datapaths: dict[Hashable, TokenBucket] = {}
+        self._ports: dict[tuple[Hashable, int], TokenBucket] = {}
+        # (dpid, src, dst) -> time of the first miss, oldest first
+        self._pending: dict[tuple, float] = {}
+
+    def admit(self, dpid: Optional[Hashable], in_port: int, now: float) -> bool:
+        """Take a token for the switch and the ingress port; False to drop the PACKET_IN"""
+        port_bucket = self._ports.get((dpid, in_port))
+        if port_bucket is None:
+            port_bucket = self._ports[(dpid, in_port)] = TokenBucket(self.port_rate, self.port_burst, now)
+        if not port_bucket.take(now):
+            self.stats.dropped_port += 1
+            return False
+        dp_bucket = self._datapaths.get(dpid)
+        if dp_bucket is None:
+            dp_bucket = self._datapaths[dpid] = TokenBucket(self.datapath_rate, self.datapath_burst, now)
+        if not dp_bucket.take(now):
+            self.stats.dropped_datapath += 1
+            return False
+        self.stats.admitted += 1
+        return True
+
+    def first_miss(self, dpid: Optional[Hashable], src, dst, now: float) -> bool:
+        """
+        Record a miss (unknown or group destination) for (src, dst).
+        False if the same miss is already pending and this one can be dropped;
+        always True for a group (broadcast/multicast) dst.
+        """
+        if dst[0] & 1:
+            return True
+        pending = self._pending
+        # forget misses older than the window; the dict is in arrival order
+        horizon = now - self.coalesce_seconds
+        while pending:
+            oldest = next(iter(pending))
+            if pending[oldest] > horizon and len(pending) < MAX_PENDING_MISSES:
+                break
+            del pending[oldest]
+        key = (dpid, src, dst)
+        if key in pending:
+            self.stats.coalesced += 1
+            return False
+        pending[key] = now
+        return True
+
+    def forget(self, dpid: Hashable):
+        """Drop the buckets and pending misses of a disconnected switch"""
+        self._datapaths.pop(dpid, None)
+        for key in [k for k in self._ports if k[0] == dpid]:
+            del self._ports[key]
+        for key in [k for k in self._pending if k[0] == dpid]:
+            del self._pending[key]
@@ -0,0 +1,143 @@
+import socket
+import time
+
+from src.openflow.framer import MessageFramer
+
+# stop reading from a switch once this much output is queued for it...
+HIGH_WATERMARK = 1 << 20
+# ...and resume once it has drained below this
+LOW_WATERMARK = 256 << 10
+# most buffers a single sendmsg() accepts (IOV_MAX on Linux and macOS)
+IOV_MAX = 1024
+
+
+class Connection:
+    """
+    One switch connection driven by the controller event loop.
+
+    The socket is non-blocking: reads return every complete OpenFlow
+    message currently buffered. send() only queues output; the event loop
+    flushes each connection once per iteration, so every reply produced
+    while one input batch is handled goes out in a single sendmsg().
+    With pending given, the connection adds itself to that set when it
+    has queued output; without it, send() flushes immediately.
+    """
+
+    def __init__(self, sock: socket.socket, addr, pending=None,
+                 high_watermark=HIGH_WATERMARK, low_watermark=LOW_WATERMARK):
+        self.sock = sock
+        self.addr = addr
+        self.closed = False
+        # set from the FEATURES_REPLY (src.controller.state.datapath.Datapath)
+        self.datapath = None
+        # True while reads are suspended because too much output is queued
+        self.paused = False
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self._framer = MessageFramer()
+        self._out = []
+        self._out_bytes = 0
+        self._pending = pending
+        # traffic counters, read by the metrics endpoint
+        self.bytes_in = 0
+        self.messages_in = 0
+        self.bytes_out = 0
+        self.messages_out = 0
+        # perf_counter_ns() of the last read, i.e. when the current batch arrived
+        # (the accept time until the first read; keepalives measure idleness from it)
+        self.received_at = time.perf_counter_ns()
+        # keepalive: xid and scheduler clock() of the unanswered ECHO_REQUEST, last RTT (seconds)
+        self.echo_xid = None
+        self.echo_sent_at = 0.0
+        self.echo_rtt = None
+        # the connection's keepalive Timer (src.utils.scheduler)
+        self.keepalive = None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_messages(self):
+        """
+        Read once from the socket and return the list of complete messages
+        (header + body) as memoryviews into the receive buffer. They stay
+        valid until the next call. Returns None if the peer closed the connection.
+        """
+        try:
+            n = self._framer.recv_into(self.sock)
+        except BlockingIOError:
+            return []
+        if n == 0:
+            return None
+        self.received_at = time.perf_counter_ns()
+        msgs = self._framer.messages()
+        self.bytes_in += n
+        self.messages_in += len(msgs)
+        return msgs
+
+    def feed(self, data):
+        """Like recv_messages() for bytes that were read elsewhere (replay of a recording)"""
+        self._framer.feed(data)
+        self.received_at = time.perf_counter_ns()
+        msgs = self._framer.messages()
+        self.bytes_in += len(data)
+        self.messages_in += len(msgs)
+        return msgs
+
+    def send(self, data):
+        """Queue data for the next flush. data must not be a view of the receive buffer."""
+        if self.closed:
+            return
+        self._out.append(data)
+        self._out_bytes += len(data)
+        self.bytes_out += len(data)
+        self.messages_out += 1
+        if self._pending is not None:
+            self._pending.add(self)
+        else:
+            self.flush()
+
+    @property
+    def pending_bytes(self):
+        return self._out_bytes
+
+    def want_write(self):
+        return self._out_bytes > 0
+
+    def flush(self):
+        """Write as much queued output as the socket accepts, with one sendmsg() per IOV_MAX buffers."""
+        out = self._out
+        while out:
+            chunk = out[:IOV_MAX]
+            try:
+                sent = self.sock.sendmsg(chunk)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._out_bytes -= sent
+            done = 0
+            for buf in chunk:
+                if sent < len(buf):
+                    break
+                sent -= len(buf)
+                done += 1
+            del out[:done]
+            if sent or done < len(chunk):
+                # the socket buffer is full; keep the unsent tail for the next EVENT_WRITE
+                if sent:
+                    out[0] = memoryview(out[0])[sent:]
+                return
+
+    def update_backpressure(self):
+        """Pause reading above the high watermark, resume below the low one; returns paused"""
+        if self._out_bytes >= self.high_watermark:
+            self.paused = True
+        elif self.paused and self._out_bytes <= self.low_watermark:
+            self.paused = False
+        return self.paused
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._out.clear()
+        self._out_bytes = 0
+        self.sock.close()
@@ -1,108 +1,470 @@
-from src.openflow.openflow import make_hello, make_features_request, parseheader, dispatcher
-from src.controller.state.mac_table import MACLearningTable
+from src.openflow.openflow import (
+    templates, make_flow_mod, parseheader, dispatcher, dispatch_batch, OFPFC_ADD, OFPFC_DELETE, OFPT_PACKET_IN,
+    OFP_DEFAULT_PRIORITY,
+)
+from src.openflow.match import match_dl_dst
+from src.controller.admission import AdmissionControl
+from src.controller.discovery import LinkDiscovery, DISCOVERY_INTERVAL
+from src.controller.pending import PendingRequests
+from src.controller.state.datapath import DatapathRegistry
+from src.controller.state.mac_table import mac_to_bytes
+from src.controller.state.topology import Topology
+from src.controller.connection import Connection
+from concurrent.futures import Future
+import os
+import selectors
 import socket
 import struct
+import time
 
 from src.utils.log import info, success, error, debug
+from src.utils.metrics import Metrics, MetricsServer
+from src.utils.scheduler import Scheduler
+
+# pending connection queue; switches tend to reconnect all at once after a restart
+LISTEN_BACKLOG = 128
+# upper bound on how long select() blocks, so stop() is noticed promptly
+SELECT_TIMEOUT = 0.5
+# how often learned MACs are aged out (seconds)
+MAC_AGE_INTERVAL = 1.0
+# learned MACs per switch before the least recently used one is evicted
+MAC_TABLE_CAPACITY = 100_000
+# an ECHO_REQUEST is sent to every switch this often (seconds); it also measures the RTT
+KEEPALIVE_INTERVAL = 5.0
+# a switch nothing was received from for this long is disconnected and its state purged
+KEEPALIVE_TIMEOUT = 15.0
+# ARP requests are answered from bindings learned this recently (seconds)
+ARP_TIMEOUT = 60.0
+# IPv4 addresses in a switch's ARP cache before the oldest binding is evicted
+ARP_CACHE_CAPACITY = 100_000
+# learned state is saved to the snapshot file this often (seconds)
+SNAPSHOT_INTERVAL = 30.0
+
+# in_port of a PACKET_IN body: buffer_id(4), total_len(2), in_port(2)
+_PACKET_IN_PORT = struct.Struct("!H")
+_PACKET_IN_PORT_OFFSET = 6
 
 class Controller:
-    def __init__(self, host='0.0.0.0', port=6634):
+    def __init__(self, host='0.0.0.0', port=6634, compact_mac_tables=False, reuse_port=False,
+                 admission_control=True, keepalive_interval=KEEPALIVE_INTERVAL,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, discovery_interval=DISCOVERY_INTERVAL,
+                 arp_timeout=ARP_TIMEOUT):
         self.host = host
         self.port = port
+        # several worker processes accept on the same port (see src.controller.shard)
+        self.reuse_port = reuse_port
+        # worker side of the cross-shard channel when running as a worker
+        self.shard = None
         self.xid = 1
-        self.mac_table: MACLearningTable = MACLearningTable()
+        self.datapaths: DatapathRegistry = DatapathRegistry(
+            mac_max_entries=MAC_TABLE_CAPACITY, on_mac_expire=self._on_mac_expire,
+            compact_mac_tables=compact_mac_tables, arp_timeout_seconds=arp_timeout,
+            arp_max_entries=ARP_CACHE_CAPACITY)
+        self.connections: dict[int, Connection] = {}
+        # PACKET_IN rate limits and miss coalescing; None handles every PACKET_IN
+        self.admission = AdmissionControl() if admission_control else None
+        # per-message-type counters and latencies; None skips the timing in dispatcher
+        self.metrics = Metrics()
+        self.metrics_server = None
+        # src.controller.recording.Recorder while the received bytes are recorded
+        self.recorder = None
+        # src.controller.snapshot.SnapshotWriter while learned state is saved for a warm restart
+        self.snapshot_writer = None
+        self._snapshot_timer = None
+        self._snapshot_interval = SNAPSHOT_INTERVAL
+        # keepalives and MAC aging; run from the event loop
+        self.scheduler = Scheduler()
+        # requests waiting for their reply, by xid (see request() and install_flows())
+        self.requests = PendingRequests(self.scheduler)
+        # None disables keepalives; so does a zero interval or timeout
+        self.keepalive_interval = keepalive_interval if keepalive_interval and keepalive_timeout else None
+        self.keepalive_timeout = keepalive_timeout
+        # connections closed because they went silent
+        self.keepalive_timeouts = 0
+        self._age_timer = None
+        # links found by LLDP probes, shortest paths over them and host locations
+        self.topology = Topology()
+        # None disables link discovery; forwarding then uses each switch's MAC table only
+        self.discovery = LinkDiscovery(self, discovery_interval) if discovery_interval else None
+        # connections with queued output, flushed at the end of each loop iteration
+        self._pending: set[Connection] = set()
+        self._selector = None
+        self._listener = None
+        self._running = False
 
     def next_xid(self):
-        self.xid += 1
-        return self.xid
-
-    def _recv_exact(self, conn, nbytes):
-        """Receive exactly nbytes from the socket, or return None if closed."""
-        data = b''
-        while len(data) < nbytes:
-            chunk = conn.recv(nbytes - len(data))
-            if not chunk:
-                return None
-            data += chunk
-        return data
+        """Transaction id for a new message; wraps after 0xffffffff and skips xids still awaiting a reply"""
+        xid = self.xid % 0xffffffff + 1
+        requests = self.requests
+        while xid in requests:
+            xid = xid % 0xffffffff + 1
+        self.xid = xid
+        return xid
 
     def recv_msg(self, conn):
-        """Receive a full OpenFlow message (header + body)."""
-        header = self._recv_exact(conn, 8)
-        if not header:
-            return None
+        """
+        Receive every complete OpenFlow message (header + body) available on
+        the connection with a single read. Returns None if the connection closed.
+        """
+        msgs = conn.recv_messages()
+        if msgs and self.recorder is not None:
+            self.recorder.data(conn.fileno(), msgs)
+        return msgs
+
+    def listen(self):
+        # create a non-blocking listening socket
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        s.bind((self.host, self.port))
+        s.listen(LISTEN_BACKLOG)
+        s.setblocking(False)
+        # port 0 asks the kernel for a free port; record the one we got
+        self.port = s.getsockname()[1]
+        self._listener = s
+        self._selector = selectors.DefaultSelector()
+        # connections are registered with themselves as data, other readers with a callback
+        self._selector.register(s, selectors.EVENT_READ, self._accept)
+        info("Listening on %s %s", self.host, self.port)
 
+    def start(self):
+        self.listen()
         try:
-            version, msg_type, length, xid = struct.unpack("!BBHI", header)
-        except struct.error as e:
-            error(f"Error unpacking header: {e}")
-            return None
+            self.serve_forever()
+        except KeyboardInterrupt:
+            info("Shutting down controller...")
+        finally:
+            self.close()
 
-        if length < 8:
-            error(f"Invalid message length: {length}")
-            return None
+    def stop(self):
+        """Ask serve_forever() to return; safe to call from another thread."""
+        self._running = False
 
-        body = b''
-        remaining = length - 8
-        if remaining > 0:
-            body = self._recv_exact(conn, remaining)
-            if body is None:
-                return None
+    def serve_forever(self):
+        self._running = True
+        scheduler = self.scheduler
+        if self._age_timer is None:
+            self._age_timer = scheduler.call_later(MAC_AGE_INTERVAL, self._age_out)
+        if self.discovery is not None:
+            self.discovery.start()
+        while self._running:
+            scheduler.run_due()
+            timeout = SELECT_TIMEOUT
+            deadline = scheduler.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - scheduler.clock()))
+            for key, events in self._selector.select(timeout):
+                conn = key.data
+                if conn.__class__ is not Connection:
+                    conn()
+                    continue
+                if events & selectors.EVENT_READ:
+                    self._on_readable(conn)
+                if events & selectors.EVENT_WRITE and not conn.closed:
+                    self._flush(conn)
+            self._flush_pending()
 
-        return header + body
+    def request(self, conn, make, timeout=None) -> Future:
+        """
+        Send make(xid) on conn with a new xid. The future resolves with the
+        reply (see src.controller.pending); call on the event loop.
+        """
+        xid = self.next_xid()
+        future = self.requests.expect(conn, xid, timeout)
+        conn.send(make(xid))
+        return future
 
-    def start(self):
-        # create a socket
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((self.host, self.port))
-        s.listen(5)
-        info(f"Listening on {self.host} {self.port}")
+    def barrier(self, conn, timeout=None) -> Future:
+        """Future resolved once the switch has handled everything sent to it before"""
+        return self.request(conn, templates.barrier_request, timeout)
+
+    def install_flows(self, conn, flows, priority=OFP_DEFAULT_PRIORITY, idle_timeout=0, hard_timeout=0,
+                      timeout=None) -> Future:
+        """
+        Install (match, out_port) flows on the switch of conn: the FLOW_MODs
+        go out back to back behind one BARRIER_REQUEST, instead of a round
+        trip each. The future resolves with a FlowBatchResult once the
+        switch has handled all of them; the rejected ones are listed there
+        and dropped from the shadow flow table again.
+        """
+        flows = list(flows)
+        xids = [self.next_xid() for _ in flows]
+        msgs = [make_flow_mod(xid, match, OFPFC_ADD, out_port, idle_timeout, hard_timeout, priority)
+                for xid, (match, out_port) in zip(xids, flows)]
+        barrier_xid = self.next_xid()
+        msgs.append(templates.barrier_request(barrier_xid))
+        future = self.requests.expect_barrier(conn, barrier_xid, xids[0] if xids else barrier_xid, len(flows),
+                                              timeout)
+        conn.send(b"".join(msgs))
+        dp = conn.datapath
+        if dp is not None:
+            now = time.time()
+            for match, out_port in flows:
+                dp.flow_table.install(match, out_port, priority, idle_timeout, hard_timeout, now)
+            future.add_done_callback(lambda f: self._forget_rejected(dp, flows, priority, f))
+        return future
+
+    def _forget_rejected(self, dp, flows, priority, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        for index, _ in future.result().failed:
+            dp.flow_table.remove(flows[index][0], priority)
+
+    def _age_out(self):
+        self.datapaths.age_out(time.time())
+        self._age_timer = self.scheduler.call_later(MAC_AGE_INTERVAL, self._age_out)
+
+    def _keepalive(self, conn):
+        """Probe conn with an ECHO_REQUEST, or close it if it has been silent too long"""
+        if conn.closed:
+            return
+        idle = (time.perf_counter_ns() - conn.received_at) / 1e9
+        if idle >= self.keepalive_timeout:
+            error("No message from %s for %.1fs, disconnecting", conn.addr, idle)
+            self.keepalive_timeouts += 1
+            self.close_connection(conn)
+            return
+        # a newer request replaces an unanswered one; a late reply is ignored
+        conn.echo_xid = self.next_xid()
+        conn.echo_sent_at = self.scheduler.clock()
+        conn.send(templates.echo_request(conn.echo_xid))
+        # next probe, or the silence deadline if that comes first
+        delay = min(self.keepalive_interval, self.keepalive_timeout - idle)
+        conn.keepalive = self.scheduler.call_later(delay, self._keepalive, conn)
+
+    def serve_metrics(self, port, host='127.0.0.1'):
+        """Serve the metrics on http://host:port/metrics from a background thread"""
+        from src.controller.metrics import ControllerMetrics
+        self.metrics_server = MetricsServer(ControllerMetrics(self).render, host, port)
+        self.metrics_server.start()
+        info("Metrics on http://%s:%s/metrics", host, self.metrics_server.port)
+        return self.metrics_server
+
+    def record(self, path):
+        """Append every message received from now on to a recording (see src.controller.recording)"""
+        from src.controller.recording import Recorder
+        self.recorder = Recorder(path)
+        self.recorder.start()
+        for conn in self.connections.values():
+            self.recorder.opened(conn.fileno())
+        info("Recording received messages to %s", path)
+        return self.recorder
+
+    def snapshot(self, path, interval=SNAPSHOT_INTERVAL):
+        """
+        Restore the state saved in path, if there is one, then save it there
+        every interval seconds and on close (see src.controller.snapshot).
+        Call before serving, while no switch is connected.
+        """
+        from src.controller.snapshot import SnapshotWriter, read_snapshot, restore
+        if os.path.exists(path):
+            try:
+                stats = restore(self, read_snapshot(path))
+            except (OSError, ValueError) as e:
+                error("Ignoring snapshot %s: %s", path, e)
+            else:
+                info("Restored %d datapaths, %d MACs, %d flows and %d ARP bindings from %s in %.1fms "
+                     "(%d MACs, %d flows expired)", stats.datapaths, stats.macs, stats.flows, stats.arp, path,
+                     stats.seconds * 1000, stats.stale_macs, stats.stale_flows)
+        self.snapshot_writer = SnapshotWriter(path)
+        self.snapshot_writer.start()
+        self._snapshot_interval = interval
+        self._snapshot_timer = self.scheduler.call_later(interval, self._snapshot)
+        info("Saving learned state to %s every %gs", path, interval)
+        return self.snapshot_writer
+
+    def _snapshot(self):
+        from src.controller.snapshot import capture
+        self.snapshot_writer.submit(capture(self))
+        self._snapshot_timer = self.scheduler.call_later(self._snapshot_interval, self._snapshot)
+
+    def _final_snapshot(self):
+        # taken before the connections are closed, which unregisters their datapaths
+        from src.controller.snapshot import capture, write_snapshot
+        writer = self.snapshot_writer
+        writer.close()
+        try:
+            write_snapshot(writer.path, capture(self))
+        except OSError as e:
+            error("Error writing snapshot %s: %s", writer.path, e)
+        self.snapshot_writer = None
+
+    def add_reader(self, fileobj, callback):
+        """Call callback() from the event loop whenever fileobj is readable"""
+        self._selector.register(fileobj, selectors.EVENT_READ, callback)
 
-        # accept connections in a loop
+    def close(self):
+        if self.snapshot_writer is not None:
+            self._final_snapshot()
+        for conn in list(self.connections.values()):
+            self.close_connection(conn)
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.discovery is not None:
+            self.discovery.stop()
+        self.scheduler.clear()
+        self._age_timer = None
+        self._snapshot_timer = None
+        if self._selector is not None:
+            self._selector.close()
+        if self._listener is not None:
+            self._listener.close()
+
+    def _accept(self):
+        # drain the accept queue: many switches may connect in the same tick
         while True:
             try:
-                client_sock, client_addr = s.accept()
-                info(f"Connection from {client_addr}")
-                self.handle_connection(client_sock)
-            except KeyboardInterrupt:
-                info("Shutting down controller...")
-                break
+                client_sock, client_addr = self._listener.accept()
+            except BlockingIOError:
+                return
             except Exception as e:
-                error(f"Error accepting connection: {e}")
-
-        s.close()
+                error("Error accepting connection: %s", e)
+                return
+            info("Connection from %s", client_addr)
+            client_sock.setblocking(False)
+            client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(client_sock, client_addr, self._pending)
+            self.connections[conn.fileno()] = conn
+            self._selector.register(conn, selectors.EVENT_READ, conn)
+            if self.recorder is not None:
+                self.recorder.opened(conn.fileno())
+            if self.keepalive_interval:
+                conn.keepalive = self.scheduler.call_later(self.keepalive_interval, self._keepalive, conn)
+            self.handle_connection(conn)
 
     def handle_connection(self, conn):
+        """Start the handshake on a newly accepted connection."""
+        # -- handshake --
+        # send hello message
+        hello_xid = self.next_xid()
+        conn.send(templates.hello(hello_xid))
+        success("Send Hello Message (xid = %d)", hello_xid)
+        # send features request message
+        features_xid = self.next_xid()
+        conn.send(templates.features_request(features_xid))
+        success("Send Features Request Message (xid = %d)", features_xid)
+        # -- end of handshake --
+
+    def _on_readable(self, conn):
         try:
-            # -- handshake --
-            # send hello message
-            hello_xid = self.next_xid()
-            conn.send(make_hello(hello_xid))
-            success(f"Send Hello Message (xid = {hello_xid})")
-            # send features request message
-            features_xid = self.next_xid()
-            conn.send(make_features_request(features_xid))
-            success(f"Send Features Request Message (xid = {features_xid})")
-            # -- end of handshake --
-            # -- message loop --
-            while True:
-                msg = self.recv_msg(conn)
-                if not msg:
-                    break
-                try:
-                    hdr, body = parseheader(msg)
-                except ValueError as e:
-                    error(f"Error parsing header: {e}")
-                    break
-                dispatcher(self,conn, hdr, body)
-
-
-            # -- end of message loop --
+            msgs = self.recv_msg(conn)
+            if msgs is None:
+                self.close_connection(conn)
+                return
+            self.handle_messages(conn, msgs)
+        except ConnectionError as e:
+            # the switch went away; nothing to debug
+            info("Connection lost %s: %s", conn.addr, e)
+            self.close_connection(conn)
         except Exception as e:
             import traceback
             traceback.print_exc()
-            error(f"Error handling connection: {e}")
-        finally:
-            # close connection
-            conn.close()
+            error("Error handling connection: %s", e)
+            self.close_connection(conn)
+
+    def handle_messages(self, conn, msgs):
+        """Parse and dispatch the messages of one read from conn"""
+        packet_ins = []
+        for msg in msgs:
+            try:
+                hdr, body = parseheader(msg)
+            except ValueError as e:
+                error("Error parsing header: %s", e)
+                self.close_connection(conn)
+                return
+            if hdr.msg_type == OFPT_PACKET_IN:
+                # handled after the rest of the read, so ECHO_REQUEST and
+                # PORT_STATUS never wait behind a burst of PACKET_INs
+                packet_ins.append((hdr, body))
+                continue
+            dispatcher(self, conn, hdr, body)
+        if packet_ins:
+            self._dispatch_packet_ins(conn, packet_ins)
+
+    def _dispatch_packet_ins(self, conn, packet_ins):
+        admission = self.admission
+        if admission is not None:
+            # switches without a FEATURES_REPLY yet get buckets of their own
+            dp = conn.datapath
+            key = dp.dpid if dp is not None else conn
+            now = time.monotonic()
+            admit = admission.admit
+            unpack = _PACKET_IN_PORT.unpack_from
+            packet_ins = [(hdr, body) for hdr, body in packet_ins
+                          if admit(key, unpack(body, _PACKET_IN_PORT_OFFSET)[0], now)]
+            if not packet_ins:
+                return
+        # the admitted PACKET_INs of the read go to the handler in one call
+        dispatch_batch(self, conn, OFPT_PACKET_IN, packet_ins)
+
+    def _flush_pending(self):
+        pending = self._pending
+        while pending:
+            self._flush(pending.pop())
+
+    def _flush(self, conn):
+        if conn.closed:
+            return
+        try:
+            conn.flush()
+        except OSError as e:
+            error("Error sending to %s: %s", conn.addr, e)
+            self.close_connection(conn)
+            return
+        self._update_interest(conn)
+
+    def _update_interest(self, conn):
+        if conn.closed:
+            return
+        # a switch that does not drain its replies is not read from until it does
+        events = 0 if conn.update_backpressure() else selectors.EVENT_READ
+        if conn.want_write():
+            events |= selectors.EVENT_WRITE
+        if self._selector.get_key(conn).events != events:
+            self._selector.modify(conn, events, conn)
+
+    def _on_mac_expire(self, dp, entry):
+        # remove the flows towards a MAC we no longer know the port of
+        dl_dst = mac_to_bytes(entry.mac)
+        dp.flow_table.invalidate_dst(dl_dst)
+        self.topology.forget_host(dl_dst, dp.dpid)
+        conn = dp.conn
+        if conn is None or conn.closed:
+            return
+        conn.send(make_flow_mod(self.next_xid(), match_dl_dst(dl_dst), OFPFC_DELETE))
+
+    def close_connection(self, conn):
+        if conn.closed:
+            return
+        info("Connection closed %s", conn.addr)
+        if self.recorder is not None:
+            self.recorder.closed(conn.fileno())
+        if conn.keepalive is not None:
+            conn.keepalive.cancel()
+            conn.keepalive = None
+        self.requests.connection_closed(conn)
+        admission = self.admission
+        if conn.datapath is not None:
+            dp = self.datapaths.unregister(conn.datapath.dpid, conn)
+            if dp is not None:
+                self.topology.remove_switch(dp.dpid)
+                if self.discovery is not None:
+                    self.discovery.forget(dp.dpid)
+                if admission is not None:
+                    admission.forget(dp.dpid)
+        if admission is not None:
+            admission.forget(conn)
+        self.connections.pop(conn.fileno(), None)
+        self._pending.discard(conn)
+        # replayed connections (src.controller.recording) have no selector
+        if self._selector is not None:
+            try:
+                self._selector.unregister(conn)
+            except (KeyError, ValueError):
+                pass
+        conn.close()
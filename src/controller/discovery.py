@@ -0,0 +1,130 @@
+"""
+LLDP link discovery.
+
+Every interval the controller sends an LLDP probe out of each up port of
+each switch (a PACKET_OUT with the frame, see src.parser.lldp). A switch
+that receives a probe hands it back as a PACKET_IN, and handler_packet_in
+passes it to received(), which records the link in ctrl.topology. A link
+whose probe has not come back for link_timeout seconds is removed.
+
+Probe frames are built once per (dpid, port) and reused.
+"""
+from src.controller.state.mac_table import mac_to_bytes
+from src.openflow.match import OFMatch
+from src.openflow.openflow import (
+    templates, make_flow_mod, port_is_down, OFPFC_DELETE, OFP_NO_BUFFER, OFPP_MAX, OFPP_NONE,
+)
+from src.parser.lldp import make_lldp, parse_lldp
+from src.utils.log import info
+
+# how often every port is probed (seconds)
+DISCOVERY_INTERVAL = 5.0
+# a link not confirmed by a probe for this many intervals is removed
+LINK_TIMEOUT_INTERVALS = 3
+
+
+class LinkDiscovery:
+    def __init__(self, ctrl, interval=DISCOVERY_INTERVAL, link_timeout=None):
+        self.ctrl = ctrl
+        self.interval = interval
+        self.link_timeout = link_timeout or interval * LINK_TIMEOUT_INTERVALS
+        # (dpid, port) -> probe frame sent out of that port
+        self._frames: dict[tuple[int, int], bytes] = {}
+        # (dpid, port) of a link's source -> when its probe last came back
+        self._seen: dict[tuple[int, int], float] = {}
+        self._timer = None
+        self.probes_sent = 0
+        self.probes_received = 0
+
+    def start(self):
+        """Probe now and then every interval from the controller's scheduler"""
+        if self._timer is None:
+            self._timer = self.ctrl.scheduler.call_later(0.0, self._run)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _run(self):
+        self.expire(self.ctrl.scheduler.clock())
+        self.probe_all()
+        self._timer = self.ctrl.scheduler.call_later(self.interval, self._run)
+
+    def probe_all(self) -> int:
+        """Send a probe out of every up port of every connected switch; returns how many"""
+        sent = 0
+        for dp in self.ctrl.datapaths.all():
+            sent += self.probe(dp)
+        return sent
+
+    def probe(self, dp) -> int:
+        conn = dp.conn
+        if conn is None or conn.closed:
+            return 0
+        frames = self._frames
+        next_xid = self.ctrl.next_xid
+        sent = 0
+        for port_no, port in dp.ports.items():
+            if port_no >= OFPP_MAX or port_is_down(port):
+                continue
+            frame = frames.get((dp.dpid, port_no))
+            if frame is None:
+                frame = frames[(dp.dpid, port_no)] = make_lldp(dp.dpid, port_no, mac_to_bytes(port.hw_addr))
+            conn.send(templates.packet_out(next_xid(), OFP_NO_BUFFER, OFPP_NONE, port_no, frame))
+            sent += 1
+        self.probes_sent += sent
+        return sent
+
+    def received(self, dp, in_port: int, frame) -> bool:
+        """
+        Handle an LLDP frame that came in on in_port of dp. Returns False
+        if it is not one of our probes.
+        """
+        origin = parse_lldp(frame)
+        if origin is None:
+            return False
+        self.probes_received += 1
+        self._seen[origin] = self.ctrl.scheduler.clock()
+        src_dpid, src_port = origin
+        if self.ctrl.topology.add_link(src_dpid, src_port, dp.dpid, in_port):
+            info("Link discovered: %016x port %d -> %016x port %d", src_dpid, src_port, dp.dpid, in_port)
+        return True
+
+    def expire(self, now: float) -> int:
+        """Remove links whose probes stopped coming back; returns how many"""
+        deadline = now - self.link_timeout
+        topology = self.ctrl.topology
+        expired = 0
+        for origin, seen in list(self._seen.items()):
+            if seen >= deadline:
+                continue
+            del self._seen[origin]
+            if topology.remove_link(*origin):
+                info("Link timed out: %016x port %d", *origin)
+                expired += 1
+                self._delete_flows_out(*origin)
+        return expired
+
+    def _delete_flows_out(self, dpid: int, port: int):
+        # flows routed over the lost link; new paths are installed on the next PACKET_INs
+        dp = self.ctrl.datapaths.get(dpid)
+        if dp is None:
+            return
+        # sent even if the shadow table has aged them out; they may still be on the switch
+        dp.flow_table.invalidate_port(port)
+        conn = dp.conn
+        if conn is not None and not conn.closed:
+            conn.send(make_flow_mod(self.ctrl.next_xid(), OFMatch(), OFPFC_DELETE, port))
+
+    def forget(self, dpid: int):
+        """Drop the cached probes and link timestamps of a disconnected switch"""
+        for key in [key for key in self._frames if key[0] == dpid]:
+            del self._frames[key]
+        for key in [key for key in self._seen if key[0] == dpid]:
+            del self._seen[key]
+
+    def forget_port(self, dpid: int, port: int):
+        self._frames.pop((dpid, port), None)
+        self._seen.pop((dpid, port), None)
+
@@ -1,5 +1,21 @@
-from typing import Protocol
-from src.controller.state.mac_table import MACLearningTable
+from typing import Optional, Protocol
+from src.controller.admission import AdmissionControl
+from src.controller.pending import PendingRequests
+from src.controller.state.datapath import DatapathRegistry
+from src.controller.state.topology import Topology
+from src.utils.metrics import Metrics
+from src.utils.scheduler import Scheduler
 
 class ControllerIF(Protocol):
-    mac_table: MACLearningTable
\ No newline at end of file
+    datapaths: DatapathRegistry
+    admission: Optional[AdmissionControl]
+    metrics: Optional[Metrics]
+    topology: Topology
+    # src.controller.discovery.LinkDiscovery; None when link discovery is off
+    discovery: Optional[object]
+    # requests waiting for their reply, by xid
+    requests: PendingRequests
+    # timers; its clock() also times the keepalive echoes
+    scheduler: Scheduler
+
+    def next_xid(self) -> int: ...
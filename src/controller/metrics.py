@@ -0,0 +1,131 @@
+"""
+Metrics exposition for a Controller, rendered on each scrape from the
+counters the event loop keeps (see src.utils.metrics).
+"""
+import time
+
+from src.openflow.openflow import MESSAGE_SPECS
+from src.utils.metrics import Exposition
+
+
+def _type_name(msg_type: int) -> str:
+    spec = MESSAGE_SPECS.get(msg_type)
+    return spec.name if spec is not None else str(msg_type)
+
+
+class ControllerMetrics:
+    """
+    render() builds the text exposition. Per-connection rates are
+    computed against the counters seen by the previous scrape.
+    """
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        # peer -> (time, messages_in, bytes_in, messages_out, bytes_out) at the last scrape
+        self._previous: dict[str, tuple] = {}
+
+    def render(self) -> str:
+        ctrl = self.ctrl
+        out = Exposition()
+        metrics = ctrl.metrics
+        if metrics is not None:
+            active = [(msg_type, count) for msg_type, count in enumerate(list(metrics.messages)) if count]
+            for msg_type, count in active:
+                out.counter("openflow_messages_total", count, "Messages dispatched", type=_type_name(msg_type))
+            for msg_type, _ in active:
+                out.histogram("openflow_receive_to_dispatch_seconds", metrics.receive_to_dispatch(msg_type),
+                              "Time from reading a message to dispatching it", type=_type_name(msg_type))
+            for msg_type, _ in active:
+                out.histogram("openflow_dispatch_to_reply_seconds", metrics.dispatch_to_reply(msg_type),
+                              "Time in the handler until its replies are queued", type=_type_name(msg_type))
+
+        now = time.monotonic()
+        previous, self._previous = self._previous, {}
+        for conn in list(ctrl.connections.values()):
+            peer = "%s:%s" % conn.addr[:2]
+            dp = conn.datapath
+            labels = {"peer": peer, "dpid": "0x%x" % dp.dpid if dp is not None else ""}
+            counts = (conn.messages_in, conn.bytes_in, conn.messages_out, conn.bytes_out)
+            out.counter("openflow_connection_received_messages_total", counts[0], "Messages read", **labels)
+            out.counter("openflow_connection_received_bytes_total", counts[1], "Bytes read", **labels)
+            out.counter("openflow_connection_sent_messages_total", counts[2], "Messages queued", **labels)
+            out.counter("openflow_connection_sent_bytes_total", counts[3], "Bytes queued", **labels)
+            if conn.echo_rtt is not None:
+                out.gauge("openflow_echo_rtt_seconds", conn.echo_rtt, "Last keepalive round trip", **labels)
+            self._previous[peer] = (now,) + counts
+            last = previous.get(peer)
+            if last is not None and now > last[0]:
+                elapsed = now - last[0]
+                out.gauge("openflow_connection_received_messages_per_second",
+                          (counts[0] - last[1]) / elapsed, "Read rate since the last scrape", **labels)
+                out.gauge("openflow_connection_received_bytes_per_second",
+                          (counts[1] - last[2]) / elapsed, "Read rate since the last scrape", **labels)
+                out.gauge("openflow_connection_sent_messages_per_second",
+                          (counts[2] - last[3]) / elapsed, "Send rate since the last scrape", **labels)
+                out.gauge("openflow_connection_sent_bytes_per_second",
+                          (counts[3] - last[4]) / elapsed, "Send rate since the last scrape", **labels)
+
+        for dp in ctrl.datapaths.all():
+            dpid = "0x%x" % dp.dpid
+            table = dp.mac_table
+            out.gauge("openflow_mac_table_entries", len(table), "Learned MACs", dpid=dpid)
+            out.counter("openflow_mac_learn_total", table.learn_hits, "MAC learns", dpid=dpid, result="refresh")
+            out.counter("openflow_mac_learn_total", table.learns - table.learn_hits, "MAC learns",
+                        dpid=dpid, result="new")
+            out.counter("openflow_mac_lookup_total", table.lookup_hits, "MAC lookups", dpid=dpid, result="hit")
+            out.counter("openflow_mac_lookup_total", table.lookups - table.lookup_hits, "MAC lookups",
+                        dpid=dpid, result="miss")
+            if table.lookups:
+                out.gauge("openflow_mac_lookup_hit_ratio", table.lookup_hits / table.lookups,
+                          "Share of lookups that found a port", dpid=dpid)
+            if table.learns:
+                out.gauge("openflow_mac_learn_hit_ratio", table.learn_hits / table.learns,
+                          "Share of learns of an already known MAC", dpid=dpid)
+            out.gauge("openflow_flow_table_entries", len(dp.flow_table), "Flows pushed and not timed out",
+                      dpid=dpid)
+            out.counter("openflow_flow_mods_suppressed_total", dp.flow_table.suppressed,
+                        "Duplicate FLOW_MODs not sent", dpid=dpid)
+            cache = dp.arp_cache
+            if cache is not None:
+                out.gauge("openflow_arp_cache_entries", len(cache), "IPv4 to MAC bindings", dpid=dpid)
+                out.counter("openflow_arp_cache_lookup_total", cache.lookup_hits, "ARP cache lookups",
+                            dpid=dpid, result="hit")
+                out.counter("openflow_arp_cache_lookup_total", cache.lookups - cache.lookup_hits,
+                            "ARP cache lookups", dpid=dpid, result="miss")
+                out.counter("openflow_arp_replies_total", cache.answered, "ARP requests answered by the controller",
+                            dpid=dpid)
+
+        out.counter("openflow_keepalive_timeouts_total", ctrl.keepalive_timeouts,
+                    "Switches disconnected for not answering keepalives")
+
+        topology = ctrl.topology
+        out.gauge("openflow_topology_links", len(topology), "Switch-to-switch links found by LLDP")
+        out.gauge("openflow_topology_hosts", len(topology.hosts), "Hosts located on edge ports")
+        if ctrl.discovery is not None:
+            out.counter("openflow_lldp_probes_total", ctrl.discovery.probes_sent, "LLDP probes",
+                        direction="sent")
+            out.counter("openflow_lldp_probes_total", ctrl.discovery.probes_received, "LLDP probes",
+                        direction="received")
+
+
+        requests = ctrl.requests
+        out.gauge("openflow_requests_pending", len(requests), "Requests waiting for their reply")
+        for result in ("replied", "errors", "timeouts", "lost"):
+            out.counter("openflow_requests_total", getattr(requests, result), "Requests completed",
+                        result=result)
+
+        writer = ctrl.snapshot_writer
+        if writer is not None:
+            out.counter("openflow_snapshots_total", writer.written, "State snapshots", result="written")
+            out.counter("openflow_snapshots_total", writer.skipped, "State snapshots", result="skipped")
+            out.counter("openflow_snapshots_total", writer.failed, "State snapshots", result="failed")
+            out.gauge("openflow_snapshot_bytes", writer.last_bytes, "Size of the last snapshot written")
+            out.gauge("openflow_snapshot_write_seconds", writer.last_seconds,
+                      "Time to encode and write the last snapshot")
+
+        if ctrl.admission is not None:
+            stats = ctrl.admission.stats
+            for result in ("admitted", "dropped_datapath", "dropped_port", "coalesced"):
+                out.counter("openflow_packet_in_admission_total", getattr(stats, result),
+                            "PACKET_IN admission decisions", result=result)
+        return out.text()
@@ -0,0 +1,184 @@
+"""
+Requests sent to switches that wait for an answer, correlated by xid.
+
+A request is registered under the xid it was sent with and gets a
+concurrent.futures.Future. The handler of the reply resolves it; an
+ERROR with the same xid fails it with OpenFlowError. A request that is
+not answered within its timeout fails with TimeoutError, and the
+requests of a connection that closes fail with ConnectionError.
+
+A switch handles the messages of a connection in order and only sends a
+BARRIER_REPLY once everything before the BARRIER_REQUEST is done, so a
+batch of FLOW_MODs needs a single pending request: the barrier behind
+them. ERRORs for the FLOW_MODs in front of it are matched by xid range
+and reported in the batch result instead of failing it.
+
+Everything here runs on the event loop thread, including the futures'
+done callbacks. Other threads may wait on the futures, nothing more.
+"""
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.utils.scheduler import Scheduler
+
+# seconds a switch has to answer a request
+REQUEST_TIMEOUT = 10.0
+
+
+class OpenFlowError(Exception):
+    """The switch answered a request with an ERROR message"""
+
+    def __init__(self, err):
+        super().__init__("type=%d, code=%d" % (err.err_type, err.code))
+        # src.openflow.openflow.OFError
+        self.error = err
+
+
+@dataclass
+class FlowBatchResult:
+    # FLOW_MODs sent in front of the barrier
+    sent: int
+    # (index into the batch, OFError) of the FLOW_MODs the switch rejected
+    failed: list = field(default_factory=list)
+    # from sending the batch to the BARRIER_REPLY
+    seconds: float = 0.0
+
+
+class _Request:
+    __slots__ = ("conn", "future", "timer", "sent_at", "first_xid", "batch")
+
+    def __init__(self, conn, future, timer, sent_at, first_xid, batch):
+        self.conn = conn
+        self.future = future
+        self.timer = timer
+        self.sent_at = sent_at
+        # a barrier: the batch's messages were sent with xids first_xid up to its own
+        self.first_xid = first_xid
+        self.batch = batch
+
+
+def _settle(future: Future, result=None, exc: Optional[BaseException] = None):
+    # the waiter may have cancelled it
+    if future.cancelled():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
+
+
+class PendingRequests:
+    """xid -> request awaiting an answer, with a scheduler timer each"""
+
+    def __init__(self, scheduler: Scheduler, timeout: float = REQUEST_TIMEOUT):
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self._requests: dict[int, _Request] = {}
+        # conn -> xids of its requests, to fail them when it closes
+        self._by_conn: dict[object, set[int]] = {}
+        # requests answered, failed by an ERROR, timed out and lost with their connection
+        self.replied = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.lost = 0
+
+    def __len__(self):
+        return len(self._requests)
+
+    def __contains__(self, xid: int):
+        return xid in self._requests
+
+    def expect(self, conn, xid: int, timeout: Optional[float] = None) -> Future:
+        """Future for the answer to the request sent on conn with xid"""
+        return self._add(conn, xid, timeout, None, None)
+
+    def expect_barrier(self, conn, xid: int, first_xid: int, sent: int,
+                       timeout: Optional[float] = None) -> Future:
+        """
+        Future for the BARRIER_REPLY to xid, sent behind the messages with
+        xids first_xid up to xid. It resolves with a FlowBatchResult.
+        """
+        return self._add(conn, xid, timeout, first_xid, FlowBatchResult(sent))
+
+    def _add(self, conn, xid, timeout, first_xid, batch) -> Future:
+        future = Future()
+        if timeout is None:
+            timeout = self.timeout
+        scheduler = self.scheduler
+        timer = scheduler.call_later(timeout, self._expire, xid)
+        self._requests[xid] = _Request(conn, future, timer, scheduler.clock(), first_xid, batch)
+        xids = self._by_conn.get(conn)
+        if xids is None:
+            self._by_conn[conn] = {xid}
+        else:
+            xids.add(xid)
+        return future
+
+    def resolve(self, conn, xid: int, reply) -> bool:
+        """Complete the request answered by xid on conn; False if there is none"""
+        request = self._requests.get(xid)
+        if request is None or request.conn is not conn:
+            return False
+        self._pop(xid, request)
+        self.replied += 1
+        batch = request.batch
+        if batch is not None:
+            batch.seconds = self.scheduler.clock() - request.sent_at
+            reply = batch
+        _settle(request.future, reply)
+        return True
+
+    def fail(self, conn, xid: int, err) -> bool:
+        """
+        Record an ERROR (src.openflow.openflow.OFError) answering xid on
+        conn. Returns False if no request waits for it.
+        """
+        request = self._requests.get(xid)
+        if request is not None and request.conn is conn:
+            self._pop(xid, request)
+            self.errors += 1
+            _settle(request.future, exc=OpenFlowError(err))
+            return True
+        if not xid:
+            # never sent by the controller (see Controller.next_xid)
+            return False
+        # one of the messages in front of a barrier? xids run 1..0xffffffff and wrap
+        requests = self._requests
+        for barrier_xid in self._by_conn.get(conn, ()):
+            request = requests[barrier_xid]
+            if request.batch is None:
+                continue
+            index = (xid - request.first_xid) % 0xffffffff
+            if index < (barrier_xid - request.first_xid) % 0xffffffff:
+                request.batch.failed.append((index, err))
+                return True
+        return False
+
+    def connection_closed(self, conn) -> int:
+        """Fail every request of conn with ConnectionError; returns how many"""
+        xids = self._by_conn.pop(conn, None)
+        if not xids:
+            return 0
+        for xid in xids:
+            request = self._requests.pop(xid)
+            request.timer.cancel()
+            _settle(request.future, exc=ConnectionError("connection closed before the reply"))
+        self.lost += len(xids)
+        return len(xids)
+
+    def _expire(self, xid: int):
+        request = self._requests.get(xid)
+        if request is None:
+            return
+        self._pop(xid, request)
+        self.timeouts += 1
+        _settle(request.future, exc=TimeoutError("no reply to xid %d" % xid))
+
+    def _pop(self, xid: int, request: _Request):
+        del self._requests[xid]
+        request.timer.cancel()
+        xids = self._by_conn[request.conn]
+        xids.discard(xid)
+        if not xids:
+            del self._by_conn[request.conn]
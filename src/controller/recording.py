@@ -0,0 +1,180 @@
+"""
+Recording of the OpenFlow byte streams the controller receives, and
+offline replay of a recording through the dispatcher.
+
+A recording is an append-only file: an 8-byte magic followed by records
+
+  time_ns(8)  conn(4)  kind(1)  length(4)  data(length)
+
+in network byte order. kind is OPEN or CLOSE (no data) for a connection
+accepted or closed, or DATA for one read: the complete messages it
+returned, back to back. conn is the socket's file descriptor, so it is
+reused, but never while the earlier connection is still open.
+
+The event loop only joins the messages of a read into bytes and queues
+them; a background thread writes the file (see src.utils.log.AsyncWriter).
+"""
+import queue
+import struct
+import threading
+import time
+from dataclasses import dataclass
+
+from src.controller.connection import Connection
+
+MAGIC = b"OFREC\x00\x01\x00"
+RECORD = struct.Struct("!QIBI")
+
+OPEN = 1
+CLOSE = 2
+DATA = 3
+
+
+class Recorder(threading.Thread):
+    """
+    Appends records to path from a background thread. When more than
+    max_pending records are waiting, new ones are dropped and counted
+    instead of growing memory or blocking the event loop.
+    """
+
+    def __init__(self, path, max_pending=100_000, batch=256):
+        super().__init__(name="recorder", daemon=True)
+        self.path = path
+        self.max_pending = max_pending
+        self.batch = batch
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._sentinel = object()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def _put(self, record):
+        if self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            return
+        self._queue.put(record)
+
+    def opened(self, conn_id: int):
+        self._put((time.time_ns(), conn_id, OPEN, b""))
+
+    def closed(self, conn_id: int):
+        self._put((time.time_ns(), conn_id, CLOSE, b""))
+
+    def data(self, conn_id: int, msgs):
+        """Record the messages of one read (memoryviews are copied here)"""
+        self._put((time.time_ns(), conn_id, DATA, b"".join(msgs)))
+
+    def run(self):
+        q = self._queue
+        pack = RECORD.pack
+        while True:
+            record = q.get()
+            chunks = []
+            stop = False
+            while True:
+                if record is self._sentinel:
+                    stop = True
+                    break
+                t, conn_id, kind, data = record
+                chunks.append(pack(t, conn_id, kind, len(data)))
+                chunks.append(data)
+                if len(chunks) >= 2 * self.batch:
+                    break
+                try:
+                    record = q.get_nowait()
+                except queue.Empty:
+                    break
+            if chunks:
+                self._file.write(b"".join(chunks))
+                self._file.flush()
+            if stop:
+                return
+
+    def close(self):
+        """Write out every queued record, stop the thread and close the file"""
+        self._queue.put(self._sentinel)
+        self.join()
+        self._file.close()
+
+
+def read_recording(path) -> list[tuple[int, int, int, bytes]]:
+    """Every (time_ns, conn, kind, data) record of a recording, in order"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a recording: " + str(path))
+    records = []
+    offset = len(MAGIC)
+    end = len(raw)
+    while offset + RECORD.size <= end:
+        t, conn_id, kind, length = RECORD.unpack_from(raw, offset)
+        offset += RECORD.size
+        if offset + length > end:
+            # the writer was killed in the middle of a record
+            break
+        records.append((t, conn_id, kind, raw[offset:offset + length]))
+        offset += length
+    return records
+
+
+class _NullSocket:
+    """Socket stand-in for replayed connections; output is counted and dropped"""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def sendmsg(self, buffers):
+        return sum(len(b) for b in buffers)
+
+    def close(self):
+        pass
+
+
+@dataclass
+class ReplayStats:
+    reads: int = 0
+    messages: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+
+
+def replay(ctrl, records, loops=1) -> ReplayStats:
+    """
+    Feed recorded reads through ctrl's message handling (parseheader,
+    dispatcher, admission) as fast as possible, without sockets or an
+    event loop. Replies go to a null socket. Returns throughput counters;
+    the file is read before timing starts.
+    """
+    stats = ReplayStats()
+    start = time.perf_counter()
+    for _ in range(loops):
+        conns = {}
+        for _, conn_id, kind, data in records:
+            if kind == DATA:
+                conn = conns.get(conn_id)
+                if conn is None or conn.closed:
+                    continue
+                msgs = conn.feed(data)
+                stats.reads += 1
+                stats.messages += len(msgs)
+                stats.bytes += len(data)
+                ctrl.handle_messages(conn, msgs)
+            elif kind == OPEN:
+                conn = conns[conn_id] = Connection(_NullSocket(conn_id), ("replay", conn_id))
+                ctrl.connections[conn_id] = conn
+            elif kind == CLOSE:
+                conn = conns.pop(conn_id, None)
+                if conn is not None:
+                    ctrl.close_connection(conn)
+        for conn in conns.values():
+            ctrl.close_connection(conn)
+    stats.seconds = time.perf_counter() - start
+    return stats
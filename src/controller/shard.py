@@ -0,0 +1,238 @@
+"""
+Multi-process mode: N worker processes, each running its own Controller
+event loop on the same listening port (SO_REUSEPORT lets the kernel spread
+incoming switch connections over the workers). A worker owns the state of
+the switches it accepted.
+
+The supervisor (parent process) keeps one pipe per worker. It is the
+channel for cross-shard queries such as "which switch knows this MAC":
+a query is fanned out to the workers and their answers are merged.
+"""
+import itertools
+import multiprocessing
+from multiprocessing.connection import wait
+import socket
+
+from src.controller.controller import Controller
+from src.controller.state.mac_table import mac_to_bytes
+from src.utils import log
+from src.utils.log import info, error
+
+
+def locate_local(ctrl, mac: str) -> list[tuple[int, int]]:
+    """(dpid, port) of every local datapath that has learned mac"""
+    raw = mac_to_bytes(mac)
+    found = []
+    for dp in ctrl.datapaths.all():
+        table = dp.mac_table
+        port = table.lookup(table.mac_key(raw))
+        if port is not None:
+            found.append((dp.dpid, port))
+    return found
+
+
+class ShardChannel:
+    """
+    Worker side of the supervisor pipe, read from the worker's event loop.
+
+    messages (tuples):
+      supervisor -> worker: ("locate", qid, mac), ("result", qid, answers), ("stop",)
+      worker -> supervisor: ("ready", index), ("located", qid, answers), ("query", qid, mac)
+    """
+
+    def __init__(self, ctrl: Controller, pipe):
+        self.ctrl = ctrl
+        self.pipe = pipe
+        self._callbacks = {}
+        self._qids = itertools.count(1)
+
+    def locate_mac(self, mac: str, callback):
+        """Ask the other workers which of their switches know mac; callback(answers) runs on reply"""
+        qid = next(self._qids)
+        self._callbacks[qid] = callback
+        self.pipe.send(("query", qid, mac))
+
+    def on_readable(self):
+        while self.pipe.poll():
+            try:
+                msg = self.pipe.recv()
+            except EOFError:
+                # the supervisor is gone
+                self.ctrl.stop()
+                return
+            kind = msg[0]
+            if kind == "locate":
+                _, qid, mac = msg
+                self.pipe.send(("located", qid, locate_local(self.ctrl, mac)))
+            elif kind == "result":
+                _, qid, answers = msg
+                callback = self._callbacks.pop(qid, None)
+                if callback is not None:
+                    callback(answers)
+            elif kind == "stop":
+                self.ctrl.stop()
+
+
+def run_worker(index, pipe, host, port, log_level, controller_kwargs):
+    """Entry point of a worker process"""
+    log.set_level(log_level)
+    log.start_async()
+    ctrl = Controller(host, port, reuse_port=True, **controller_kwargs)
+    ctrl.shard = ShardChannel(ctrl, pipe)
+    try:
+        ctrl.listen()
+        ctrl.add_reader(pipe, ctrl.shard.on_readable)
+        pipe.send(("ready", index))
+        ctrl.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ctrl.close()
+        log.stop_async()
+
+
+class _Query:
+    __slots__ = ("waiting", "answers", "callback")
+
+    def __init__(self, callback):
+        # pipes of the workers that have not answered yet
+        self.waiting = set()
+        self.answers = []
+        self.callback = callback
+
+
+class ShardSupervisor:
+    def __init__(self, workers: int, host='0.0.0.0', port=6634, log_level=log.INFO, **controller_kwargs):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.log_level = log_level
+        self.controller_kwargs = controller_kwargs
+        self._pipes = []
+        self._procs = []
+        self._reserved = None
+        self._queries: dict[int, _Query] = {}
+        self._qids = itertools.count(1)
+        self._running = False
+
+    def start(self, timeout=10.0):
+        """Spawn the workers and wait until each one is listening"""
+        if self.port == 0:
+            # hold a bound (not listening) socket so every worker gets the same free port
+            self._reserved = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._reserved.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self._reserved.bind((self.host, 0))
+            self.port = self._reserved.getsockname()[1]
+        for index in range(self.workers):
+            parent_end, child_end = multiprocessing.Pipe()
+            proc = multiprocessing.Process(
+                target=run_worker,
+                args=(index, child_end, self.host, self.port, self.log_level, self.controller_kwargs),
+                name=f"controller-worker-{index}",
+                daemon=True,
+            )
+            proc.start()
+            child_end.close()
+            self._pipes.append(parent_end)
+            self._procs.append(proc)
+        for pipe in self._pipes:
+            if not pipe.poll(timeout) or pipe.recv()[0] != "ready":
+                raise RuntimeError("Controller worker failed to start")
+        info("Started %d workers on %s %s", self.workers, self.host, self.port)
+
+    def locate_mac(self, mac: str, timeout=5.0) -> list[tuple[int, int]]:
+        """(dpid, port) of every switch, on any worker, that knows mac"""
+        result = []
+        qid = self._fan_out(mac, None, result.extend)
+        while qid in self._queries:
+            if not self.poll(timeout):
+                self._queries.pop(qid, None)
+                raise TimeoutError(f"No answer for {mac} from every worker")
+        return result
+
+    def _fan_out(self, mac, exclude, callback):
+        qid = next(self._qids)
+        query = self._queries[qid] = _Query(callback)
+        for pipe in list(self._pipes):
+            if pipe is not exclude and self._send(pipe, ("locate", qid, mac)):
+                query.waiting.add(pipe)
+        if not query.waiting:
+            del self._queries[qid]
+            callback([])
+        return qid
+
+    def _send(self, pipe, msg) -> bool:
+        """Send msg to a worker; False if it has exited"""
+        try:
+            pipe.send(msg)
+            return True
+        except OSError:
+            self._worker_exited(pipe)
+            return False
+
+    def _answered(self, qid, query, pipe):
+        query.waiting.discard(pipe)
+        if not query.waiting:
+            del self._queries[qid]
+            query.callback(query.answers)
+
+    def _worker_exited(self, pipe):
+        """Forget a worker's pipe and stop waiting for its answers"""
+        if pipe not in self._pipes:
+            return
+        error("Controller worker exited")
+        self._pipes.remove(pipe)
+        pipe.close()
+        for qid, query in list(self._queries.items()):
+            if pipe in query.waiting:
+                self._answered(qid, query, pipe)
+
+    def poll(self, timeout=None) -> bool:
+        """Handle messages from the workers; False if none arrived within timeout"""
+        ready = wait(self._pipes, timeout)
+        for pipe in ready:
+            if pipe not in self._pipes:
+                # closed while handling an earlier message
+                continue
+            try:
+                msg = pipe.recv()
+            except (EOFError, OSError):
+                self._worker_exited(pipe)
+                continue
+            kind = msg[0]
+            if kind == "query":
+                _, wqid, mac = msg
+                self._fan_out(mac, pipe, lambda answers, pipe=pipe, wqid=wqid: self._send(pipe, ("result", wqid, answers)))
+            elif kind == "located":
+                _, qid, answers = msg
+                query = self._queries.get(qid)
+                if query is None or pipe not in query.waiting:
+                    continue
+                query.answers.extend(answers)
+                self._answered(qid, query, pipe)
+        return bool(ready)
+
+    def serve_forever(self):
+        self._running = True
+        while self._running and self._pipes:
+            self.poll(0.5)
+
+    def stop(self, timeout=5.0):
+        self._running = False
+        for pipe in self._pipes:
+            try:
+                pipe.send(("stop",))
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+        for pipe in self._pipes:
+            pipe.close()
+        self._pipes.clear()
+        self._procs.clear()
+        if self._reserved is not None:
+            self._reserved.close()
+            self._reserved = None
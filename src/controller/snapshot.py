@@ -0,0 +1,286 @@
+"""
+Snapshots of the controller's learned state, so a restarted controller
+forwards with the MACs, flows and ARP bindings it had instead of flooding
+until it relearns them.
+
+A snapshot file is an 8-byte magic, then
+
+  taken_at(8)  n_datapaths(4)
+
+and per datapath
+
+  dpid(8)  n_buffers(4)  n_tables(1)  capabilities(4)  actions(4)
+  n_ports(4)  n_macs(4)  n_flows(4)  n_arp(4)
+  ports         n_ports * ofp_phy_port(48)
+  macs          n_macs * mac(8), then n_macs * port(2), then n_macs * learned_at(8)
+  flows         n_flows * (ofp_match(40)  priority(2)  out_port(2)  idle(2)  hard(2)  installed_at(8))
+  arp           n_arp * (ip(4)  mac(6)  learned_at(8))
+
+Everything is in network byte order; times are Unix time. The MAC
+columns are copied into arrays in one go when the file is loaded
+through mmap.
+
+The event loop only copies references to the tables (capture()); a
+background thread encodes them and replaces the file atomically. On
+load, entries keep their original learned_at/installed_at, so anything
+that has expired while the controller was down is dropped and the rest
+expires when it would have.
+"""
+from array import array
+from dataclasses import dataclass, field
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from src.controller.state.mac_table import mac_to_int
+from src.openflow.codec import MATCH, PHY_PORT
+from src.openflow.flow import FlowEntry
+from src.openflow.match import OFMatch, match_fields
+from src.openflow.openflow import parse_phy_port
+from src.utils.log import error
+
+MAGIC = b"OFSNAP\x00\x02"
+HEADER = struct.Struct("!dI")
+DATAPATH = struct.Struct("!QIBIIIIII")
+FLOW = struct.Struct("!HHHHd")
+# a flow record: its match followed by FLOW
+_FLOW_RECORD = struct.Struct(MATCH.format + FLOW.format[1:])
+ARP_BINDING = struct.Struct("!4s6sd")
+
+# the arrays hold MAC columns in host order, the file in network order
+_SWAP = sys.byteorder == "little"
+
+
+@dataclass
+class DatapathState:
+    dpid: int
+    n_buffers: int
+    n_tables: int
+    capabilities: int
+    actions: int
+    ports: list
+    # MACLearningTable.export() entries, or (macs, ports, learned_at) columns
+    macs: object
+    flows: list[FlowEntry]
+    # ARPCache.export() bindings
+    arp: list = field(default_factory=list)
+
+
+@dataclass
+class Snapshot:
+    taken_at: float
+    datapaths: list[DatapathState] = field(default_factory=list)
+
+
+@dataclass
+class RestoreStats:
+    datapaths: int = 0
+    macs: int = 0
+    stale_macs: int = 0
+    flows: int = 0
+    stale_flows: int = 0
+    arp: int = 0
+    stale_arp: int = 0
+    seconds: float = 0.0
+
+
+def capture(ctrl, now=None) -> Snapshot:
+    """Take the controller's state; run on the event loop, copies only lists and arrays"""
+    if now is None:
+        now = time.time()
+    snapshot = Snapshot(now)
+    for dp in ctrl.datapaths.all():
+        snapshot.datapaths.append(DatapathState(
+            dp.dpid, dp.n_buffers, dp.n_tables, dp.capabilities, dp.actions,
+            list(dp.ports.values()), dp.mac_table.export(), dp.flow_table.export(),
+            dp.arp_cache.export() if dp.arp_cache is not None else []))
+    return snapshot
+
+
+def _mac_columns(macs) -> tuple[array, array, array]:
+    if isinstance(macs, tuple):
+        return macs
+    return (array("Q", [mac_to_int(e.mac) for e in macs]), array("H", [e.port for e in macs]),
+            array("d", [e.learned_at for e in macs]))
+
+
+def _column_bytes(column: array) -> bytes:
+    if _SWAP:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _pack_port(port) -> bytes:
+    return PHY_PORT.pack(port.port_no, bytes.fromhex(port.hw_addr.replace(":", "")), port.name.encode(),
+                         port.config, port.state, port.curr, port.advertised, port.supported, port.peer)
+
+
+def encode(snapshot: Snapshot) -> bytes:
+    pack_flow = _FLOW_RECORD.pack
+    chunks = [MAGIC, HEADER.pack(snapshot.taken_at, len(snapshot.datapaths))]
+    for dp in snapshot.datapaths:
+        macs, ports, learned_at = _mac_columns(dp.macs)
+        chunks.append(DATAPATH.pack(dp.dpid, dp.n_buffers, dp.n_tables, dp.capabilities, dp.actions,
+                                    len(dp.ports), len(macs), len(dp.flows), len(dp.arp)))
+        chunks.extend(_pack_port(port) for port in dp.ports)
+        chunks += (_column_bytes(macs), _column_bytes(ports), _column_bytes(learned_at))
+        chunks.extend(pack_flow(*match_fields(flow.match), flow.priority, flow.out_port, flow.idle_timeout,
+                                flow.hard_timeout, flow.installed_at) for flow in dp.flows)
+        chunks.extend(ARP_BINDING.pack(ip, mac, learned_at) for ip, (mac, learned_at) in dp.arp)
+    return b"".join(chunks)
+
+
+def write_snapshot(path, snapshot: Snapshot) -> int:
+    """Encode snapshot and replace path with it atomically; returns the file size"""
+    data = encode(snapshot)
+    tmp = "%s.tmp" % path
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(data)
+
+
+def _column(view, offset: int, typecode: str, n: int) -> tuple[array, int]:
+    column = array(typecode)
+    end = offset + n * column.itemsize
+    if end > len(view):
+        raise ValueError("Truncated snapshot")
+    column.frombytes(view[offset:end])
+    if _SWAP:
+        column.byteswap()
+    return column, end
+
+
+def decode(view) -> Snapshot:
+    """Parse a snapshot from a buffer (bytes, or a memoryview of the mmap)"""
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a snapshot")
+    try:
+        taken_at, n_datapaths = HEADER.unpack_from(view, len(MAGIC))
+        offset = len(MAGIC) + HEADER.size
+        snapshot = Snapshot(taken_at)
+        for _ in range(n_datapaths):
+            dpid, n_buffers, n_tables, capabilities, actions, n_ports, n_macs, n_flows, n_arp = \
+                DATAPATH.unpack_from(view, offset)
+            offset += DATAPATH.size
+            ports = [parse_phy_port(view, offset + i * PHY_PORT.size) for i in range(n_ports)]
+            offset += n_ports * PHY_PORT.size
+            macs, offset = _column(view, offset, "Q", n_macs)
+            mac_ports, offset = _column(view, offset, "H", n_macs)
+            learned_at, offset = _column(view, offset, "d", n_macs)
+            end = offset + n_flows * _FLOW_RECORD.size
+            if end > len(view):
+                raise ValueError("Truncated snapshot")
+            flows = [FlowEntry(OFMatch(*f[:13]), *f[13:]) for f in _FLOW_RECORD.iter_unpack(view[offset:end])]
+            offset = end
+            arp = []
+            for _ in range(n_arp):
+                ip, mac, arp_learned_at = ARP_BINDING.unpack_from(view, offset)
+                arp.append((ip, (mac, arp_learned_at)))
+                offset += ARP_BINDING.size
+            snapshot.datapaths.append(DatapathState(dpid, n_buffers, n_tables, capabilities, actions,
+                                                    ports, (macs, mac_ports, learned_at), flows, arp))
+    except struct.error as e:
+        raise ValueError("Truncated snapshot: %s" % e) from None
+    return snapshot
+
+
+def read_snapshot(path) -> Snapshot:
+    """Map path into memory and decode it"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return decode(view)
+
+
+def restore(ctrl, snapshot: Snapshot, now=None) -> RestoreStats:
+    """
+    Load a snapshot into ctrl's empty registry. Datapaths
+    come back unconnected (see DatapathRegistry.restore); entries that
+    have expired since the snapshot was taken are dropped.
+    """
+    start = time.perf_counter()
+    if now is None:
+        now = time.time()
+    stats = RestoreStats()
+    for state in snapshot.datapaths:
+        dp = ctrl.datapaths.restore(state.dpid, state.n_buffers, state.n_tables, state.capabilities,
+                                    state.actions, {port.port_no: port for port in state.ports})
+        columns = _mac_columns(state.macs)
+        loaded = dp.mac_table.restore(*columns, now=now)
+        stats.macs += loaded
+        stats.stale_macs += len(columns[0]) - loaded
+        loaded = dp.flow_table.restore(state.flows, now)
+        stats.flows += loaded
+        stats.stale_flows += len(state.flows) - loaded
+        if dp.arp_cache is not None:
+            loaded = dp.arp_cache.restore(state.arp, now)
+            stats.arp += loaded
+            stats.stale_arp += len(state.arp) - loaded
+        stats.datapaths += 1
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+class SnapshotWriter(threading.Thread):
+    """
+    Writes captured snapshots to path from a background thread. One
+    snapshot is written at a time; one submitted while the previous is
+    still being written is dropped and counted, since a newer one follows.
+    """
+
+    def __init__(self, path):
+        super().__init__(name="snapshot", daemon=True)
+        self.path = path
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        # size and encode+write time of the last snapshot written
+        self.last_bytes = 0
+        self.last_seconds = 0.0
+        self._pending = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def submit(self, snapshot: Snapshot) -> bool:
+        """Queue snapshot for writing; False if the previous one is not written yet"""
+        with self._lock:
+            if self._pending is not None:
+                self.skipped += 1
+                return False
+            self._pending = snapshot
+        self._wake.set()
+        return True
+
+    def run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                snapshot = self._pending
+            if snapshot is not None:
+                start = time.perf_counter()
+                try:
+                    self.last_bytes = write_snapshot(self.path, snapshot)
+                    self.last_seconds = time.perf_counter() - start
+                    self.written += 1
+                except OSError as e:
+                    self.failed += 1
+                    error("Error writing snapshot %s: %s", self.path, e)
+                with self._lock:
+                    self._pending = None
+            if self._stopping:
+                return
+
+    def close(self):
+        """Finish the snapshot being written and stop the thread"""
+        self._stopping = True
+        self._wake.set()
+        self.join()
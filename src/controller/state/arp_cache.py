@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from typing import Optional
+import time
+
+
+class ARPCache:
+    """
+    IPv4 address -> MAC, learned from the ARP packets the controller sees,
+    so ARP requests can be answered without flooding them.
+
+    Addresses and MACs are raw bytes (4 and 6). Entries are kept in the
+    order they were last learned, so the oldest is at the front: aging
+    pops expired entries from there and a full table evicts from there.
+    A lookup does not refresh an entry; only the owner's own ARP traffic
+    proves the binding is still current.
+
+    A request that could not be answered is flooded, and its copies come
+    back from the other switches. Those echoes must not be answered once
+    the target's reply has been learned, or the requester gets a reply per
+    switch; flooded requests are remembered for echo_window seconds. The
+    copies reach the other switches' caches, so those may share one record
+    (flooded); it only ever stops an answer, never gives one.
+    """
+
+    def __init__(self, timeout_seconds: float = 60.0, max_entries: Optional[int] = None,
+                 echo_window: float = 1.0, flooded: Optional[OrderedDict] = None):
+        self.timeout_seconds = timeout_seconds
+        self.max_entries = max_entries
+        self.echo_window = echo_window
+        # ip -> (mac, learned_at), least recently learned first
+        self._entries: OrderedDict[bytes, tuple[bytes, float]] = OrderedDict()
+        # (sender ip, target ip) of flooded requests -> when, oldest first
+        self._flooded: OrderedDict[tuple[bytes, bytes], float] = OrderedDict() if flooded is None else flooded
+        # lookups, lookups that found a MAC, and requests answered from the cache
+        self.lookups = 0
+        self.lookup_hits = 0
+        self.answered = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, ip: bytes):
+        return ip in self._entries
+
+    def learn(self, ip: bytes, mac: bytes, now: Optional[float] = None):
+        if now is None:
+            now = time.time()
+        entries = self._entries
+        if ip in entries:
+            entries.move_to_end(ip)
+        elif self.max_entries is not None and len(entries) >= self.max_entries:
+            entries.popitem(last=False)
+            self.evicted += 1
+        entries[ip] = (mac, now)
+
+    def lookup(self, ip: bytes, now: Optional[float] = None) -> Optional[bytes]:
+        """MAC of ip, or None if it is unknown or its entry has expired"""
+        self.lookups += 1
+        entry = self._entries.get(ip)
+        if entry is None:
+            return None
+        if now is None:
+            now = time.time()
+        if now - entry[1] > self.timeout_seconds:
+            del self._entries[ip]
+            return None
+        self.lookup_hits += 1
+        return entry[0]
+
+    def flooded(self, sender_ip: bytes, target_ip: bytes, now: float):
+        """Remember that a request was flooded; expired ones are dropped here"""
+        flooded = self._flooded
+        deadline = now - self.echo_window
+        while flooded and next(iter(flooded.values())) < deadline:
+            flooded.popitem(last=False)
+        key = (sender_ip, target_ip)
+        flooded.pop(key, None)
+        flooded[key] = now
+
+    def is_echo(self, sender_ip: bytes, target_ip: bytes, now: float) -> bool:
+        """True if the same request was flooded within echo_window"""
+        when = self._flooded.get((sender_ip, target_ip))
+        return when is not None and now - when <= self.echo_window
+
+    def age_out(self, now: Optional[float] = None) -> int:
+        """Drop expired entries; returns how many"""
+        if now is None:
+            now = time.time()
+        deadline = now - self.timeout_seconds
+        entries = self._entries
+        expired = 0
+        while entries:
+            ip, (_, learned_at) = next(iter(entries.items()))
+            if learned_at >= deadline:
+                break
+            del entries[ip]
+            expired += 1
+        return expired
+
+    def export(self) -> list[tuple[bytes, tuple[bytes, float]]]:
+        """(ip, (mac, learned_at)) bindings, oldest first, e.g. for a snapshot"""
+        return list(self._entries.items())
+
+    def restore(self, bindings, now: Optional[float] = None) -> int:
+        """
+        Replace the bindings with (ip, (mac, learned_at)) pairs, keeping
+        their original learned_at; expired ones and the oldest beyond
+        max_entries are skipped. Returns how many were loaded.
+        """
+        if now is None:
+            now = time.time()
+        deadline = now - self.timeout_seconds
+        live = sorted((b for b in bindings if b[1][1] >= deadline), key=lambda b: b[1][1])
+        if self.max_entries is not None and len(live) > self.max_entries:
+            live = live[len(live) - self.max_entries:]
+        self.clear()
+        self._entries.update(live)
+        return len(live)
+
+    def clear(self):
+        self._entries.clear()
+        self._flooded.clear()
@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Union, TYPE_CHECKING
+import threading
+
+from src.controller.state.arp_cache import ARPCache
+from src.controller.state.mac_table import CompactMACTable, MACEntry, MACLearningTable
+from src.openflow.flow import FlowTable
+
+if TYPE_CHECKING:
+    from src.openflow.openflow import OFFeaturesReply, OFPhyPort
+
+
+@dataclass
+class Datapath:
+    """State of one connected switch, created from its FEATURES_REPLY."""
+    dpid: int
+    n_buffers: int
+    n_tables: int
+    capabilities: int
+    actions: int
+    ports: dict[int, "OFPhyPort"]
+    mac_table: Union[MACLearningTable, CompactMACTable]
+    conn: object = field(default=None, repr=False)
+    # flows the controller has pushed to this switch
+    flow_table: FlowTable = field(default_factory=FlowTable, repr=False)
+    # IP -> MAC bindings learned on this switch for the ARP proxy; None when it is off
+    arp_cache: Optional[ARPCache] = field(default=None, repr=False)
+    # loaded from a snapshot and not connected since
+    restored: bool = False
+
+
+class DatapathRegistry:
+    """
+    Datapaths keyed by datapath_id.
+
+    Lookups are a plain dict get and take no lock; register/unregister
+    swap entries under a lock so the registry can be shared with other
+    threads. Each datapath owns its MAC table and ARP cache, so what is
+    learned on one switch never affects forwarding or ARP answers on another.
+    """
+
+    def __init__(self, mac_timeout_seconds: int = 300, mac_max_entries: Optional[int] = None,
+                 on_mac_expire: Optional[Callable[[Datapath, MACEntry], None]] = None,
+                 compact_mac_tables: bool = False, arp_timeout_seconds: Optional[float] = None,
+                 arp_max_entries: Optional[int] = None):
+        self.mac_timeout_seconds = mac_timeout_seconds
+        self.mac_max_entries = mac_max_entries
+        # integer-keyed, array-backed tables for very large host populations
+        self.mac_table_class = CompactMACTable if compact_mac_tables else MACLearningTable
+        # called when a MAC ages out or is evicted from a datapath's table
+        self.on_mac_expire = on_mac_expire
+        # lifetime of ARP bindings; None (or 0) gives datapaths no ARP cache
+        self.arp_timeout_seconds = arp_timeout_seconds
+        self.arp_max_entries = arp_max_entries
+        # requests flooded on any switch; their copies on the others are not answered
+        self._arp_flooded = OrderedDict()
+        self._datapaths: dict[int, Datapath] = {}
+        self._lock = threading.Lock()
+
+    def register(self, features: "OFFeaturesReply", conn=None) -> Datapath:
+        """Create or refresh the datapath described by a FEATURES_REPLY"""
+        ports = {port.port_no: port for port in features.ports}
+        with self._lock:
+            dp = self._datapaths.get(features.datapath_id)
+            if dp is None:
+                dp = Datapath(
+                    dpid=features.datapath_id,
+                    n_buffers=features.n_buffers,
+                    n_tables=features.n_tables,
+                    capabilities=features.capabilities,
+                    actions=features.actions,
+                    ports=ports,
+                    mac_table=self.mac_table_class(self.mac_timeout_seconds, self.mac_max_entries),
+                    conn=conn,
+                    arp_cache=self._arp_cache(),
+                )
+                dp.mac_table.on_expire = self._mac_expire_hook(dp)
+                self._datapaths[dp.dpid] = dp
+            else:
+                # reconnect or repeated FEATURES_REPLY: keep the learned MACs
+                dp.n_buffers = features.n_buffers
+                dp.n_tables = features.n_tables
+                dp.capabilities = features.capabilities
+                dp.actions = features.actions
+                dp.ports = ports
+                dp.conn = conn
+                if dp.restored:
+                    # first connection since our restart: the switch kept its flows
+                    dp.restored = False
+                else:
+                    # the switch may have restarted and lost its flows
+                    dp.flow_table.clear()
+        return dp
+
+    def restore(self, dpid: int, n_buffers: int, n_tables: int, capabilities: int, actions: int,
+                ports: dict[int, "OFPhyPort"]) -> Datapath:
+        """
+        Create a datapath known from before a restart (see
+        src.controller.snapshot) with empty tables and no connection. The
+        switch's FEATURES_REPLY on reconnect then keeps what was restored.
+        """
+        dp = Datapath(
+            dpid=dpid,
+            n_buffers=n_buffers,
+            n_tables=n_tables,
+            capabilities=capabilities,
+            actions=actions,
+            ports=ports,
+            mac_table=self.mac_table_class(self.mac_timeout_seconds, self.mac_max_entries),
+            arp_cache=self._arp_cache(),
+            restored=True,
+        )
+        dp.mac_table.on_expire = self._mac_expire_hook(dp)
+        with self._lock:
+            self._datapaths[dpid] = dp
+        return dp
+
+    def unregister(self, dpid: int, conn=None) -> Optional[Datapath]:
+        """
+        Remove a datapath. With conn given, only remove it if it still
+        belongs to that connection (the switch may already have reconnected).
+        """
+        with self._lock:
+            dp = self._datapaths.get(dpid)
+            if dp is None or (conn is not None and dp.conn is not conn):
+                return None
+            del self._datapaths[dpid]
+        return dp
+
+    def _arp_cache(self) -> Optional[ARPCache]:
+        if not self.arp_timeout_seconds:
+            return None
+        return ARPCache(self.arp_timeout_seconds, self.arp_max_entries, flooded=self._arp_flooded)
+
+    def _mac_expire_hook(self, dp: Datapath):
+        def hook(entry: MACEntry):
+            if self.on_mac_expire is not None:
+                self.on_mac_expire(dp, entry)
+        return hook
+
+    def age_out(self, now: Optional[float] = None) -> int:
+        """Expire stale MACs, shadow flows and ARP bindings on every datapath; returns how many MACs expired"""
+        expired = 0
+        for dp in self.all():
+            expired += dp.mac_table.age_out(now)
+            dp.flow_table.age_out(now)
+            if dp.arp_cache is not None:
+                dp.arp_cache.age_out(now)
+        return expired
+
+    def get(self, dpid: int) -> Optional[Datapath]:
+        return self._datapaths.get(dpid)
+
+    def __contains__(self, dpid: int):
+        return dpid in self._datapaths
+
+    def __len__(self):
+        return len(self._datapaths)
+
+    def all(self) -> list[Datapath]:
+        """Snapshot of the registered datapaths"""
+        with self._lock:
+            return list(self._datapaths.values())
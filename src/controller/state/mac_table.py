@@ -1,50 +1,540 @@
+from array import array
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional, Union
+import heapq
 import time
 
 
 @dataclass
 class MACEntry:
-    mac: str
+    mac: Union[str, int]
     port: int
     learned_at: float
 
 
+def mac_to_int(mac: Union[str, bytes]) -> int:
+    """'aa:bb:cc:dd:ee:ff' or 6 raw bytes -> 48-bit integer"""
+    if isinstance(mac, str):
+        return int(mac.replace(":", ""), 16)
+    return int.from_bytes(mac, "big")
+
+
+def int_to_mac(value: int) -> str:
+    """48-bit integer -> 'aa:bb:cc:dd:ee:ff'"""
+    return value.to_bytes(6, "big").hex(":")
+
+
+def mac_to_bytes(mac: Union[str, int]) -> bytes:
+    """Table key (string or integer MAC) -> 6 raw bytes"""
+    if isinstance(mac, int):
+        return mac.to_bytes(6, "big")
+    return bytes.fromhex(mac.replace(":", ""))
+
+
 class MACLearningTable:
-    def __init__(self, timeout_seconds: int = 300):
+    def __init__(self, timeout_seconds: int = 300, max_entries: Optional[int] = None,
+                 on_expire: Optional[Callable[[MACEntry], None]] = None):
         """
         Initialize the table.
-        Implementation will enforce timeout on entries.
+        Entries older than timeout_seconds expire; with max_entries set, the
+        least recently used entry is evicted when the table is full.
+        on_expire is called with every entry that expires or is evicted.
         """
         self.timeout_seconds = timeout_seconds
-        self._entries: dict[str, MACEntry] = {}
+        self.max_entries = max_entries
+        self.on_expire = on_expire
+        # ordered from least to most recently used
+        self._entries: OrderedDict[str, MACEntry] = OrderedDict()
+        # min-heap of (deadline, mac). A MAC normally has one heap item; a
+        # refreshed entry is rescheduled when its old deadline pops, and items
+        # of removed entries are skipped when they pop (lazy deletion).
+        self._expiry: list[tuple[float, str]] = []
+        # port -> MACs learned on it, so a port going down purges only its own entries
+        self._by_port: dict[int, set[str]] = {}
+        # learns of already known MACs and lookups that found a port, for hit rates
+        self.learns = 0
+        self.learn_hits = 0
+        self.lookups = 0
+        self.lookup_hits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, mac: str):
+        return mac in self._entries
 
+    @staticmethod
+    def mac_key(raw) -> str:
+        """Table key for 6 raw MAC bytes"""
+        return raw.hex(":")
 
-    def learn(self, mac: str, port: int, now: Optional[float] = None):
-        """Record a source MAC on an ingress port"""
+    def learn(self, mac: str, port: int, now: Optional[float] = None) -> Optional[int]:
+        """Record a source MAC on an ingress port; returns the port it was on before, if known"""
         if now is None:
             now = time.time()
+        self.learns += 1
+        entry = self._entries.get(mac)
+        if entry is not None:
+            self.learn_hits += 1
+            # refresh in place; the heap item is rescheduled lazily
+            previous = entry.port
+            if previous != port:
+                self._move(mac, previous, port)
+            entry.port = port
+            entry.learned_at = now
+            self._entries.move_to_end(mac)
+            return previous
         self._entries[mac] = MACEntry(mac, port, now)
+        self._by_port.setdefault(port, set()).add(mac)
+        heapq.heappush(self._expiry, (now + self.timeout_seconds, mac))
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._unindex(evicted)
+            self._expired(evicted)
+        if len(self._expiry) > 2 * len(self._entries) + 64:
+            self._rebuild_expiry()
+        return None
+
+    def learn_many(self, learned: dict, now: Optional[float] = None) -> list:
+        """
+        learn() for a burst: learned maps MAC -> ingress port, all learned at
+        one timestamp. Returns the MACs that were known on another port.
+        """
+        if now is None:
+            now = time.time()
+        entries = self._entries
+        move_to_end = entries.move_to_end
+        moved = []
+        new = []
+        for mac, port in learned.items():
+            entry = entries.get(mac)
+            if entry is None:
+                new.append(mac)
+                continue
+            if entry.port != port:
+                moved.append(mac)
+                self._move(mac, entry.port, port)
+            entry.port = port
+            entry.learned_at = now
+            move_to_end(mac)
+        self.learns += len(learned)
+        self.learn_hits += len(learned) - len(new)
+        if new:
+            entries.update([(mac, MACEntry(mac, learned[mac], now)) for mac in new])
+            deadline = now + self.timeout_seconds
+            expiry = self._expiry
+            by_port = self._by_port
+            for mac in new:
+                heapq.heappush(expiry, (deadline, mac))
+                port = learned[mac]
+                macs = by_port.get(port)
+                if macs is None:
+                    by_port[port] = {mac}
+                else:
+                    macs.add(mac)
+            if self.max_entries is not None:
+                while len(entries) > self.max_entries:
+                    _, evicted = entries.popitem(last=False)
+                    self._unindex(evicted)
+                    self._expired(evicted)
+            if len(expiry) > 2 * len(entries) + 64:
+                self._rebuild_expiry()
+        return moved
+
     def lookup(self, mac: str, now: Optional[float] = None) -> Optional[int]:
         """Lookup destination MAC and return port if present"""
         if now is None:
             now = time.time()
+        self.lookups += 1
         entry = self._entries.get(mac)
         if entry is None:
             return None
         if now - entry.learned_at > self.timeout_seconds:
             del self._entries[mac]
+            self._unindex(entry)
+            self._expired(entry)
             return None
+        self._entries.move_to_end(mac)
+        self.lookup_hits += 1
         return entry.port
 
-    def age_out(self, now: Optional[float] = None):
-        """Expire stale entries"""
+    def remove(self, mac: str) -> Optional[MACEntry]:
+        """Forget a MAC without calling on_expire"""
+        entry = self._entries.pop(mac, None)
+        if entry is not None:
+            self._unindex(entry)
+        return entry
+
+    def remove_port(self, port: int) -> list[MACEntry]:
+        """Forget every MAC learned on port (it went down) without calling on_expire"""
+        macs = self._by_port.pop(port, None)
+        if not macs:
+            return []
+        entries = self._entries
+        return [entries.pop(mac) for mac in macs]
+
+    def port_macs(self, port: int) -> set:
+        """MACs currently learned on port"""
+        return set(self._by_port.get(port, ()))
+
+    def age_out(self, now: Optional[float] = None) -> int:
+        """
+        Expire stale entries and return how many expired.
+        Only heap items whose deadline has passed are visited.
+        """
         if now is None:
             now = time.time()
-        for mac, entry in list(self._entries.items()):
-            if now - entry.learned_at > self.timeout_seconds:
-                del self._entries[mac]
+        expiry = self._expiry
+        entries = self._entries
+        expired = 0
+        while expiry and expiry[0][0] < now:
+            _, mac = heapq.heappop(expiry)
+            entry = entries.get(mac)
+            if entry is None:
+                continue
+            deadline = entry.learned_at + self.timeout_seconds
+            if deadline >= now:
+                # refreshed since it was scheduled
+                heapq.heappush(expiry, (deadline, mac))
+                continue
+            del entries[mac]
+            self._unindex(entry)
+            self._expired(entry)
+            expired += 1
+        return expired
 
     def clear(self):
         """Clear all entries"""
         self._entries.clear()
+        self._expiry.clear()
+        self._by_port.clear()
+
+    def export(self) -> list[MACEntry]:
+        """
+        The entries, least recently used first, e.g. for a snapshot. Only
+        the list is copied, so this is cheap enough for the event loop.
+        """
+        return list(self._entries.values())
+
+    def restore(self, macs, ports, learned_at, now: Optional[float] = None) -> int:
+        """
+        Replace the contents with entries given as columns of integer
+        MACs, ports and learn times (e.g. read from a snapshot). Entries
+        keep their original learned_at, so they expire when they would have;
+        those already expired, and the oldest beyond max_entries, are
+        skipped. Returns how many were loaded.
+        """
+        if now is None:
+            now = time.time()
+        self.clear()
+        cutoff = now - self.timeout_seconds
+        live = [i for i in sorted(range(len(learned_at)), key=learned_at.__getitem__) if learned_at[i] >= cutoff]
+        if self.max_entries is not None and len(live) > self.max_entries:
+            live = live[len(live) - self.max_entries:]
+        entries = self._entries
+        by_port = self._by_port
+        for i in live:
+            mac = int_to_mac(macs[i])
+            port = ports[i]
+            entries[mac] = MACEntry(mac, port, learned_at[i])
+            by_port.setdefault(port, set()).add(mac)
+        self._rebuild_expiry()
+        return len(live)
+
+    def _move(self, mac: str, old_port: int, port: int):
+        macs = self._by_port.get(old_port)
+        if macs is not None:
+            macs.discard(mac)
+            if not macs:
+                del self._by_port[old_port]
+        self._by_port.setdefault(port, set()).add(mac)
+
+    def _unindex(self, entry: MACEntry):
+        macs = self._by_port.get(entry.port)
+        if macs is not None:
+            macs.discard(entry.mac)
+            if not macs:
+                del self._by_port[entry.port]
+
+    def _expired(self, entry: MACEntry):
+        if self.on_expire is not None:
+            self.on_expire(entry)
+
+    def _rebuild_expiry(self):
+        # drop items of removed/evicted entries once they outnumber live ones
+        timeout = self.timeout_seconds
+        self._expiry = [(e.learned_at + timeout, mac) for mac, e in self._entries.items()]
+        heapq.heapify(self._expiry)
+
+
+class CompactMACTable:
+    """
+    MAC table for large host populations, keyed by 48-bit integer MACs.
+
+    Ports, timestamps and MACs live in parallel array columns indexed by a
+    slot number; the dict only maps MAC -> slot. Removal moves the last slot
+    into the hole, so the columns stay dense. Expiry uses the same lazy
+    deadline heap as MACLearningTable, with each item packed into one int
+    (deadline in milliseconds << 48 | mac). At capacity the least recently
+    learned entry is evicted (lookups do not count as use here).
+    """
+
+    def __init__(self, timeout_seconds: int = 300, max_entries: Optional[int] = None,
+                 on_expire: Optional[Callable[[MACEntry], None]] = None):
+        self.timeout_seconds = timeout_seconds
+        self.max_entries = max_entries
+        self.on_expire = on_expire
+        self._slots: dict[int, int] = {}
+        self._macs = array("Q")
+        self._ports = array("H")
+        self._learned_at = array("d")
+        self._expiry: list[int] = []
+        # port -> MACs learned on it, so a port going down purges only its own entries
+        self._by_port: dict[int, set[int]] = {}
+        # learns of already known MACs and lookups that found a port, for hit rates
+        self.learns = 0
+        self.learn_hits = 0
+        self.lookups = 0
+        self.lookup_hits = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, mac: int):
+        return mac in self._slots
+
+    @staticmethod
+    def mac_key(raw) -> int:
+        """Table key for 6 raw MAC bytes"""
+        return int.from_bytes(raw, "big")
+
+    def _deadline_key(self, learned_at: float, mac: int) -> int:
+        return (int((learned_at + self.timeout_seconds) * 1000) << 48) | mac
+
+    def learn(self, mac: int, port: int, now: Optional[float] = None) -> Optional[int]:
+        """Record a source MAC on an ingress port; returns the port it was on before, if known"""
+        if now is None:
+            now = time.time()
+        self.learns += 1
+        slot = self._slots.get(mac)
+        if slot is not None:
+            self.learn_hits += 1
+            previous = self._ports[slot]
+            if previous != port:
+                self._move(mac, previous, port)
+            self._ports[slot] = port
+            self._learned_at[slot] = now
+            return previous
+        self._slots[mac] = len(self._macs)
+        self._by_port.setdefault(port, set()).add(mac)
+        self._macs.append(mac)
+        self._ports.append(port)
+        self._learned_at.append(now)
+        heapq.heappush(self._expiry, self._deadline_key(now, mac))
+        if self.max_entries is not None and len(self._slots) > self.max_entries:
+            self._evict_oldest()
+        if len(self._expiry) > 2 * len(self._slots) + 64:
+            self._rebuild_expiry()
+        return None
+
+    def learn_many(self, learned: dict, now: Optional[float] = None) -> list:
+        """
+        learn() for a burst: learned maps MAC -> ingress port, all learned at
+        one timestamp. New MACs are appended to the columns in bulk.
+        Returns the MACs that were known on another port.
+        """
+        if now is None:
+            now = time.time()
+        slots = self._slots
+        ports = self._ports
+        learned_at = self._learned_at
+        moved = []
+        new = []
+        for mac, port in learned.items():
+            slot = slots.get(mac)
+            if slot is None:
+                new.append(mac)
+                continue
+            if ports[slot] != port:
+                moved.append(mac)
+                self._move(mac, ports[slot], port)
+            ports[slot] = port
+            learned_at[slot] = now
+        self.learns += len(learned)
+        self.learn_hits += len(learned) - len(new)
+        if new:
+            first = len(self._macs)
+            slots.update(zip(new, range(first, first + len(new))))
+            self._macs.extend(new)
+            ports.extend([learned[mac] for mac in new])
+            learned_at.extend([now] * len(new))
+            expiry = self._expiry
+            by_port = self._by_port
+            for mac in new:
+                heapq.heappush(expiry, self._deadline_key(now, mac))
+                port = learned[mac]
+                macs = by_port.get(port)
+                if macs is None:
+                    by_port[port] = {mac}
+                else:
+                    macs.add(mac)
+            if self.max_entries is not None:
+                while len(slots) > self.max_entries:
+                    self._evict_oldest()
+            if len(expiry) > 2 * len(slots) + 64:
+                self._rebuild_expiry()
+        return moved
+
+    def lookup(self, mac: int, now: Optional[float] = None) -> Optional[int]:
+        """Lookup destination MAC and return port if present"""
+        self.lookups += 1
+        slot = self._slots.get(mac)
+        if slot is None:
+            return None
+        if now is None:
+            now = time.time()
+        if now - self._learned_at[slot] > self.timeout_seconds:
+            self._expired(self._remove_slot(mac, slot))
+            return None
+        self.lookup_hits += 1
+        return self._ports[slot]
+
+    def remove(self, mac: int) -> Optional[MACEntry]:
+        """Forget a MAC without calling on_expire"""
+        slot = self._slots.get(mac)
+        if slot is None:
+            return None
+        return self._remove_slot(mac, slot)
+
+    def remove_port(self, port: int) -> list[MACEntry]:
+        """Forget every MAC learned on port (it went down) without calling on_expire"""
+        macs = self._by_port.pop(port, None)
+        if not macs:
+            return []
+        slots = self._slots
+        # the index entry is already gone; _remove_slot skips it
+        return [self._remove_slot(mac, slots[mac]) for mac in macs]
+
+    def port_macs(self, port: int) -> set:
+        """MACs currently learned on port"""
+        return set(self._by_port.get(port, ()))
+
+    def age_out(self, now: Optional[float] = None) -> int:
+        """Expire stale entries and return how many expired"""
+        if now is None:
+            now = time.time()
+        now_key = int(now * 1000) << 48
+        expiry = self._expiry
+        expired = 0
+        while expiry and expiry[0] < now_key:
+            mac = heapq.heappop(expiry) & 0xffffffffffff
+            slot = self._slots.get(mac)
+            if slot is None:
+                continue
+            current = self._deadline_key(self._learned_at[slot], mac)
+            if current >= now_key:
+                # refreshed since it was scheduled
+                heapq.heappush(expiry, current)
+                continue
+            self._expired(self._remove_slot(mac, slot))
+            expired += 1
+        return expired
+
+    def clear(self):
+        """Clear all entries"""
+        self._slots.clear()
+        del self._macs[:], self._ports[:], self._learned_at[:]
+        self._expiry.clear()
+        self._by_port.clear()
+
+    def export(self) -> tuple[array, array, array]:
+        """Copies of the MAC, port and learned_at columns, e.g. for a snapshot"""
+        return array("Q", self._macs), array("H", self._ports), array("d", self._learned_at)
+
+    def restore(self, macs, ports, learned_at, now: Optional[float] = None) -> int:
+        """
+        Replace the contents with entries given as columns of integer
+        MACs, ports and learn times (e.g. read from a snapshot). Entries
+        keep their original learned_at, so they expire when they would have;
+        those already expired, and the oldest beyond max_entries, are
+        skipped. Returns how many were loaded.
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - self.timeout_seconds
+        live = [i for i, t in enumerate(learned_at) if t >= cutoff]
+        if self.max_entries is not None and len(live) > self.max_entries:
+            live = sorted(live, key=learned_at.__getitem__)[len(live) - self.max_entries:]
+        if len(live) == len(learned_at):
+            # nothing stale: take the columns as they are
+            self._macs = array("Q", macs)
+            self._ports = array("H", ports)
+            self._learned_at = array("d", learned_at)
+        else:
+            self._macs = array("Q", [macs[i] for i in live])
+            self._ports = array("H", [ports[i] for i in live])
+            self._learned_at = array("d", [learned_at[i] for i in live])
+        self._slots = dict(zip(self._macs, range(len(self._macs))))
+        by_port = self._by_port = {}
+        for mac, port in zip(self._macs, self._ports):
+            macs_on_port = by_port.get(port)
+            if macs_on_port is None:
+                by_port[port] = {mac}
+            else:
+                macs_on_port.add(mac)
+        self._rebuild_expiry()
+        return len(live)
+
+    def _move(self, mac: int, old_port: int, port: int):
+        macs = self._by_port.get(old_port)
+        if macs is not None:
+            macs.discard(mac)
+            if not macs:
+                del self._by_port[old_port]
+        self._by_port.setdefault(port, set()).add(mac)
+
+    def _remove_slot(self, mac: int, slot: int) -> MACEntry:
+        entry = MACEntry(mac, self._ports[slot], self._learned_at[slot])
+        del self._slots[mac]
+        macs = self._by_port.get(entry.port)
+        if macs is not None:
+            macs.discard(mac)
+            if not macs:
+                del self._by_port[entry.port]
+        last = len(self._macs) - 1
+        if slot != last:
+            # move the last slot into the hole
+            moved = self._macs[last]
+            self._macs[slot] = moved
+            self._ports[slot] = self._ports[last]
+            self._learned_at[slot] = self._learned_at[last]
+            self._slots[moved] = slot
+        self._macs.pop()
+        self._ports.pop()
+        self._learned_at.pop()
+        return entry
+
+    def _evict_oldest(self):
+        expiry = self._expiry
+        while expiry:
+            key = heapq.heappop(expiry)
+            mac = key & 0xffffffffffff
+            slot = self._slots.get(mac)
+            if slot is None:
+                continue
+            current = self._deadline_key(self._learned_at[slot], mac)
+            if current != key:
+                heapq.heappush(expiry, current)
+                continue
+            self._expired(self._remove_slot(mac, slot))
+            return
+
+    def _expired(self, entry: MACEntry):
+        if self.on_expire is not None:
+            self.on_expire(entry)
+
+    def _rebuild_expiry(self):
+        timeout = self.timeout_seconds
+        self._expiry = [(int((t + timeout) * 1000) << 48) | mac for mac, t in zip(self._macs, self._learned_at)]
+        heapq.heapify(self._expiry)
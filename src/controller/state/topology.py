@@ -0,0 +1,278 @@
+from typing import Optional
+
+
+class Topology:
+    """
+    Links between switches, shortest-path next hops, and where hosts attach.
+
+    A link is directed: (dpid, port) -> (peer, peer_port) means a frame
+    sent out of port on dpid arrives at peer_port on peer, as an LLDP probe
+    did. For every switch d there is a tree of next hops towards d,
+    {dpid: out_port}, from a breadth-first search over the links in
+    reverse, so next_hop() is two dict lookups.
+
+    A link change does not rebuild every tree. Removing a link marks the
+    trees that used it; adding one marks the trees in which it shortens
+    the distance from its source. Marked trees are rebuilt together on the
+    next lookup, so the links learned in a burst of LLDP cost one rebuild.
+
+    Hosts are located on edge ports only (ports without a link), since a
+    MAC seen on a link port was flooded there by another switch.
+
+    Floods must not go round the loops of the fabric. A breadth-first
+    tree from the lowest dpid of each connected group of switches is its
+    spanning tree; flood_ports() gives the link ports of a switch on it.
+    """
+
+    def __init__(self):
+        # (dpid, port) -> (peer dpid, peer port)
+        self.links: dict[tuple[int, int], tuple[int, int]] = {}
+        # (peer dpid, peer port) -> (dpid, port) of the link arriving there
+        self._reverse: dict[tuple[int, int], tuple[int, int]] = {}
+        # dpid -> {neighbour dpid: ports of dpid with a link towards it}
+        self._out: dict[int, dict[int, set[int]]] = {}
+        # dpid -> switches with a link towards dpid
+        self._in: dict[int, set[int]] = {}
+        # destination dpid -> {dpid: out_port towards the destination}
+        self._next_hop: dict[int, dict[int, int]] = {}
+        # destination dpid -> {dpid: hops to the destination}
+        self._dist: dict[int, dict[int, int]] = {}
+        # destinations whose tree must be rebuilt before the next lookup
+        self._dirty: set[int] = set()
+        # dpid -> its link ports on the spanning tree; None until the next flood after a link change
+        self._flood_ports: Optional[dict[int, frozenset[int]]] = None
+        # MAC (6 raw bytes) -> (dpid, edge port)
+        self.hosts: dict[bytes, tuple[int, int]] = {}
+        self._hosts_at: dict[tuple[int, int], set[bytes]] = {}
+        # trees rebuilt so far, to check that updates stay incremental
+        self.recomputed = 0
+
+    def __len__(self):
+        return len(self.links)
+
+    def switches(self) -> list[int]:
+        """Switches with at least one link"""
+        return list(self._out)
+
+    def add_link(self, dpid: int, port: int, peer: int, peer_port: int) -> bool:
+        """Add the link out of (dpid, port); False if it was already known"""
+        key = (dpid, port)
+        old = self.links.get(key)
+        if old == (peer, peer_port):
+            return False
+        if old is not None:
+            self.remove_link(dpid, port)
+        stale = self._reverse.get((peer, peer_port))
+        if stale is not None:
+            # the far end was cabled elsewhere before
+            self.remove_link(*stale)
+        for node in (dpid, peer):
+            if node not in self._out:
+                self._out[node] = {}
+                self._in[node] = set()
+                self._dirty.add(node)
+        self.links[key] = (peer, peer_port)
+        self._reverse[(peer, peer_port)] = key
+        self._flood_ports = None
+        ports = self._out[dpid].setdefault(peer, set())
+        parallel = bool(ports)
+        ports.add(port)
+        self._in[peer].add(dpid)
+        self._forget_hosts_at(key)
+        self._forget_hosts_at((peer, peer_port))
+        if parallel:
+            # trees already reach peer through the existing link
+            return True
+        dirty = self._dirty
+        for dst, dist in self._dist.items():
+            if dst in dirty:
+                continue
+            to_peer = dist.get(peer)
+            if to_peer is None:
+                continue
+            to_dpid = dist.get(dpid)
+            if to_dpid is None or to_peer + 1 < to_dpid:
+                dirty.add(dst)
+        return True
+
+    def remove_link(self, dpid: int, port: int) -> bool:
+        """Remove the link out of (dpid, port); False if there was none"""
+        end = self.links.pop((dpid, port), None)
+        if end is None:
+            return False
+        peer = end[0]
+        del self._reverse[end]
+        self._flood_ports = None
+        ports = self._out[dpid][peer]
+        ports.discard(port)
+        if not ports:
+            del self._out[dpid][peer]
+            self._in[peer].discard(dpid)
+        dirty = self._dirty
+        for dst, hops in self._next_hop.items():
+            if dst not in dirty and hops.get(dpid) == port:
+                dirty.add(dst)
+        self._drop_if_isolated(dpid)
+        self._drop_if_isolated(peer)
+        return True
+
+    def remove_port(self, dpid: int, port: int) -> int:
+        """Remove the links in and out of a port and the hosts behind it; returns the links removed"""
+        removed = self.remove_link(dpid, port)
+        far = self._reverse.get((dpid, port))
+        if far is not None:
+            removed += self.remove_link(*far)
+        self._forget_hosts_at((dpid, port))
+        return removed
+
+    def remove_switch(self, dpid: int) -> int:
+        """Remove every link of a switch and the hosts behind it; returns the links removed"""
+        removed = 0
+        for port in [port for ports in self._out.get(dpid, {}).values() for port in ports]:
+            removed += self.remove_link(dpid, port)
+        for src in list(self._in.get(dpid, ())):
+            for port in list(self._out[src].get(dpid, ())):
+                removed += self.remove_link(src, port)
+        for loc in [loc for loc in self._hosts_at if loc[0] == dpid]:
+            self._forget_hosts_at(loc)
+        return removed
+
+    def _drop_if_isolated(self, dpid: int):
+        if self._out.get(dpid) or self._in.get(dpid):
+            return
+        self._out.pop(dpid, None)
+        self._in.pop(dpid, None)
+        self._next_hop.pop(dpid, None)
+        self._dist.pop(dpid, None)
+        self._dirty.discard(dpid)
+
+    def is_link_port(self, dpid: int, port: int) -> bool:
+        key = (dpid, port)
+        return key in self.links or key in self._reverse
+
+    def next_hop(self, dpid: int, dst: int) -> Optional[int]:
+        """Port of dpid on a shortest path to switch dst, None if unreachable or dpid == dst"""
+        if self._dirty:
+            self.refresh()
+        hops = self._next_hop.get(dst)
+        return None if hops is None else hops.get(dpid)
+
+    def path(self, dpid: int, dst: int) -> Optional[list[tuple[int, int]]]:
+        """(dpid, out_port) hops from dpid to dst; [] if they are the same switch"""
+        path = []
+        while dpid != dst:
+            port = self.next_hop(dpid, dst)
+            if port is None:
+                return None
+            path.append((dpid, port))
+            dpid = self.links[(dpid, port)][0]
+        return path
+
+    def flood_ports(self, dpid: int) -> Optional[frozenset[int]]:
+        """Link ports of dpid on the spanning tree; None if dpid has no links"""
+        if self._flood_ports is None:
+            self._build_spanning_tree()
+        return self._flood_ports.get(dpid)
+
+    def _build_spanning_tree(self):
+        # breadth-first over links in either direction, so a link seen one
+        # way only still joins its switches; a tree link carries floods
+        # both ways, so both of its ends are tree ports
+        out = self._out
+        into = self._in
+        links = self.links
+        tree = {dpid: set() for dpid in out}
+        seen = set()
+        for root in sorted(out):
+            if root in seen:
+                continue
+            seen.add(root)
+            frontier = [root]
+            while frontier:
+                reached = []
+                for node in frontier:
+                    for peer, ports in out[node].items():
+                        if peer not in seen:
+                            port = min(ports)
+                            tree[node].add(port)
+                            tree[peer].add(links[(node, port)][1])
+                            seen.add(peer)
+                            reached.append(peer)
+                    for peer in into[node]:
+                        if peer not in seen:
+                            port = min(out[peer][node])
+                            tree[peer].add(port)
+                            tree[node].add(links[(peer, port)][1])
+                            seen.add(peer)
+                            reached.append(peer)
+                frontier = reached
+        self._flood_ports = {dpid: frozenset(ports) for dpid, ports in tree.items()}
+
+    def refresh(self):
+        """Rebuild the trees marked by link changes"""
+        dirty = self._dirty
+        for dst in dirty:
+            self._build(dst)
+        self.recomputed += len(dirty)
+        dirty.clear()
+
+    def _build(self, dst: int):
+        # breadth-first from dst over reversed links; the first switch to
+        # reach a node becomes its next hop, and parallel links use the lowest port
+        out = self._out
+        into = self._in
+        dist = {dst: 0}
+        hops = {}
+        frontier = [dst]
+        depth = 0
+        while frontier:
+            depth += 1
+            reached = []
+            for node in frontier:
+                for src in into[node]:
+                    if src not in dist:
+                        dist[src] = depth
+                        hops[src] = min(out[src][node])
+                        reached.append(src)
+            frontier = reached
+        self._dist[dst] = dist
+        self._next_hop[dst] = hops
+
+    def learn_host(self, mac: bytes, dpid: int, port: int) -> Optional[tuple[int, int]]:
+        """Record that mac is attached to the edge port (dpid, port); returns where it was before"""
+        loc = (dpid, port)
+        old = self.hosts.get(mac)
+        if old == loc:
+            return old
+        if old is not None:
+            self._discard_host(mac, old)
+        self.hosts[mac] = loc
+        self._hosts_at.setdefault(loc, set()).add(mac)
+        return old
+
+    def forget_host(self, mac: bytes, dpid: Optional[int] = None):
+        """Forget where mac is; with dpid given, only if it is attached to that switch"""
+        loc = self.hosts.get(mac)
+        if loc is None or (dpid is not None and loc[0] != dpid):
+            return
+        del self.hosts[mac]
+        self._discard_host(mac, loc)
+
+    def _discard_host(self, mac: bytes, loc: tuple[int, int]):
+        macs = self._hosts_at[loc]
+        macs.discard(mac)
+        if not macs:
+            del self._hosts_at[loc]
+
+    def _forget_hosts_at(self, loc: tuple[int, int]):
+        for mac in self._hosts_at.pop(loc, ()):
+            del self.hosts[mac]
+
+    def host_port(self, dpid: int, mac: bytes) -> Optional[int]:
+        """Port of dpid towards host mac: its edge port or the next hop to its switch"""
+        loc = self.hosts.get(mac)
+        if loc is None:
+            return None
+        if loc[0] == dpid:
+            return loc[1]
+        return self.next_hop(dpid, loc[0])
@@ -1,8 +1,91 @@
-from src.controller.controller import Controller
+import argparse
+
+from src.controller.controller import Controller, ARP_TIMEOUT, KEEPALIVE_INTERVAL, KEEPALIVE_TIMEOUT, SNAPSHOT_INTERVAL
+from src.controller.discovery import DISCOVERY_INTERVAL
+from src.utils import log
+
+LOG_LEVELS = {"debug": log.DEBUG, "info": log.INFO, "error": log.ERROR}
 
 def main():
-    controller = Controller()
-    controller.start()
+    parser = argparse.ArgumentParser(description="minisdn OpenFlow 1.0 controller")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=6634)
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="info")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the port (SO_REUSEPORT); 1 runs in-process")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve metrics on http://127.0.0.1:PORT/metrics (single process only)")
+    parser.add_argument("--keepalive-interval", type=float, default=KEEPALIVE_INTERVAL,
+                        help="seconds between ECHO_REQUESTs to each switch (0 disables keepalives)")
+    parser.add_argument("--keepalive-timeout", type=float, default=KEEPALIVE_TIMEOUT,
+                        help="disconnect a switch silent for this many seconds (0 disables keepalives)")
+    parser.add_argument("--discovery-interval", type=float, default=DISCOVERY_INTERVAL,
+                        help="seconds between LLDP probes of every switch port (0 disables link discovery)")
+    parser.add_argument("--arp-timeout", type=float, default=ARP_TIMEOUT,
+                        help="answer ARP requests from bindings learned this many seconds ago (0 floods them)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="append every message received to FILE (single process only)")
+    parser.add_argument("--snapshot", metavar="FILE",
+                        help="restore learned state from FILE on start and save it there periodically (single process only)")
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="seconds between snapshots")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="feed a recording through the handlers as fast as possible and exit")
+    parser.add_argument("--loops", type=int, default=1, help="times to replay the recording")
+    parser.add_argument("--numpy", action="store_true",
+                        help="decode large PACKET_IN bursts with NumPy (must be installed)")
+    args = parser.parse_args()
+
+    log.set_level(LOG_LEVELS[args.log_level])
+    if args.numpy:
+        from src.openflow.batch import enable_numpy
+        if not enable_numpy():
+            parser.error("--numpy needs NumPy installed")
+    if args.replay is not None:
+        replay(args.replay, args.loops)
+        return
+    options = dict(keepalive_interval=args.keepalive_interval, keepalive_timeout=args.keepalive_timeout,
+                   discovery_interval=args.discovery_interval, arp_timeout=args.arp_timeout)
+    if args.workers > 1:
+        # the shards are separate controllers; these options act on a single one
+        for option, value in (("--metrics-port", args.metrics_port), ("--record", args.record),
+                              ("--snapshot", args.snapshot)):
+            if value is not None:
+                parser.error("%s cannot be used with --workers" % option)
+        from src.controller.shard import ShardSupervisor
+        supervisor = ShardSupervisor(args.workers, args.host, args.port, log_level=LOG_LEVELS[args.log_level],
+                                     **options)
+        supervisor.start()
+        try:
+            supervisor.serve_forever()
+        except KeyboardInterrupt:
+            log.info("Shutting down controller...")
+        finally:
+            supervisor.stop()
+        return
+
+    # keep stdout writes off the event loop thread
+    log.start_async()
+    try:
+        controller = Controller(args.host, args.port, **options)
+        if args.metrics_port is not None:
+            controller.serve_metrics(args.metrics_port)
+        if args.record is not None:
+            controller.record(args.record)
+        if args.snapshot is not None:
+            controller.snapshot(args.snapshot, args.snapshot_interval)
+        controller.start()
+    finally:
+        log.stop_async()
+
+def replay(path, loops):
+    from src.controller.recording import read_recording, replay as replay_records
+    records = read_recording(path)
+    # no token buckets: a recording is replayed much faster than it was received
+    controller = Controller(admission_control=False)
+    stats = replay_records(controller, records, loops)
+    log.info("Replayed %d messages (%d bytes, %d reads) in %.3fs: %.0f msgs/s",
+             stats.messages, stats.bytes, stats.reads, stats.seconds, stats.messages_per_second)
 
 if __name__ == "__main__":
     main()
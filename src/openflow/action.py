@@ -1,4 +1,13 @@
-@dataclass
+from dataclasses import dataclass
+
+from src.openflow.codec import ACTION_OUTPUT
+
+# Action types enum ofp_action_type (in official openflow spec 21p)
+OFPAT_OUTPUT = 0
+
+OFP_ACTION_OUTPUT_LEN = 8
+
+@dataclass(slots=True)
 class OFActionOutput:
     type: int
     len: int
@@ -6,4 +15,13 @@ class OFActionOutput:
     max_len: int
 
 def pack_action_output(action: OFActionOutput):
-    return struct.pack("!HHHI", action.type, action.len, action.port, action.max_len)
\ No newline at end of file
+    """
+    type: 2 bytes
+    len: 2 bytes
+    port: 2 bytes
+    max_len: 2 bytes; bytes sent to the controller when port is OFPP_CONTROLLER
+    """
+    return ACTION_OUTPUT.pack(action.type, action.len, action.port, action.max_len)
+
+def output_action(port, max_len=0):
+    return OFActionOutput(OFPAT_OUTPUT, OFP_ACTION_OUTPUT_LEN, port, max_len)
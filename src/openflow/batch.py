@@ -0,0 +1,67 @@
+"""
+Column extraction for the PACKET_INs of one read.
+
+packet_in_columns() returns the buffer_id, in_port, dl_dst and dl_src of
+every PACKET_IN body as four sequences, so the batch handler loops over
+plain values instead of building an OFPacketIN and an EthernetFrame per
+message. By default each body is one precompiled struct unpack.
+
+NumPy is optional. After enable_numpy(), batches of at least
+NUMPY_MIN_BATCH bodies are decoded as a structured array over their
+fixed 22-byte prefixes instead.
+"""
+import struct
+
+from src.parser.ethernet import ETH_HEADER_LEN
+
+# buffer_id, total_len, in_port, reason, pad(1), then dl_dst and dl_src of the frame
+_PREFIX = struct.Struct("!IHHBx6s6s")
+# the Ethernet frame starts after the fixed PACKET_IN fields
+FRAME_OFFSET = 10
+# below this many bodies the struct path is faster than building an array
+NUMPY_MIN_BATCH = 64
+
+_numpy = None
+_dtype = None
+
+
+def enable_numpy() -> bool:
+    """Decode large batches with NumPy from now on; False if it is not installed"""
+    global _numpy, _dtype
+    try:
+        import numpy
+    except ImportError:
+        return False
+    _numpy = numpy
+    _dtype = numpy.dtype([
+        ("buffer_id", ">u4"), ("total_len", ">u2"), ("in_port", ">u2"),
+        ("reason", "u1"), ("pad", "u1"), ("dst", "V6"), ("src", "V6"),
+    ])
+    return True
+
+
+def disable_numpy():
+    global _numpy, _dtype
+    _numpy = _dtype = None
+
+
+def numpy_enabled() -> bool:
+    return _numpy is not None
+
+
+def packet_in_columns(bodies) -> tuple:
+    """
+    (buffer_ids, in_ports, dl_dsts, dl_srcs) of PACKET_IN bodies; the MACs
+    are 6-byte bytes. Raises ValueError if a frame is shorter than an
+    Ethernet header.
+    """
+    if min(map(len, bodies)) < FRAME_OFFSET + ETH_HEADER_LEN:
+        short = next(b for b in bodies if len(b) < FRAME_OFFSET + ETH_HEADER_LEN)
+        raise ValueError(f"Ethernet frame too short: {max(len(short) - FRAME_OFFSET, 0)} bytes")
+    if _numpy is not None and len(bodies) >= NUMPY_MIN_BATCH:
+        size = _PREFIX.size
+        rows = _numpy.frombuffer(b"".join([body[:size] for body in bodies]), dtype=_dtype)
+        return (rows["buffer_id"].tolist(), rows["in_port"].tolist(),
+                rows["dst"].tolist(), rows["src"].tolist())
+    buffer_ids, _, in_ports, _, dsts, srcs = zip(*map(_PREFIX.unpack_from, bodies))
+    return buffer_ids, in_ports, dsts, srcs
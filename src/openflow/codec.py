@@ -0,0 +1,64 @@
+"""
+Precompiled struct codecs for OpenFlow 1.0.
+
+Every wire layout is compiled once into a struct.Struct. Decoders use
+unpack_from() with an offset into the received buffer instead of slicing
+out new bytes objects, and encoders pack the header and the fixed part
+of a message body with a single pack() call.
+"""
+import struct
+
+OFP_VERSION = 0x01
+
+# ofp_header: version, type, length, xid
+HEADER = struct.Struct("!BBHI")
+# ofp_phy_port
+PHY_PORT = struct.Struct("!H6s16sIIIIII")
+# ofp_match
+MATCH = struct.Struct("!IH6s6sHBxHBBxxIIHH")
+# ofp_action_output: type, len, port, max_len
+ACTION_OUTPUT = struct.Struct("!HHHH")
+
+
+class MessageSpec:
+    """
+    Wire layout of one message type: the fixed part of the body (body)
+    and the same layout with the header in front (full), so encoding is
+    one pack() call. Variable data (ports, actions, frames) follows the
+    fixed part and is passed or returned as the tail.
+    """
+    __slots__ = ("msg_type", "name", "body", "full", "min_length", "_pack", "_unpack_from", "_body_size")
+
+    def __init__(self, msg_type: int, name: str, body: struct.Struct, full: struct.Struct):
+        self.msg_type = msg_type
+        self.name = name
+        self.body = body
+        self.full = full
+        self.min_length = full.size
+        self._pack = full.pack
+        self._unpack_from = body.unpack_from
+        self._body_size = body.size
+
+    def __repr__(self):
+        return f"MessageSpec({self.name}, {self.full.format!r})"
+
+    def encode(self, xid: int, *fields, tail=b'') -> bytes:
+        if tail:
+            return self._pack(OFP_VERSION, self.msg_type, self.min_length + len(tail), xid, *fields) + tail
+        return self._pack(OFP_VERSION, self.msg_type, self.min_length, xid, *fields)
+
+    def decode(self, body, offset: int = 0) -> tuple:
+        """Fixed fields of a body (without header) starting at offset"""
+        if len(body) - offset < self._body_size:
+            raise ValueError(f"{self.name} body too short: {len(body) - offset} bytes")
+        return self._unpack_from(body, offset)
+
+
+def message_spec(msg_type: int, name: str, body_format: str = "") -> MessageSpec:
+    """body_format: struct format of the fixed body part, without byte order"""
+    return MessageSpec(
+        msg_type=msg_type,
+        name=name,
+        body=struct.Struct("!" + body_format),
+        full=struct.Struct(HEADER.format + body_format),
+    )
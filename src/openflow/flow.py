@@ -0,0 +1,336 @@
+"""
+Shadow flow table: what the controller has pushed to one switch.
+
+Flows are kept in a dict keyed by (priority, wildcards, masked match
+fields), so a duplicate FLOW_MOD is found with one lookup. Lookups for a
+packet use a tuple space search: one dict probe per distinct
+(priority, wildcards) class, highest priority first. The learning switch
+installs a single class, so this is a single probe in practice.
+
+The controller never sees the packets that hit an installed flow, so
+idle timeouts are tracked from the time of install: a flow is assumed to
+be gone once its idle (or hard) timeout has passed since it was pushed.
+"""
+from dataclasses import dataclass
+from typing import Optional
+import heapq
+import time
+
+from src.openflow.match import (
+    OFMatch,
+    OFPFW_IN_PORT,
+    OFPFW_DL_VLAN,
+    OFPFW_DL_SRC,
+    OFPFW_DL_DST,
+    OFPFW_DL_TYPE,
+    OFPFW_NW_PROTO,
+    OFPFW_TP_SRC,
+    OFPFW_TP_DST,
+    OFPFW_DL_VLAN_PCP,
+    OFPFW_NW_TOS,
+    OFPFW_ALL,
+    match_l2,
+)
+
+# a PACKET_IN for a flow pushed less than this long ago is a duplicate
+# (the FLOW_MOD is still on its way), not a sign the flow is missing
+FLOW_SUPPRESS_SECONDS = 1.0
+
+L2_WILDCARDS = OFPFW_ALL & ~(OFPFW_IN_PORT | OFPFW_DL_SRC | OFPFW_DL_DST)
+
+
+@dataclass(slots=True)
+class FlowEntry:
+    match: OFMatch
+    priority: int
+    out_port: int
+    idle_timeout: int
+    hard_timeout: int
+    installed_at: float
+
+    def deadline(self) -> Optional[float]:
+        """
+        When the switch may drop the flow at the earliest; None if permanent.
+        Traffic refreshes the idle timeout, so the flow can stay installed
+        until the hard timeout (or for good): a flow missing from the shadow
+        table is not known to be gone from the switch.
+        """
+        timeouts = [t for t in (self.idle_timeout, self.hard_timeout) if t]
+        if not timeouts:
+            return None
+        return self.installed_at + min(timeouts)
+
+
+def _prefix_mask(wildcard_bits: int) -> int:
+    # nw_src/nw_dst wildcards are the number of ignored low bits (>= 32: all)
+    return (0xffffffff << min(wildcard_bits, 32)) & 0xffffffff
+
+
+def masked_fields(match: OFMatch, wildcards: int) -> tuple:
+    """Match fields with everything wildcards ignores zeroed"""
+    return (
+        0 if wildcards & OFPFW_IN_PORT else match.in_port,
+        None if wildcards & OFPFW_DL_SRC else match.dl_src,
+        None if wildcards & OFPFW_DL_DST else match.dl_dst,
+        0 if wildcards & OFPFW_DL_VLAN else match.dl_vlan,
+        0 if wildcards & OFPFW_DL_VLAN_PCP else match.dl_vlan_pcp,
+        0 if wildcards & OFPFW_DL_TYPE else match.dl_type,
+        0 if wildcards & OFPFW_NW_TOS else match.nw_tos,
+        0 if wildcards & OFPFW_NW_PROTO else match.nw_proto,
+        match.nw_src & _prefix_mask(wildcards >> 8 & 0x3f),
+        match.nw_dst & _prefix_mask(wildcards >> 14 & 0x3f),
+        0 if wildcards & OFPFW_TP_SRC else match.tp_src,
+        0 if wildcards & OFPFW_TP_DST else match.tp_dst,
+    )
+
+
+def flow_key(match: OFMatch, priority: int) -> tuple:
+    wildcards = match.wildcards & OFPFW_ALL
+    return (priority, wildcards, masked_fields(match, wildcards))
+
+
+def l2_flow_key(in_port: int, dl_src: bytes, dl_dst: bytes, priority: int) -> tuple:
+    """flow_key(match_l2(in_port, dl_src, dl_dst), priority) without building the match"""
+    return (priority, L2_WILDCARDS, (in_port, dl_src, dl_dst, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+
+
+class FlowTable:
+    def __init__(self, suppress_seconds: float = FLOW_SUPPRESS_SECONDS):
+        self.suppress_seconds = suppress_seconds
+        # FLOW_MODs not sent because the same flow was just pushed
+        self.suppressed = 0
+        self._flows: dict[tuple, FlowEntry] = {}
+        # (priority, wildcards) -> number of flows, and the classes by priority
+        self._classes: dict[tuple[int, int], int] = {}
+        self._class_order: list[tuple[int, int]] = []
+        # dl_dst -> keys of the flows that match on it
+        self._by_dst: dict[bytes, set[tuple]] = {}
+        # port -> keys of the flows that match on it as in_port or output to it
+        self._by_port: dict[int, set[tuple]] = {}
+        # min-heap of (deadline, key), lazily rescheduled like the MAC tables
+        self._expiry: list[tuple[float, tuple]] = []
+
+    def __len__(self):
+        return len(self._flows)
+
+    def __contains__(self, key: tuple):
+        return key in self._flows
+
+    def install(self, match: OFMatch, out_port: int, priority: int,
+                idle_timeout: int = 0, hard_timeout: int = 0, now: Optional[float] = None) -> bool:
+        """
+        Record a FLOW_MOD add. Returns False if the same flow was pushed
+        less than suppress_seconds ago, in which case it need not be sent.
+        """
+        return self._install(flow_key(match, priority), match, out_port, priority,
+                             idle_timeout, hard_timeout, now)
+
+    def install_l2(self, in_port: int, dl_src: bytes, dl_dst: bytes, out_port: int, priority: int,
+                   idle_timeout: int = 0, hard_timeout: int = 0, now: Optional[float] = None) -> bool:
+        """install() for a match_l2 flow"""
+        return self._install(l2_flow_key(in_port, dl_src, dl_dst, priority), None, out_port, priority,
+                             idle_timeout, hard_timeout, now, (in_port, dl_src, dl_dst))
+
+    def _install(self, key, match, out_port, priority, idle_timeout, hard_timeout, now, l2=None) -> bool:
+        if now is None:
+            now = time.time()
+        entry = self._flows.get(key)
+        if entry is not None:
+            if (entry.out_port == out_port and now - entry.installed_at < self.suppress_seconds
+                    and entry.idle_timeout == idle_timeout and entry.hard_timeout == hard_timeout):
+                self.suppressed += 1
+                return False
+            rescheduled = (entry.idle_timeout, entry.hard_timeout) != (idle_timeout, hard_timeout)
+            if entry.out_port != out_port:
+                self._unindex_port(entry.out_port, key, key[2][0])
+                self._by_port.setdefault(out_port, set()).add(key)
+            entry.out_port = out_port
+            entry.idle_timeout = idle_timeout
+            entry.hard_timeout = hard_timeout
+            entry.installed_at = now
+            if rescheduled:
+                self._schedule(entry, key)
+            return True
+        if match is None:
+            match = match_l2(*l2)
+        entry = FlowEntry(match, priority, out_port, idle_timeout, hard_timeout, now)
+        self._flows[key] = entry
+        cls = key[:2]
+        count = self._classes.get(cls, 0)
+        self._classes[cls] = count + 1
+        if count == 0:
+            self._class_order = sorted(self._classes, key=lambda c: -c[0])
+        dl_dst = key[2][2]
+        if dl_dst is not None:
+            self._by_dst.setdefault(dl_dst, set()).add(key)
+        in_port = key[2][0]
+        if in_port:
+            self._by_port.setdefault(in_port, set()).add(key)
+        self._by_port.setdefault(out_port, set()).add(key)
+        self._schedule(entry, key)
+        return True
+
+    def lookup(self, packet: OFMatch, now: Optional[float] = None) -> Optional[FlowEntry]:
+        """Highest priority live flow that matches the packet fields"""
+        if now is None:
+            now = time.time()
+        flows = self._flows
+        for priority, wildcards in self._class_order:
+            entry = flows.get((priority, wildcards, masked_fields(packet, wildcards)))
+            if entry is not None:
+                deadline = entry.deadline()
+                if deadline is None or deadline > now:
+                    return entry
+        return None
+
+    def remove(self, match: OFMatch, priority: int) -> Optional[FlowEntry]:
+        """Forget one flow (a strict delete)"""
+        return self._remove(flow_key(match, priority))
+
+    def invalidate_dst(self, dl_dst: bytes) -> list[FlowEntry]:
+        """
+        Forget every flow that matches on destination MAC dl_dst, e.g.
+        when the host moved to another port. Returns the removed flows.
+        """
+        keys = self._by_dst.pop(dl_dst, None)
+        if not keys:
+            return []
+        return [self._remove(key) for key in list(keys)]
+
+    def invalidate_port(self, port: int) -> list[FlowEntry]:
+        """
+        Forget every flow that matches on in_port port or outputs to it,
+        e.g. when the port went down. Returns the removed flows.
+        """
+        keys = self._by_port.pop(port, None)
+        if not keys:
+            return []
+        return [self._remove(key) for key in list(keys)]
+
+    def age_out(self, now: Optional[float] = None) -> int:
+        """Forget flows the switch has timed out; returns how many"""
+        if now is None:
+            now = time.time()
+        expiry = self._expiry
+        flows = self._flows
+        expired = 0
+        while expiry and expiry[0][0] <= now:
+            _, key = heapq.heappop(expiry)
+            entry = flows.get(key)
+            if entry is None:
+                continue
+            deadline = entry.deadline()
+            if deadline is None:
+                continue
+            if deadline > now:
+                # reinstalled since it was scheduled
+                heapq.heappush(expiry, (deadline, key))
+                continue
+            self._remove(key)
+            expired += 1
+        return expired
+
+    def export(self) -> list[FlowEntry]:
+        """The flows, e.g. for a snapshot; only the list is copied"""
+        return list(self._flows.values())
+
+    def restore(self, flows, now: Optional[float] = None) -> int:
+        """
+        Record flows pushed before (e.g. read from a snapshot) with their
+        original installed_at; flows the switch has timed out since are
+        skipped. The entries are kept, not copied. Returns how many were
+        recorded.
+        """
+        if now is None:
+            now = time.time()
+        table = self._flows
+        classes = self._classes
+        by_dst = self._by_dst
+        by_port = self._by_port
+        expiry = self._expiry
+        restored = 0
+        for entry in flows:
+            timeouts = [t for t in (entry.idle_timeout, entry.hard_timeout) if t]
+            deadline = entry.installed_at + min(timeouts) if timeouts else None
+            if deadline is not None and deadline <= now:
+                continue
+            match = entry.match
+            if match.wildcards & OFPFW_ALL == L2_WILDCARDS:
+                key = l2_flow_key(match.in_port, match.dl_src, match.dl_dst, entry.priority)
+            else:
+                key = flow_key(match, entry.priority)
+            if key in table:
+                self._remove(key)
+            table[key] = entry
+            cls = key[:2]
+            classes[cls] = classes.get(cls, 0) + 1
+            dl_dst = key[2][2]
+            if dl_dst is not None:
+                keys = by_dst.get(dl_dst)
+                if keys is None:
+                    by_dst[dl_dst] = {key}
+                else:
+                    keys.add(key)
+            in_port = key[2][0]
+            if in_port:
+                by_port.setdefault(in_port, set()).add(key)
+            by_port.setdefault(entry.out_port, set()).add(key)
+            if deadline is not None:
+                expiry.append((deadline, key))
+            restored += 1
+        self._class_order = sorted(classes, key=lambda c: -c[0])
+        heapq.heapify(expiry)
+        return restored
+
+    def clear(self):
+        """Forget every flow"""
+        self._flows.clear()
+        self._classes.clear()
+        self._class_order = []
+        self._by_dst.clear()
+        self._by_port.clear()
+        self._expiry.clear()
+
+    def _schedule(self, entry: FlowEntry, key: tuple):
+        deadline = entry.deadline()
+        if deadline is not None:
+            heapq.heappush(self._expiry, (deadline, key))
+            if len(self._expiry) > 2 * len(self._flows) + 64:
+                self._rebuild_expiry()
+
+    def _remove(self, key: tuple) -> Optional[FlowEntry]:
+        entry = self._flows.pop(key, None)
+        if entry is None:
+            return None
+        cls = key[:2]
+        count = self._classes[cls] - 1
+        if count:
+            self._classes[cls] = count
+        else:
+            del self._classes[cls]
+            self._class_order = sorted(self._classes, key=lambda c: -c[0])
+        dl_dst = key[2][2]
+        if dl_dst is not None:
+            keys = self._by_dst.get(dl_dst)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_dst[dl_dst]
+        self._unindex_port(entry.out_port, key)
+        if key[2][0]:
+            self._unindex_port(key[2][0], key)
+        return entry
+
+    def _unindex_port(self, port: int, key: tuple, keep_port: int = 0):
+        # keep_port: the flow stays indexed under port if it also matches on it
+        if port == keep_port:
+            return
+        keys = self._by_port.get(port)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_port[port]
+
+    def _rebuild_expiry(self):
+        self._expiry = [(e.deadline(), key) for key, e in self._flows.items() if e.deadline() is not None]
+        heapq.heapify(self._expiry)
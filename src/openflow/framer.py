@@ -0,0 +1,75 @@
+import struct
+
+# the OpenFlow length field is 16 bits, so no message is longer than this
+OFP_MAX_MSG_LEN = 0xffff
+# receive buffer size; at least two maximum-size messages so a partial
+# message plus a full read always fit after compaction
+RECV_BUFFER_SIZE = 256 * 1024
+
+_LENGTH = struct.Struct("!H")
+
+
+class MessageFramer:
+    """
+    Per-connection receive buffer that splits a TCP byte stream into
+    OpenFlow messages without copying.
+
+    Data is read straight into a preallocated bytearray with recv_into(),
+    and messages() returns memoryview slices of that buffer. The views are
+    only valid until the next recv_into()/feed() call; copy with bytes()
+    anything that must outlive the current dispatch.
+    """
+
+    def __init__(self, size: int = RECV_BUFFER_SIZE):
+        if size < 2 * OFP_MAX_MSG_LEN:
+            raise ValueError("Receive buffer too small: " + str(size))
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        # unconsumed data lives in _buf[_start:_end]
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        """Number of buffered bytes not yet returned as a message."""
+        return self._end - self._start
+
+    def _make_room(self):
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif len(self._buf) - self._end < OFP_MAX_MSG_LEN:
+            # move the trailing partial message to the front (less than one message)
+            pending = self._end - self._start
+            self._view[:pending] = self._view[self._start:self._end]
+            self._start, self._end = 0, pending
+
+    def recv_into(self, sock) -> int:
+        """Read once from sock into the free space; returns bytes read (0 on EOF)."""
+        self._make_room()
+        n = sock.recv_into(self._view[self._end:])
+        self._end += n
+        return n
+
+    def feed(self, data):
+        """Append data as if it had been received (used without a socket)."""
+        self._make_room()
+        end = self._end + len(data)
+        if end > len(self._buf):
+            raise ValueError("Receive buffer overflow")
+        self._view[self._end:end] = data
+        self._end = end
+
+    def messages(self) -> list[memoryview]:
+        """Return every complete message currently buffered, in order."""
+        msgs = []
+        view = self._view
+        start, end = self._start, self._end
+        while end - start >= 8:
+            length, = _LENGTH.unpack_from(view, start + 2)
+            if length < 8:
+                raise ValueError("Invalid message length: " + str(length))
+            if end - start < length:
+                break
+            msgs.append(view[start:start + length])
+            start += length
+        self._start = start
+        return msgs
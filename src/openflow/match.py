@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+
+from src.openflow.codec import MATCH
+
+# Flow wildcards enum ofp_flow_wildcards (in official openflow spec 28p)
+OFPFW_IN_PORT     = 1 << 0
+OFPFW_DL_VLAN     = 1 << 1
+OFPFW_DL_SRC      = 1 << 2
+OFPFW_DL_DST      = 1 << 3
+OFPFW_DL_TYPE     = 1 << 4
+OFPFW_NW_PROTO    = 1 << 5
+OFPFW_TP_SRC      = 1 << 6
+OFPFW_TP_DST      = 1 << 7
+OFPFW_NW_SRC_ALL  = 32 << 8
+OFPFW_NW_DST_ALL  = 32 << 14
+OFPFW_DL_VLAN_PCP = 1 << 20
+OFPFW_NW_TOS      = 1 << 21
+OFPFW_ALL         = (1 << 22) - 1
+
+OFP_MATCH_LEN = 40
+
+ZERO_MAC = b'\x00' * 6
+
+@dataclass(slots=True)
+class OFMatch:
+    wildcards: int = OFPFW_ALL
+    in_port: int = 0
+    dl_src: bytes = ZERO_MAC
+    dl_dst: bytes = ZERO_MAC
+    dl_vlan: int = 0
+    dl_vlan_pcp: int = 0
+    dl_type: int = 0
+    nw_tos: int = 0
+    nw_proto: int = 0
+    nw_src: int = 0
+    nw_dst: int = 0
+    tp_src: int = 0
+    tp_dst: int = 0
+
+def pack_match(match: OFMatch):
+    """
+    wildcards: 4 bytes
+    in_port: 2 bytes
+    dl_src: 6 bytes
+    dl_dst: 6 bytes
+    dl_vlan: 2 bytes
+    dl_vlan_pcp: 1 bytes
+    pad: 1 bytes
+    dl_type: 2 bytes
+    nw_tos: 1 bytes
+    nw_proto: 1 bytes
+    pad: 2 bytes
+    nw_src: 4 bytes
+    nw_dst: 4 bytes
+    tp_src: 2 bytes
+    tp_dst: 2 bytes
+    """
+    return MATCH.pack(*match_fields(match))
+
+def match_fields(match: OFMatch) -> tuple:
+    """Fields in wire order, for packing together with a message body"""
+    return (
+        match.wildcards, match.in_port, match.dl_src, match.dl_dst,
+        match.dl_vlan, match.dl_vlan_pcp, match.dl_type, match.nw_tos, match.nw_proto,
+        match.nw_src, match.nw_dst, match.tp_src, match.tp_dst,
+    )
+
+def match_l2(in_port, dl_src, dl_dst):
+    """Exact match on ingress port and source/destination MAC (raw 6 bytes each)"""
+    return OFMatch(
+        wildcards=OFPFW_ALL & ~(OFPFW_IN_PORT | OFPFW_DL_SRC | OFPFW_DL_DST),
+        in_port=in_port,
+        dl_src=dl_src,
+        dl_dst=dl_dst,
+    )
+
+def match_dl_dst(dl_dst):
+    """Match every flow towards a destination MAC (raw 6 bytes)"""
+    return OFMatch(wildcards=OFPFW_ALL & ~OFPFW_DL_DST, dl_dst=dl_dst)
+
+def match_in_port(in_port):
+    """Match every flow from an ingress port"""
+    return OFMatch(wildcards=OFPFW_ALL & ~OFPFW_IN_PORT, in_port=in_port)
@@ -1,9 +1,19 @@
-from src.utils.log import info,success,error
-from src.parser.ethernet import parse_ethernet
+from src.utils.log import info, success, error, debug, RateLimiter, ratelimited
+from src.parser.ethernet import (
+    parse_ethernet, unpack_arp, make_arp_reply, ARP_REQUEST, ETH_HEADER_LEN, ETH_TYPE_ARP,
+)
+from src.parser.lldp import LLDP_MAC
+from src.openflow.action import OFPAT_OUTPUT
+from src.openflow.batch import FRAME_OFFSET, packet_in_columns
+from src.openflow.codec import OFP_VERSION, HEADER, PHY_PORT, MATCH, ACTION_OUTPUT, message_spec
+from src.openflow.match import OFMatch, ZERO_MAC, match_fields, match_l2, match_dl_dst, match_in_port
 from dataclasses import dataclass
 import struct
-from typing import List, TYPE_CHECKING
+import time
+from time import perf_counter_ns
+from typing import List
 from src.controller.interface import ControllerIF
+from src.controller.state.mac_table import mac_to_bytes
 
 
 # see openflow spec(https://opennetworking.org/wp-content/uploads/2013/04/openflow-spec-v1.0.0.pdf)
@@ -19,19 +29,66 @@ OFPT_PACKET_IN        = 10
 OFPT_PORT_STATUS      = 12
 OFPT_PACKET_OUT       = 13
 OFPT_FLOW_MOD         = 14
-
-
-@dataclass
+OFPT_BARRIER_REQUEST  = 18
+OFPT_BARRIER_REPLY    = 19
+
+# Error types enum ofp_error_type (in official openflow spec)
+OFPET_HELLO_FAILED    = 0
+OFPET_BAD_REQUEST     = 1
+OFPET_BAD_ACTION      = 2
+OFPET_FLOW_MOD_FAILED = 3
+OFPET_PORT_MOD_FAILED = 4
+OFPET_QUEUE_OP_FAILED = 5
+
+# Port numbering enum ofp_port (in official openflow spec 18p)
+OFPP_MAX        = 0xff00
+OFPP_IN_PORT    = 0xfff8
+OFPP_FLOOD      = 0xfffb
+OFPP_ALL        = 0xfffc
+OFPP_CONTROLLER = 0xfffd
+OFPP_NONE       = 0xffff
+
+# Port config and state bits enum ofp_port_config / ofp_port_state (in official openflow spec 20p)
+OFPPC_PORT_DOWN = 1 << 0
+OFPPC_NO_FLOOD  = 1 << 4
+OFPPS_LINK_DOWN = 1 << 0
+
+# PORT_STATUS reasons enum ofp_port_reason (in official openflow spec 40p)
+OFPPR_ADD    = 0
+OFPPR_DELETE = 1
+OFPPR_MODIFY = 2
+
+# buffer_id of a packet that is not buffered on the switch
+OFP_NO_BUFFER = 0xffffffff
+
+# Flow mod commands enum ofp_flow_mod_command (in official openflow spec 35p)
+OFPFC_ADD           = 0
+OFPFC_MODIFY        = 1
+OFPFC_MODIFY_STRICT = 2
+OFPFC_DELETE        = 3
+OFPFC_DELETE_STRICT = 4
+
+# Flow mod flags enum ofp_flow_mod_flags
+OFPFF_SEND_FLOW_REM = 1 << 0
+
+OFP_DEFAULT_PRIORITY = 0x8000
+
+# timeouts of the flows installed by the learning switch (seconds)
+FLOW_IDLE_TIMEOUT = 10
+FLOW_HARD_TIMEOUT = 30
+
+
+@dataclass(slots=True)
 class OFHeader:
     version: int
     msg_type: int
     length: int
     xid: int
 
-@dataclass
+@dataclass(slots=True)
 class OFPhyPort:
     port_no: int
-    hw_addr: bytes
+    hw_addr: str
     name: str
     config: int
     state: int
@@ -40,7 +97,7 @@ class OFPhyPort:
     supported: int
     peer: int
 
-@dataclass 
+@dataclass(slots=True)
 class OFFeaturesReply:
     datapath_id: int
     n_buffers: int
@@ -49,7 +106,7 @@ class OFFeaturesReply:
     actions: int
     ports: List["OFPhyPort"]
 
-@dataclass
+@dataclass(slots=True)
 class OFPacketIN:
     buffer_id: int
     total_len: int
@@ -57,34 +114,75 @@ class OFPacketIN:
     reason: int
     data: bytes
 
+@dataclass(slots=True)
+class OFPortStatus:
+    reason: int
+    port: OFPhyPort
+
+@dataclass(slots=True)
+class OFError:
+    err_type: int
+    code: int
+    # at least the first 64 bytes of the failed request
+    data: bytes
+
+# Wire layout of every message type, see src.openflow.codec.
+# Formats are the fixed body part after the 8 byte header.
+MESSAGE_SPECS = {spec.msg_type: spec for spec in (
+    message_spec(OFPT_HELLO, "HELLO"),
+    # type, code + data
+    message_spec(OFPT_ERROR, "ERROR", "HH"),
+    message_spec(OFPT_ECHO_REQUEST, "ECHO_REQUEST"),
+    message_spec(OFPT_ECHO_REPLY, "ECHO_REPLY"),
+    message_spec(OFPT_FEATURES_REQUEST, "FEATURES_REQUEST"),
+    # datapath_id, n_buffers, n_tables, pad(3), capabilities, actions + ports
+    message_spec(OFPT_FEATURES_REPLY, "FEATURES_REPLY", "QIB3xII"),
+    # buffer_id, total_len, in_port, reason, pad(1) + frame
+    message_spec(OFPT_PACKET_IN, "PACKET_IN", "IHHBx"),
+    # reason, pad(7) + port
+    message_spec(OFPT_PORT_STATUS, "PORT_STATUS", "B7x"),
+    # buffer_id, in_port, actions_len + actions + frame
+    message_spec(OFPT_PACKET_OUT, "PACKET_OUT", "IHH"),
+    # match, cookie, command, idle_timeout, hard_timeout, priority, buffer_id, out_port, flags + actions
+    message_spec(OFPT_FLOW_MOD, "FLOW_MOD", MATCH.format[1:] + "QHHHHIHH"),
+    message_spec(OFPT_BARRIER_REQUEST, "BARRIER_REQUEST"),
+    message_spec(OFPT_BARRIER_REPLY, "BARRIER_REPLY"),
+)}
+
+_ERROR = MESSAGE_SPECS[OFPT_ERROR]
+_FEATURES_REPLY = MESSAGE_SPECS[OFPT_FEATURES_REPLY]
+_PACKET_IN = MESSAGE_SPECS[OFPT_PACKET_IN]
+_PORT_STATUS = MESSAGE_SPECS[OFPT_PORT_STATUS]
+_PACKET_OUT = MESSAGE_SPECS[OFPT_PACKET_OUT]
+_FLOW_MOD = MESSAGE_SPECS[OFPT_FLOW_MOD]
+
 def packheader(msg_type, length, xid, version=0x01):
     # ! mean network byte order (big-endian)
     # B mean unsigned char (1 byte)
     # H mean unsigned short (2 bytes)
     # I mean unsigned int (4 bytes)
     # see https://docs.python.org/3/library/struct.html
-    return struct.pack('!BBHI', version, msg_type, length, xid)
+    return HEADER.pack(version, msg_type, length, xid)
 
 def parseheader(data):
+    """
+    data: one full message as bytes or a memoryview from MessageFramer.
+    The returned body is a slice of the same object, so no bytes are copied.
+    """
     # parse header
-    version, msg_type, length, xid = struct.unpack("!BBHI", data[:8])
-    body = data[8:length]
+    version, msg_type, length, xid = HEADER.unpack_from(data)
     if version != 0x01:
         raise ValueError("Unsupported OpenFlow version: " + str(version))
     if msg_type not in handlers:
         raise ValueError("Unknown message type: " + str(msg_type))
     if length < 8:
         raise ValueError("Invalid message length: " + str(length))
-    if xid < 0:
-        raise ValueError("Invalid xid: " + str(xid))
-    if length < 8:
-        raise ValueError("Invalid message length: " + str(length))
-    return OFHeader(version, msg_type, length, xid),body
+    return OFHeader(version, msg_type, length, xid), data[8:length]
 
-def parse_phy_port(raw: bytes) -> OFPhyPort:
+def parse_phy_port(raw, offset=0) -> OFPhyPort:
     """
     port_no: 2 bytes
-    hw_addr: 6 bytes; uint8_t hw_addr[OFP_ETH_ALEN=6] mac address 
+    hw_addr: 6 bytes; uint8_t hw_addr[OFP_ETH_ALEN=6] mac address
     name: 16 bytes; char name[OFP_MAX_PORT_NAME_LEN=16]
     config: 4 bytes
     state: 4 bytes
@@ -96,18 +194,14 @@ def parse_phy_port(raw: bytes) -> OFPhyPort:
     supported: 4 bytes
     peer: 4 bytes
     """
-    port_no, = struct.unpack("!H", raw[0:2])
-    hw_addr = raw[2:8]
-    hw_addr = ":".join(f"{byte:02x}" for byte in hw_addr)
-    info(f"Port hw_addr: {hw_addr}")
-    name = raw[8:24].split(b'\x00', 1)[0].decode("ascii", errors="ignore")
-    info(f"Port name: {name}")
-    config, state, curr, adv, supp, peer = struct.unpack("!IIIIII", raw[24:48])
-    info(f"Port config: {config}, state: {state}, curr: {curr}, adv: {adv}, supp: {supp}, peer: {peer}")
+    return _phy_port(PHY_PORT.unpack_from(raw, offset))
+
+def _phy_port(fields) -> OFPhyPort:
+    port_no, hw_addr, name, config, state, curr, adv, supp, peer = fields
     return OFPhyPort(
         port_no=port_no,
-        hw_addr=hw_addr,
-        name=name,
+        hw_addr=hw_addr.hex(":"),
+        name=name.split(b'\x00', 1)[0].decode("ascii", errors="ignore"),
         config=config,
         state=state,
         curr=curr,
@@ -116,25 +210,21 @@ def parse_phy_port(raw: bytes) -> OFPhyPort:
         peer=peer,
     )
 
-def parse_phy_ports(raw_ports: bytes) -> List[OFPhyPort]:
+def parse_phy_ports(raw_ports, offset=0) -> List[OFPhyPort]:
     """
-    raw_ports: port part of feature reply(body[24:])
+    raw_ports: buffer holding the port part of feature reply from offset on
 
     ofp_phy_port is 48 byte(openflow 1.0)
     """
-    PORT_SIZE = 48
-    ports = []
-
-    if len(raw_ports) % PORT_SIZE != 0:
-        error(f"Invalid port block length: {len(raw_ports)} bytes (not multiple of {PORT_SIZE})")
-        return ports
-
-    len_ports = len(raw_ports) // PORT_SIZE
-    info(f"number of ports: {len_ports}")
-
-    if len_ports > 0:
-        ports = [parse_phy_port(raw_ports[i:i + PORT_SIZE]) for i in range(0, len(raw_ports), PORT_SIZE)]
-
+    size = len(raw_ports) - offset
+    if size % PHY_PORT.size != 0:
+        error("Invalid port block length: %d bytes (not multiple of %d)", size, PHY_PORT.size)
+        return []
+
+    if offset:
+        raw_ports = memoryview(raw_ports)[offset:]
+    ports = [_phy_port(fields) for fields in PHY_PORT.iter_unpack(raw_ports)]
+    debug("number of ports: %d", len(ports))
     return ports
 
 
@@ -149,31 +239,21 @@ def parse_features_reply(body):
     ports: variable length
     """
 
-    if len(body) < 24:
-        error(f"Features reply too short: {len(body)} bytes")
+    if len(body) < _FEATURES_REPLY.body.size:
+        error("Features reply too short: %d bytes", len(body))
         raise ValueError("Features reply body too short")
 
-    offset = 0
-    
-    datapath_id, n_buffers, n_tables = struct.unpack("!QIB", body[offset:offset+13])
-    offset += 13
-    # pad is 3 bytes for aligiment
-    # thats why it is skipped
-    offset += 3
-    capabilities, actions = struct.unpack("!II", body[offset:offset+8])
-    offset += 8
-    assert offset == 24
-    
-
-    ports = parse_phy_ports(body[offset:])
+    datapath_id, n_buffers, n_tables, capabilities, actions = _FEATURES_REPLY.decode(body)
+    ports = parse_phy_ports(body, _FEATURES_REPLY.body.size)
     info(
     "Features reply: "
-    f"datapath_id=0x{datapath_id:016x}, "
-    f"n_buffers={n_buffers}, "
-    f"n_tables={n_tables}, "
-    f"capabilities=0x{capabilities:08x}, "
-    f"actions=0x{actions:08x}, "
-    f"num_ports={len(ports)}"
+    "datapath_id=0x%016x, "
+    "n_buffers=%d, "
+    "n_tables=%d, "
+    "capabilities=0x%08x, "
+    "actions=0x%08x, "
+    "num_ports=%d",
+    datapath_id, n_buffers, n_tables, capabilities, actions, len(ports)
     )
 
     return OFFeaturesReply(datapath_id, n_buffers, n_tables, capabilities, actions, ports)
@@ -187,68 +267,516 @@ def parse_packet_in(body):
     pad: 1 bytes
     data: all after pad, inclding Ethernet frame
     """
-    info(f"packet in: body={body}")
-    offset = 0
-    buffer_id, total_len, in_port = struct.unpack("!IHH", body[offset:offset+8])
-    offset += 8
-    reason = body[offset]
-    offset += 1
-    assert offset == 9
-    # pad is 1 byte for aligiment
-    offset += 1
-    
-    data = body[offset:]
-    info(f"Packet in: buffer_id={buffer_id:#010x}, total_len={total_len}, in_port={in_port}, reason={reason}, data={data}")
+    buffer_id, total_len, in_port, reason = _PACKET_IN.decode(body)
+    data = body[_PACKET_IN.body.size:]
+    debug("Packet in: buffer_id=%#010x, total_len=%d, in_port=%d, reason=%d", buffer_id, total_len, in_port, reason)
     return OFPacketIN(buffer_id, total_len, in_port, reason, data)
 
+def parse_port_status(body):
+    """
+    reason: 1 bytes; OFPPR_ADD, OFPPR_DELETE or OFPPR_MODIFY
+    pad: 7 bytes
+    desc: 48 bytes; ofp_phy_port
+    """
+    if len(body) < _PORT_STATUS.body.size + PHY_PORT.size:
+        raise ValueError("Port status too short: %d bytes" % len(body))
+    reason, = _PORT_STATUS.decode(body)
+    return OFPortStatus(reason, parse_phy_port(body, _PORT_STATUS.body.size))
+
+def parse_error(body) -> OFError:
+    """
+    type: 2 bytes; OFPET_*
+    code: 2 bytes; meaning depends on type
+    data: the rest; at least 64 bytes of the failed request
+    """
+    err_type, code = _ERROR.decode(body)
+    return OFError(err_type, code, bytes(body[_ERROR.body.size:]))
+
+def port_is_down(port: OFPhyPort) -> bool:
+    """Administratively down or without link"""
+    return bool(port.config & OFPPC_PORT_DOWN or port.state & OFPPS_LINK_DOWN)
+
+# header-only messages skip MessageSpec.encode and pack the header directly
 def make_hello(xid):
-    return packheader(OFPT_HELLO, 8, xid)
+    return HEADER.pack(OFP_VERSION, OFPT_HELLO, 8, xid)
+
+def make_echo_request(xid):
+    return HEADER.pack(OFP_VERSION, OFPT_ECHO_REQUEST, 8, xid)
+
+def make_echo_reply(hdr, data=b''):
+    """The reply carries the request's xid and its data unchanged"""
+    if data:
+        return HEADER.pack(OFP_VERSION, OFPT_ECHO_REPLY, 8 + len(data), hdr.xid) + bytes(data)
+    return HEADER.pack(OFP_VERSION, OFPT_ECHO_REPLY, 8, hdr.xid)
 
-def make_echo_reply(hdr):
-    return packheader(OFPT_ECHO_REPLY, hdr.length, hdr.xid)
-    
 def make_features_request(xid):
-    return packheader(OFPT_FEATURES_REQUEST, 8, xid)
+    return HEADER.pack(OFP_VERSION, OFPT_FEATURES_REQUEST, 8, xid)
+
+_OUTPUT_ACTION_LEN = ACTION_OUTPUT.size
 
-def make_packet_out(hdr: OFHeader, buffer_id,in_port, out_port):
-    return packheader(OFPT_PACKET_OUT, hdr.length, hdr.xid)
+def make_packet_out(xid, buffer_id, in_port, out_port, data=b''):
+    """
+    buffer_id: 4 bytes; OFP_NO_BUFFER when the frame is carried in data
+    in_port: 2 bytes
+    actions_len: 2 bytes
+    actions: a single output action to out_port
+    data: the frame, only sent when buffer_id is OFP_NO_BUFFER
+    """
+    action = ACTION_OUTPUT.pack(OFPAT_OUTPUT, _OUTPUT_ACTION_LEN, out_port, 0)
+    if buffer_id == OFP_NO_BUFFER and data:
+        action += bytes(data)
+    return _PACKET_OUT.encode(xid, buffer_id, in_port, _OUTPUT_ACTION_LEN, tail=action)
+
+def make_packet_out_ports(xid, buffer_id, in_port, out_ports, data=b''):
+    """make_packet_out with an output action per port of out_ports; none drops the packet"""
+    actions = b''.join(ACTION_OUTPUT.pack(OFPAT_OUTPUT, _OUTPUT_ACTION_LEN, port, 0) for port in out_ports)
+    tail = actions + bytes(data) if buffer_id == OFP_NO_BUFFER and data else actions
+    return _PACKET_OUT.encode(xid, buffer_id, in_port, len(actions), tail=tail)
+
+def make_flow_mod(xid, match: OFMatch, command=OFPFC_ADD, out_port=None,
+                  idle_timeout=0, hard_timeout=0, priority=OFP_DEFAULT_PRIORITY,
+                  buffer_id=OFP_NO_BUFFER, cookie=0, flags=0):
+    """
+    match: 40 bytes
+    cookie: 8 bytes
+    command: 2 bytes
+    idle_timeout: 2 bytes
+    hard_timeout: 2 bytes
+    priority: 2 bytes
+    buffer_id: 4 bytes; buffered packet to apply the new flow to
+    out_port: 2 bytes; only used by delete commands
+    flags: 2 bytes
+    actions: output to out_port for add/modify, none for delete
+    """
+    if command in (OFPFC_DELETE, OFPFC_DELETE_STRICT):
+        actions = b''
+        filter_port = OFPP_NONE if out_port is None else out_port
+    else:
+        actions = ACTION_OUTPUT.pack(OFPAT_OUTPUT, _OUTPUT_ACTION_LEN, out_port, 0)
+        filter_port = OFPP_NONE
+    return _FLOW_MOD.encode(xid, *match_fields(match), cookie, command, idle_timeout, hard_timeout,
+                            priority, buffer_id, filter_port, flags, tail=actions)
+
+# fields patched into pre-encoded templates
+_LENGTH_XID = struct.Struct("!HI")   # header offset 2
+_BUFFER_IN_PORT = struct.Struct("!IH")
+_U32 = struct.Struct("!I")
+_U16 = struct.Struct("!H")
+_L2_MATCH = struct.Struct("!H6s6s")  # in_port, dl_src, dl_dst
+
+# offsets into PACKET_OUT with one output action
+_PACKET_OUT_BUFFER_ID = 8
+_PACKET_OUT_ACTION_PORT = 20
+_PACKET_OUT_LEN = 24
+# PACKET_OUT without actions: header, buffer_id, in_port, actions_len
+_PACKET_OUT_DROP = struct.Struct("!BBHIIHH")
+# offsets into FLOW_MOD with one output action
+_FLOW_MOD_MATCH_IN_PORT = 12
+_FLOW_MOD_BUFFER_ID = 64
+_FLOW_MOD_ACTION_PORT = 76
+
+class MessageTemplates:
+    """
+    Pre-encoded outbound messages.
+    Each message shape is encoded once by its builder (make_packet_out,
+    make_flow_mod) into a bytearray; a call only patches the xid and
+    the fields that vary (buffer_id, ports, MACs) and returns a bytes copy,
+    because Connection.send queues the object it is given.
+
+    Header-only messages (HELLO, FEATURES_REQUEST, ECHO_*) are a single
+    8 byte pack already, which is cheaper than patching and copying a
+    buffer, so those methods pack the header directly.
+    """
+
+    def __init__(self, idle_timeout=FLOW_IDLE_TIMEOUT, hard_timeout=FLOW_HARD_TIMEOUT,
+                 priority=OFP_DEFAULT_PRIORITY):
+        self._packet_out = bytearray(make_packet_out(0, 0, 0, OFPP_FLOOD))
+        # output FLOW_MOD of the learning switch: exact (in_port, dl_src, dl_dst) match
+        self._flow_mod = bytearray(make_flow_mod(
+            0, match_l2(0, ZERO_MAC, ZERO_MAC), OFPFC_ADD, 0,
+            idle_timeout=idle_timeout, hard_timeout=hard_timeout, priority=priority, buffer_id=0))
+
+    def hello(self, xid):
+        return HEADER.pack(OFP_VERSION, OFPT_HELLO, 8, xid)
+
+    def features_request(self, xid):
+        return HEADER.pack(OFP_VERSION, OFPT_FEATURES_REQUEST, 8, xid)
+
+    def echo_request(self, xid):
+        return HEADER.pack(OFP_VERSION, OFPT_ECHO_REQUEST, 8, xid)
+
+    def barrier_request(self, xid):
+        return HEADER.pack(OFP_VERSION, OFPT_BARRIER_REQUEST, 8, xid)
+
+    def echo_reply(self, xid, data=b''):
+        if data:
+            return HEADER.pack(OFP_VERSION, OFPT_ECHO_REPLY, 8 + len(data), xid) + data
+        return HEADER.pack(OFP_VERSION, OFPT_ECHO_REPLY, 8, xid)
+
+    def packet_out(self, xid, buffer_id, in_port, out_port=OFPP_FLOOD, data=b''):
+        """Same message as make_packet_out"""
+        buf = self._packet_out
+        _BUFFER_IN_PORT.pack_into(buf, _PACKET_OUT_BUFFER_ID, buffer_id, in_port)
+        _U16.pack_into(buf, _PACKET_OUT_ACTION_PORT, out_port)
+        if buffer_id == OFP_NO_BUFFER and data:
+            _LENGTH_XID.pack_into(buf, 2, _PACKET_OUT_LEN + len(data), xid)
+            return bytes(buf) + data
+        _LENGTH_XID.pack_into(buf, 2, _PACKET_OUT_LEN, xid)
+        return bytes(buf)
+
+    def packet_drop(self, xid, buffer_id, in_port):
+        """PACKET_OUT with no actions: the switch frees the buffered packet"""
+        return _PACKET_OUT_DROP.pack(OFP_VERSION, OFPT_PACKET_OUT, _PACKET_OUT_DROP.size, xid,
+                                     buffer_id, in_port, 0)
+
+    def flow_mod_output(self, xid, in_port, dl_src, dl_dst, out_port, buffer_id=OFP_NO_BUFFER):
+        """Same message as make_flow_mod(xid, match_l2(in_port, dl_src, dl_dst), OFPFC_ADD, out_port, ...)"""
+        buf = self._flow_mod
+        _U32.pack_into(buf, 4, xid)
+        _L2_MATCH.pack_into(buf, _FLOW_MOD_MATCH_IN_PORT, in_port, dl_src, dl_dst)
+        _U32.pack_into(buf, _FLOW_MOD_BUFFER_ID, buffer_id)
+        _U16.pack_into(buf, _FLOW_MOD_ACTION_PORT, out_port)
+        return bytes(buf)
+
+templates = MessageTemplates()
+
+# per-packet summaries are sampled so a PACKET_IN storm cannot flood the log
+_packet_in_log = RateLimiter(rate=1.0, burst=5)
+# so are ERRORs nobody waits for, e.g. for FLOW_MODs of the learning switch
+_error_log = RateLimiter(rate=1.0, burst=5)
+# and PACKET_INs too short to hold an Ethernet header
+_runt_log = RateLimiter(rate=1.0, burst=5)
 
 def handler_hello(ctrl: ControllerIF, conn, hdr, body):
-    success(f"Hello message received(xid = {hdr.xid})")
+    success("Hello message received(xid = %d)", hdr.xid)
 
 def handler_echo_request(ctrl: ControllerIF, conn, hdr, body):
-    success(f"Echo request message received(xid = {hdr.xid})")
-    reply =  make_echo_reply(hdr)
-    conn.send(reply)
-    success(f"Echo reply message sent(xid = {hdr.xid})")
+    debug("Echo request message received(xid = %d)", hdr.xid)
+    conn.send(templates.echo_reply(hdr.xid, body))
+    debug("Echo reply message sent(xid = %d)", hdr.xid)
+
+def handler_echo_reply(ctrl: ControllerIF, conn, hdr, body):
+    debug("Echo reply message received(xid = %d)", hdr.xid)
+    if hdr.xid == conn.echo_xid:
+        # answer to the controller's keepalive
+        conn.echo_rtt = ctrl.scheduler.clock() - conn.echo_sent_at
+        conn.echo_xid = None
+        return
+    ctrl.requests.resolve(conn, hdr.xid, bytes(body))
 
 def handler_features_reply(ctrl: ControllerIF, conn, hdr, body):
-    success(f"Features reply message received(xid = {hdr.xid})")
-    parse_features_reply(body)
+    success("Features reply message received(xid = %d)", hdr.xid)
+    features = parse_features_reply(body)
+    conn.datapath = ctrl.datapaths.register(features, conn)
+    ctrl.requests.resolve(conn, hdr.xid, features)
+
+def handler_barrier_reply(ctrl: ControllerIF, conn, hdr, body):
+    debug("Barrier reply message received(xid = %d)", hdr.xid)
+    ctrl.requests.resolve(conn, hdr.xid, None)
+
+def handler_error(ctrl: ControllerIF, conn, hdr, body):
+    err = parse_error(body)
+    if not ctrl.requests.fail(conn, hdr.xid, err):
+        ratelimited(_error_log, error, "Error message from %s: type=%d, code=%d (xid = %d)",
+                    conn.addr, err.err_type, err.code, hdr.xid)
 
 def handler_packet_in(ctrl: ControllerIF, conn, hdr, body):
-    success(f"Packet in message received(xid = {hdr.xid})")
+    """
+    Reactive L2 learning switch:
+    learn the source port, then either install a flow towards the known
+    destination port (the switch applies it to the buffered packet) or flood.
+    A flow already pushed to the switch moments ago is not sent again.
+    LLDP probes of link discovery are handed to ctrl.discovery instead,
+    and ARP requests the controller knows the answer to are answered.
+    """
+    debug("Packet in message received(xid = %d)", hdr.xid)
+    if len(body) < FRAME_OFFSET + ETH_HEADER_LEN:
+        _drop_runts(ctrl, conn, [body])
+        return
     pktin = parse_packet_in(body)
     eth = parse_ethernet(pktin.data)
-    info(f"Packet in: {pktin}")
-    info(f"Ethernet frame: {eth}")
-    src = eth.src
-    dst = eth.dst
+    debug("Ethernet frame: %r", eth)
     in_port = pktin.in_port
-    info(f"Packet in: src={src}, dst={dst}, in_port={in_port}")
-    ctrl.mac_table.learn(src, in_port)
-
+    ratelimited(_packet_in_log, info, "Packet in: in_port=%d, %r", in_port, eth)
+    dp = conn.datapath
+    if dp is None:
+        # no FEATURES_REPLY yet, so no table to learn into
+        conn.send(templates.packet_out(ctrl.next_xid(), pktin.buffer_id, in_port, OFPP_FLOOD, pktin.data))
+        return
+    dst = bytes(eth.raw[0:6])
+    if dst == LLDP_MAC:
+        _lldp_in(ctrl, dp, in_port, pktin.data)
+        return
+    mac_table = dp.mac_table
+    src = bytes(eth.raw[6:12])
+    previous = mac_table.learn(mac_table.mac_key(src), in_port)
+    if previous is not None and previous != in_port:
+        # the host moved: flows towards it still point at its old port. The
+        # shadow table may have aged them out while traffic kept them alive
+        # on the switch, so the DELETE goes out either way.
+        dp.flow_table.invalidate_dst(src)
+        conn.send(make_flow_mod(ctrl.next_xid(), match_dl_dst(src), OFPFC_DELETE))
+    if ctrl.topology.links:
+        _learn_host(ctrl, dp, src, in_port)
+    data = pktin.data
+    if (data[12:14] == _ETH_TYPE_ARP and dp.arp_cache is not None
+            and _proxy_arp(ctrl, conn, dp.arp_cache, pktin.buffer_id, in_port, dst, data)):
+        return
+    _forward_l2(ctrl, conn, dp, pktin.buffer_id, in_port, src, dst, data)
+
+
+def handler_packet_in_batch(ctrl: ControllerIF, conn, batch):
+    """
+    handler_packet_in for the (hdr, body) PACKET_INs of one read. The
+    sources of the whole batch are learned first, in one learn_many() with
+    one timestamp, so a packet can be forwarded to a host whose first
+    packet comes later in the same read.
+    """
+    bodies = [body for _, body in batch]
+    if min(map(len, bodies)) < FRAME_OFFSET + ETH_HEADER_LEN:
+        bodies = _drop_runts(ctrl, conn, bodies)
+        if not bodies:
+            return
+    buffer_ids, in_ports, dsts, srcs = packet_in_columns(bodies)
+    debug("Packet in messages received(%d, first xid = %d)", len(batch), batch[0][0].xid)
+    ratelimited(_packet_in_log, info, "Packet in: in_port=%d, %r (%d in read)",
+                in_ports[0], parse_ethernet(bodies[0][FRAME_OFFSET:]), len(batch))
+    dp = conn.datapath
+    if dp is None:
+        # no FEATURES_REPLY yet, so no table to learn into
+        for body, buffer_id, in_port in zip(bodies, buffer_ids, in_ports):
+            conn.send(templates.packet_out(ctrl.next_xid(), buffer_id, in_port, OFPP_FLOOD, body[FRAME_OFFSET:]))
+        return
+    if LLDP_MAC in dsts:
+        keep = []
+        for i, dst in enumerate(dsts):
+            if dst == LLDP_MAC:
+                _lldp_in(ctrl, dp, in_ports[i], bodies[i][FRAME_OFFSET:])
+            else:
+                keep.append(i)
+        if not keep:
+            return
+        bodies, buffer_ids, in_ports, dsts, srcs = (
+            [column[i] for i in keep] for column in (bodies, buffer_ids, in_ports, dsts, srcs))
+    mac_table = dp.mac_table
+    now = time.time()
+    # a source seen more than once in the read is learned on its last port
+    for mac in mac_table.learn_many(dict(zip(map(mac_table.mac_key, srcs), in_ports)), now):
+        src = mac_to_bytes(mac)
+        dp.flow_table.invalidate_dst(src)
+        conn.send(make_flow_mod(ctrl.next_xid(), match_dl_dst(src), OFPFC_DELETE))
+    if ctrl.topology.links:
+        for src, in_port in zip(srcs, in_ports):
+            _learn_host(ctrl, dp, src, in_port)
+    arp_cache = dp.arp_cache
+    for body, buffer_id, in_port, dst, src in zip(bodies, buffer_ids, in_ports, dsts, srcs):
+        data = body[FRAME_OFFSET:]
+        if (data[12:14] == _ETH_TYPE_ARP and arp_cache is not None
+                and _proxy_arp(ctrl, conn, arp_cache, buffer_id, in_port, dst, data, now)):
+            continue
+        _forward_l2(ctrl, conn, dp, buffer_id, in_port, src, dst, data, now)
+
+
+# buffer_id and in_port of a PACKET_IN body
+_PACKET_IN_IDS = struct.Struct("!I2xH")
+
+def _drop_runts(ctrl: ControllerIF, conn, bodies):
+    """
+    The bodies whose frame holds an Ethernet header. The others are
+    skipped instead of failing the whole read; their buffers are freed.
+    """
+    kept = []
+    for body in bodies:
+        if len(body) >= FRAME_OFFSET + ETH_HEADER_LEN:
+            kept.append(body)
+            continue
+        ratelimited(_runt_log, error, "Packet in too short: %d bytes", len(body))
+        if len(body) >= _PACKET_IN_IDS.size:
+            buffer_id, in_port = _PACKET_IN_IDS.unpack_from(body)
+            if buffer_id != OFP_NO_BUFFER:
+                conn.send(templates.packet_drop(ctrl.next_xid(), buffer_id, in_port))
+    return kept
+
+
+_ETH_TYPE_ARP = ETH_TYPE_ARP.to_bytes(2, "big")
+_BROADCAST = b"\xff" * 6
+_NO_IP = bytes(4)
+
+def _proxy_arp(ctrl: ControllerIF, conn, cache, buffer_id, in_port, dst, data, now=None) -> bool:
+    """
+    Learn the sender of an untagged ARP packet into the switch's cache and
+    answer a broadcast request for a cached address with a PACKET_OUT of
+    the reply out of in_port, so the request is not flooded. Gratuitous
+    ARP, requests for unknown addresses and the copies of a request that
+    was just flooded are left to the learning switch. Returns True if the
+    request was answered.
+    """
+    try:
+        opcode, sender_mac, sender_ip, _, target_ip = unpack_arp(data[ETH_HEADER_LEN:])
+    except ValueError:
+        return False
+    if now is None:
+        now = time.time()
+    if sender_ip != _NO_IP:
+        # 0.0.0.0 is an address probe, not a binding
+        cache.learn(sender_ip, sender_mac, now)
+    if opcode != ARP_REQUEST or dst != _BROADCAST or sender_ip == target_ip:
+        return False
+    mac = cache.lookup(target_ip, now)
+    if mac is None:
+        cache.flooded(sender_ip, target_ip, now)
+        return False
+    if mac == sender_mac or cache.is_echo(sender_ip, target_ip, now):
+        return False
+    reply = make_arp_reply(mac, target_ip, sender_mac, sender_ip)
+    conn.send(templates.packet_out(ctrl.next_xid(), OFP_NO_BUFFER, OFPP_NONE, in_port, reply))
+    if buffer_id != OFP_NO_BUFFER:
+        # the request is answered; free its buffer on the switch
+        conn.send(templates.packet_drop(ctrl.next_xid(), buffer_id, in_port))
+    cache.answered += 1
+    return True
+
+
+def _lldp_in(ctrl: ControllerIF, dp, in_port, frame):
+    # probes are consumed: never learned, forwarded or flooded
+    discovery = ctrl.discovery
+    if discovery is not None:
+        discovery.received(dp, in_port, frame)
+
+
+def _learn_host(ctrl: ControllerIF, dp, src, in_port):
+    """Locate src in the topology if in_port is an edge port"""
+    topology = ctrl.topology
+    if topology.is_link_port(dp.dpid, in_port):
+        return
+    previous = topology.learn_host(src, dp.dpid, in_port)
+    if previous is None or previous[0] == dp.dpid:
+        return
+    # the host moved to another switch: every switch's flows towards it lead to the old one
+    for other in ctrl.datapaths.all():
+        other.flow_table.invalidate_dst(src)
+        if other.conn is not None and not other.conn.closed:
+            other.conn.send(make_flow_mod(ctrl.next_xid(), match_dl_dst(src), OFPFC_DELETE))
+
+
+def _forward_l2(ctrl: ControllerIF, conn, dp, buffer_id, in_port, src, dst, data, now=None):
+    """
+    Flood, drop, or install a flow towards dst (src already learned). Once
+    links are discovered, a host located on another switch is reached over
+    the shortest path to that switch; otherwise the datapath's own MAC
+    table gives the port.
+    """
+    mac_table = dp.mac_table
+    # group (broadcast/multicast) destinations are always flooded
+    if dst[0] & 1:
+        out_port = None
+    else:
+        topology = ctrl.topology
+        out_port = topology.host_port(dp.dpid, dst) if topology.links else None
+        if out_port is None:
+            out_port = mac_table.lookup(mac_table.mac_key(dst), now)
+    if out_port is None:
+        admission = ctrl.admission
+        if admission is not None and not admission.first_miss(dp.dpid, src, dst, time.monotonic()):
+            # the same miss was just flooded; free this copy's buffer on the switch
+            if buffer_id != OFP_NO_BUFFER:
+                conn.send(templates.packet_drop(ctrl.next_xid(), buffer_id, in_port))
+            return
+        if ctrl.topology.links:
+            _flood_tree(ctrl, conn, dp, buffer_id, in_port, data)
+        else:
+            conn.send(templates.packet_out(ctrl.next_xid(), buffer_id, in_port, OFPP_FLOOD, data))
+        return
+    if out_port == in_port:
+        # destination is behind the ingress port; the switch already
+        # delivered it, only a buffered copy is left to free
+        if buffer_id != OFP_NO_BUFFER:
+            conn.send(templates.packet_drop(ctrl.next_xid(), buffer_id, in_port))
+        return
+    if not dp.flow_table.install_l2(in_port, src, dst, out_port, OFP_DEFAULT_PRIORITY,
+                                    FLOW_IDLE_TIMEOUT, FLOW_HARD_TIMEOUT):
+        # same flow pushed a moment ago and still on its way: only forward this packet
+        conn.send(templates.packet_out(ctrl.next_xid(), buffer_id, in_port, out_port, data))
+        return
+    conn.send(templates.flow_mod_output(ctrl.next_xid(), in_port, src, dst, out_port, buffer_id))
+    if buffer_id == OFP_NO_BUFFER:
+        # nothing buffered on the switch for the flow to release; send the frame itself
+        conn.send(templates.packet_out(ctrl.next_xid(), OFP_NO_BUFFER, in_port, out_port, data))
+
+
+def _flood_tree(ctrl: ControllerIF, conn, dp, buffer_id, in_port, data):
+    """
+    Flood out of the edge ports and the spanning tree's link ports, so
+    the copies do not circle the loops of the fabric. A copy that arrives
+    over a link off the tree is one that went round a loop: dropped.
+    """
+    topology = ctrl.topology
+    tree = topology.flood_ports(dp.dpid)
+    if tree is None:
+        # no links on this switch
+        conn.send(templates.packet_out(ctrl.next_xid(), buffer_id, in_port, OFPP_FLOOD, data))
+        return
+    dpid = dp.dpid
+    if in_port not in tree and topology.is_link_port(dpid, in_port):
+        if buffer_id != OFP_NO_BUFFER:
+            conn.send(templates.packet_drop(ctrl.next_xid(), buffer_id, in_port))
+        return
+    ports = [port_no for port_no, port in dp.ports.items()
+             if port_no != in_port and port_no < OFPP_MAX and not port.config & OFPPC_NO_FLOOD
+             and (port_no in tree or not topology.is_link_port(dpid, port_no))]
+    if ports or buffer_id != OFP_NO_BUFFER:
+        conn.send(make_packet_out_ports(ctrl.next_xid(), buffer_id, in_port, ports, data))
+
+
+_PORT_REASONS = {OFPPR_ADD: "add", OFPPR_DELETE: "delete", OFPPR_MODIFY: "modify"}
 
 def handler_port_status(ctrl: ControllerIF, conn, hdr, body):
-    info(f"Port status message received(xid = {hdr.xid})")
-    #todo: parse port status
+    """
+    Keep the datapath's ports current. When a port is deleted or goes
+    down, the MACs learned on it, the flows in or out of it and its links
+    are purged through the per-port indexes, and the switch is told to delete those
+    flows with two FLOW_MODs (out_port filter, in_port match), so the cost
+    is the number of affected entries, not the table size.
+    """
+    status = parse_port_status(body)
+    port = status.port
+    down = status.reason == OFPPR_DELETE or port_is_down(port)
+    info("Port status: %s port %d (%s)%s", _PORT_REASONS.get(status.reason, status.reason),
+         port.port_no, port.name, " down" if down else "")
+    dp = conn.datapath
+    if dp is None:
+        return
+    if status.reason == OFPPR_DELETE:
+        dp.ports.pop(port.port_no, None)
+    else:
+        dp.ports[port.port_no] = port
+    if not down:
+        return
+    purged = dp.mac_table.remove_port(port.port_no)
+    dp.flow_table.invalidate_port(port.port_no)
+    ctrl.topology.remove_port(dp.dpid, port.port_no)
+    if ctrl.discovery is not None:
+        ctrl.discovery.forget_port(dp.dpid, port.port_no)
+    # also covers flows the shadow table has already aged out
+    conn.send(make_flow_mod(ctrl.next_xid(), OFMatch(), OFPFC_DELETE, port.port_no))
+    conn.send(make_flow_mod(ctrl.next_xid(), match_in_port(port.port_no), OFPFC_DELETE))
+    if purged:
+        info("Port %d down: forgot %d MACs", port.port_no, len(purged))
 
 handlers = {
         OFPT_HELLO:  handler_hello,
+        OFPT_ERROR:  handler_error,
         OFPT_FEATURES_REPLY:  handler_features_reply,
         OFPT_PACKET_IN: handler_packet_in,
         OFPT_ECHO_REQUEST: handler_echo_request,
+        OFPT_ECHO_REPLY: handler_echo_reply,
         OFPT_PORT_STATUS: handler_port_status,
+        OFPT_BARRIER_REPLY: handler_barrier_reply,
+}
+
+# handlers that take every (hdr, body) of one type from a read in one call
+batch_handlers = {
+        OFPT_PACKET_IN: handler_packet_in_batch,
 }
 
 
@@ -256,5 +784,45 @@ def dispatcher(ctrl: ControllerIF, conn, hdr, body):
     assert hdr.msg_type in handlers, "Unknown message type: " + str(hdr.msg_type)
     fn = handlers[hdr.msg_type]
     assert fn is not None, "Unknown message type: " + str(hdr.msg_type)
+    metrics = ctrl.metrics
+    if metrics is None:
+        fn(ctrl, conn, hdr, body)
+        return
+    messages = metrics.messages
+    count = messages[hdr.msg_type] = messages[hdr.msg_type] + 1
+    if count & metrics.sample_mask:
+        fn(ctrl, conn, hdr, body)
+        return
+    # a sampled message is timed
+    start = perf_counter_ns()
     fn(ctrl, conn, hdr, body)
-    
\ No newline at end of file
+    metrics.observe(hdr.msg_type, conn.received_at, start, perf_counter_ns())
+    
+
+def dispatch_batch(ctrl: ControllerIF, conn, msg_type, batch):
+    """
+    Dispatch the (hdr, body) pairs of one message type from one read.
+    A type with a batch handler gets the whole list in one call; others,
+    and single messages, which are cheaper through the plain handler, go
+    through dispatcher(). A timed batch is recorded as its handling time
+    divided by its size.
+    """
+    fn = batch_handlers.get(msg_type)
+    if fn is None or len(batch) == 1:
+        for hdr, body in batch:
+            dispatcher(ctrl, conn, hdr, body)
+        return
+    metrics = ctrl.metrics
+    if metrics is None:
+        fn(ctrl, conn, batch)
+        return
+    messages = metrics.messages
+    before = messages[msg_type]
+    count = messages[msg_type] = before + len(batch)
+    if before | metrics.sample_mask >= count:
+        # no sampled message number in this batch
+        fn(ctrl, conn, batch)
+        return
+    start = perf_counter_ns()
+    fn(ctrl, conn, batch)
+    metrics.observe(msg_type, conn.received_at, start, start + (perf_counter_ns() - start) // len(batch))
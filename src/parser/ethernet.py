@@ -1,11 +1,278 @@
-from scapy.all import Ether
+import socket
+import struct
+from typing import Optional
 
-def parse_ethernet(raw: bytes):
+# EtherType values
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_ARP  = 0x0806
+ETH_TYPE_VLAN = 0x8100
+ETH_TYPE_QINQ = 0x88a8
+
+# ARP opcodes
+ARP_REQUEST = 1
+ARP_REPLY   = 2
+
+# IP protocol numbers
+IP_PROTO_TCP = 6
+IP_PROTO_UDP = 17
+
+ETH_HEADER_LEN = 14
+
+_U16 = struct.Struct("!H")
+_ARP = struct.Struct("!HHBBH6s4s6s4s")
+_IPV4 = struct.Struct("!BBHHHBBH4s4s")
+_TCP = struct.Struct("!HHIIBB")
+_UDP = struct.Struct("!HHH")
+
+
+def mac_to_str(raw) -> str:
+    """6 raw bytes -> 'aa:bb:cc:dd:ee:ff'"""
+    return raw.hex(":")
+
+
+def unpack_arp(raw) -> tuple[int, bytes, bytes, bytes, bytes]:
+    """
+    (opcode, sender_mac, sender_ip, target_mac, target_ip) of an Ethernet/IPv4
+    ARP packet as raw bytes, without the string conversions of ARPPacket.
+    Raises ValueError if raw is too short or not Ethernet/IPv4 ARP.
+    """
+    if len(raw) < _ARP.size:
+        raise ValueError(f"ARP packet too short: {len(raw)} bytes")
+    hwtype, ptype, hwlen, plen, opcode, sha, spa, tha, tpa = _ARP.unpack_from(raw)
+    if (hwtype, ptype, hwlen, plen) != (1, ETH_TYPE_IPV4, 6, 4):
+        raise ValueError(f"Not an Ethernet/IPv4 ARP packet: hwtype={hwtype}, ptype={ptype:#06x}")
+    return opcode, sha, spa, tha, tpa
+
+
+def make_arp_reply(sender_mac: bytes, sender_ip: bytes, target_mac: bytes, target_ip: bytes) -> bytes:
+    """Ethernet frame of an ARP reply 'sender_ip is at sender_mac' sent to target_mac"""
+    frame = (target_mac + sender_mac + _U16.pack(ETH_TYPE_ARP)
+             + _ARP.pack(1, ETH_TYPE_IPV4, 6, 4, ARP_REPLY, sender_mac, sender_ip, target_mac, target_ip))
+    # pad to the 60 byte minimum frame (without FCS)
+    return frame.ljust(60, b"\x00")
+
+
+class ARPPacket:
+    """
+    hwtype: 2 bytes
+    ptype: 2 bytes
+    hwlen: 1 bytes
+    plen: 1 bytes
+    opcode: 2 bytes
+    sender_mac: 6 bytes
+    sender_ip: 4 bytes
+    target_mac: 6 bytes
+    target_ip: 4 bytes
+    """
+    __slots__ = ("hwtype", "ptype", "opcode", "sender_mac", "sender_ip", "target_mac", "target_ip")
+
+    def __init__(self, raw):
+        if len(raw) < _ARP.size:
+            raise ValueError(f"ARP packet too short: {len(raw)} bytes")
+        (self.hwtype, self.ptype, _, _, self.opcode,
+         sha, spa, tha, tpa) = _ARP.unpack_from(raw)
+        self.sender_mac = mac_to_str(sha)
+        self.sender_ip = socket.inet_ntoa(spa)
+        self.target_mac = mac_to_str(tha)
+        self.target_ip = socket.inet_ntoa(tpa)
+
+    def __repr__(self):
+        return (f"ARPPacket(opcode={self.opcode}, sender={self.sender_mac}/{self.sender_ip}, "
+                f"target={self.target_mac}/{self.target_ip})")
+
+
+class IPv4Packet:
+    """
+    Fixed 20 byte IPv4 header; options are skipped using ihl.
+    payload is a view of the data after the header.
+    """
+    __slots__ = ("version", "ihl", "tos", "total_length", "ttl", "proto", "src", "dst", "payload")
+
+    def __init__(self, raw):
+        if len(raw) < _IPV4.size:
+            raise ValueError(f"IPv4 packet too short: {len(raw)} bytes")
+        (ver_ihl, self.tos, self.total_length, _, _,
+         self.ttl, self.proto, _, src, dst) = _IPV4.unpack_from(raw)
+        self.version = ver_ihl >> 4
+        self.ihl = ver_ihl & 0x0f
+        if self.ihl < 5:
+            raise ValueError(f"Invalid IPv4 header length: {self.ihl}")
+        self.src = socket.inet_ntoa(src)
+        self.dst = socket.inet_ntoa(dst)
+        self.payload = raw[self.ihl * 4:]
+
+    def __repr__(self):
+        return f"IPv4Packet(src={self.src}, dst={self.dst}, proto={self.proto}, ttl={self.ttl})"
+
+
+class TCPSegment:
+    __slots__ = ("src_port", "dst_port", "seq", "ack", "flags")
+
+    def __init__(self, raw):
+        if len(raw) < 20:
+            raise ValueError(f"TCP segment too short: {len(raw)} bytes")
+        self.src_port, self.dst_port, self.seq, self.ack, _, self.flags = _TCP.unpack_from(raw)
+
+    def __repr__(self):
+        return f"TCPSegment(src_port={self.src_port}, dst_port={self.dst_port}, flags={self.flags:#04x})"
+
+
+class UDPDatagram:
+    __slots__ = ("src_port", "dst_port", "length")
+
+    def __init__(self, raw):
+        if len(raw) < _UDP.size:
+            raise ValueError(f"UDP datagram too short: {len(raw)} bytes")
+        self.src_port, self.dst_port, self.length = _UDP.unpack_from(raw)
+
+    def __repr__(self):
+        return f"UDPDatagram(src_port={self.src_port}, dst_port={self.dst_port}, length={self.length})"
+
+
+class EthernetFrame:
+    """
+    Lazily decoded Ethernet frame.
+
+    Only the length is checked up front; every header field is decoded on
+    first access and cached. raw may be bytes or a memoryview; views into a
+    receive buffer must not be kept beyond the current dispatch.
+    """
+    __slots__ = ("raw", "_dst", "_src", "_ethertype", "_vlans", "_l3_offset", "_l3", "_l4")
+
+    def __init__(self, raw):
+        if len(raw) < ETH_HEADER_LEN:
+            raise ValueError(f"Ethernet frame too short: {len(raw)} bytes")
+        self.raw = raw
+        self._dst = None
+        self._src = None
+        self._ethertype = None
+        self._vlans = None
+        self._l3_offset = 0
+        self._l3 = False
+        self._l4 = False
+
+    @property
+    def dst(self) -> str:
+        if self._dst is None:
+            self._dst = mac_to_str(self.raw[0:6])
+        return self._dst
+
+    @property
+    def src(self) -> str:
+        if self._src is None:
+            self._src = mac_to_str(self.raw[6:12])
+        return self._src
+
+    def _decode_l2(self):
+        raw = self.raw
+        offset = 12
+        ethertype, = _U16.unpack_from(raw, offset)
+        vlans = []
+        # 802.1Q / 802.1ad tags: TPID(2) + TCI(2), vlan id is the low 12 bits of TCI
+        while ethertype in (ETH_TYPE_VLAN, ETH_TYPE_QINQ):
+            if len(raw) < offset + 8:
+                raise ValueError("Truncated VLAN tag")
+            tci, ethertype = struct.unpack_from("!HH", raw, offset + 2)
+            vlans.append(tci & 0x0fff)
+            offset += 4
+        self._ethertype = ethertype
+        self._vlans = tuple(vlans)
+        self._l3_offset = offset + 2
+
+    @property
+    def ethertype(self) -> int:
+        """EtherType of the payload, after any VLAN tags"""
+        if self._ethertype is None:
+            self._decode_l2()
+        return self._ethertype
+
+    @property
+    def vlans(self) -> tuple:
+        """VLAN ids, outermost first"""
+        if self._vlans is None:
+            self._decode_l2()
+        return self._vlans
+
+    @property
+    def vlan_id(self) -> Optional[int]:
+        vlans = self.vlans
+        return vlans[0] if vlans else None
+
+    @property
+    def payload(self):
+        if self._ethertype is None:
+            self._decode_l2()
+        return memoryview(self.raw)[self._l3_offset:]
+
+    def _decode_l3(self):
+        self._l3 = None
+        ethertype = self.ethertype
+        if ethertype == ETH_TYPE_ARP:
+            self._l3 = ARPPacket(self.payload)
+        elif ethertype == ETH_TYPE_IPV4:
+            self._l3 = IPv4Packet(self.payload)
+
+    @property
+    def arp(self) -> Optional[ARPPacket]:
+        if self._l3 is False:
+            self._decode_l3()
+        return self._l3 if isinstance(self._l3, ARPPacket) else None
+
+    @property
+    def ipv4(self) -> Optional[IPv4Packet]:
+        if self._l3 is False:
+            self._decode_l3()
+        return self._l3 if isinstance(self._l3, IPv4Packet) else None
+
+    def _decode_l4(self):
+        self._l4 = None
+        ip = self.ipv4
+        if ip is None:
+            return
+        if ip.proto == IP_PROTO_TCP:
+            self._l4 = TCPSegment(ip.payload)
+        elif ip.proto == IP_PROTO_UDP:
+            self._l4 = UDPDatagram(ip.payload)
+
+    @property
+    def tcp(self) -> Optional[TCPSegment]:
+        if self._l4 is False:
+            self._decode_l4()
+        return self._l4 if isinstance(self._l4, TCPSegment) else None
+
+    @property
+    def udp(self) -> Optional[UDPDatagram]:
+        if self._l4 is False:
+            self._decode_l4()
+        return self._l4 if isinstance(self._l4, UDPDatagram) else None
+
+    def __repr__(self):
+        try:
+            return f"EthernetFrame(dst={self.dst}, src={self.src}, type={self.ethertype:#06x}, vlans={self.vlans})"
+        except ValueError:
+            # logged frames come straight from the switch; a malformed one must not raise
+            return f"EthernetFrame(dst={self.dst}, src={self.src}, truncated)"
+
+
+def parse_ethernet(raw) -> EthernetFrame:
+    """
+    Wrap a raw Ethernet frame for lazy decoding. Raises ValueError if the
+    frame is shorter than an Ethernet header.
+    """
+    return EthernetFrame(raw)
+
+
+def parse_ethernet_scapy(raw):
     """
     Parse raw Ethernet frame using Scapy and return a Scapy Ether object.
+    Slow; meant for debugging. Scapy is imported on first use.
     """
     try:
-        eth = Ether(raw)
+        from scapy.layers.l2 import Ether
+    except ImportError as e:
+        raise RuntimeError(f"Scapy is not installed: {e}")
+    try:
+        eth = Ether(bytes(raw))
         return eth
     except Exception as e:
-        raise ValueError(f"Failed to parse Ethernet frame: {e}")
\ No newline at end of file
+        raise ValueError(f"Failed to parse Ethernet frame: {e}")
@@ -0,0 +1,91 @@
+"""
+LLDP frames used by the controller for link discovery (IEEE 802.1AB).
+
+The controller sends one probe out of every switch port with a
+PACKET_OUT; a switch that receives it on another port sends it back in a
+PACKET_IN, which tells the controller the two ends of the link. A probe
+carries
+
+  Chassis ID  subtype 7 (locally assigned), "dpid:" + 16 hex digits
+  Port ID     subtype 2 (port component), the OpenFlow port number (2 bytes)
+  TTL         seconds
+  End
+
+Probes of other LLDP speakers do not have this chassis ID and are ignored.
+"""
+import struct
+from typing import Optional
+
+ETH_TYPE_LLDP = 0x88cc
+# nearest-bridge group address; 802.1D bridges never forward it
+LLDP_MAC = bytes.fromhex("0180c200000e")
+
+LLDP_TLV_END = 0
+LLDP_TLV_CHASSIS_ID = 1
+LLDP_TLV_PORT_ID = 2
+LLDP_TLV_TTL = 3
+
+CHASSIS_ID_LOCAL = 7
+PORT_ID_COMPONENT = 2
+
+_DPID_PREFIX = b"dpid:"
+# type(7 bits) and length(9 bits)
+_TLV = struct.Struct("!H")
+_U16 = struct.Struct("!H")
+_ETH = struct.Struct("!6s6sH")
+# Ethernet frames are padded to this size (without the FCS)
+_MIN_FRAME = 60
+
+
+def _tlv(tlv_type: int, value: bytes) -> bytes:
+    return _TLV.pack(tlv_type << 9 | len(value)) + value
+
+
+def make_lldp(dpid: int, port_no: int, src_mac: bytes, ttl: int = 120) -> bytes:
+    """Ethernet frame of the probe sent out of port_no of dpid, from src_mac"""
+    frame = b"".join((
+        _ETH.pack(LLDP_MAC, src_mac, ETH_TYPE_LLDP),
+        _tlv(LLDP_TLV_CHASSIS_ID, bytes([CHASSIS_ID_LOCAL]) + _DPID_PREFIX + b"%016x" % dpid),
+        _tlv(LLDP_TLV_PORT_ID, bytes([PORT_ID_COMPONENT]) + _U16.pack(port_no)),
+        _tlv(LLDP_TLV_TTL, _U16.pack(ttl)),
+        _tlv(LLDP_TLV_END, b""),
+    ))
+    return frame.ljust(_MIN_FRAME, b"\x00")
+
+
+def parse_lldp(frame) -> Optional[tuple[int, int]]:
+    """
+    (dpid, port_no) a controller probe was sent from, or None if frame is
+    not LLDP or not one of our probes.
+    """
+    if len(frame) < _ETH.size:
+        return None
+    _, _, eth_type = _ETH.unpack_from(frame)
+    if eth_type != ETH_TYPE_LLDP:
+        return None
+    dpid = port_no = None
+    offset = _ETH.size
+    end = len(frame)
+    while offset + _TLV.size <= end:
+        (head,) = _TLV.unpack_from(frame, offset)
+        tlv_type = head >> 9
+        length = head & 0x1ff
+        offset += _TLV.size
+        value = bytes(frame[offset:offset + length])
+        offset += length
+        if len(value) < length or tlv_type == LLDP_TLV_END:
+            break
+        if tlv_type == LLDP_TLV_CHASSIS_ID:
+            if value[:1] != bytes([CHASSIS_ID_LOCAL]) or not value[1:].startswith(_DPID_PREFIX):
+                return None
+            try:
+                dpid = int(value[1 + len(_DPID_PREFIX):], 16)
+            except ValueError:
+                return None
+        elif tlv_type == LLDP_TLV_PORT_ID:
+            if len(value) != 3 or value[0] != PORT_ID_COMPONENT:
+                return None
+            (port_no,) = _U16.unpack_from(value, 1)
+    if dpid is None or port_no is None:
+        return None
+    return dpid, port_no
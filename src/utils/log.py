@@ -1,23 +1,176 @@
-def info(msg):
+import queue
+import sys
+import threading
+import time
+
+# levels; a message is emitted when its level is >= the current level
+DEBUG = 10
+INFO = 20
+ERROR = 40
+
+# everything is printed unless a level is set (src.main defaults to INFO)
+_level = DEBUG
+_writer = None
+
+
+def set_level(level):
+    """Set the minimum level that is emitted"""
+    global _level
+    _level = level
+
+
+def enabled(level):
+    """True if messages of this level are emitted (guard for costly arguments)"""
+    return level >= _level
+
+
+class AsyncWriter(threading.Thread):
+    """
+    Background thread that writes queued log lines in batches.
+    When more than max_pending lines are waiting, new lines are dropped
+    and counted instead of growing memory.
+    """
+
+    def __init__(self, stream=None, max_pending=10000, batch=256):
+        super().__init__(name="log-writer", daemon=True)
+        self.stream = stream
+        self.max_pending = max_pending
+        self.batch = batch
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._sentinel = object()
+
+    def put(self, line):
+        if self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            return
+        self._queue.put(line)
+
+    def run(self):
+        q = self._queue
+        while True:
+            line = q.get()
+            lines = []
+            stop = False
+            while True:
+                if line is self._sentinel:
+                    stop = True
+                    break
+                lines.append(line)
+                if len(lines) >= self.batch:
+                    break
+                try:
+                    line = q.get_nowait()
+                except queue.Empty:
+                    break
+            if lines:
+                stream = self.stream or sys.stdout
+                stream.write("".join(lines))
+                stream.flush()
+            if stop:
+                return
+
+    def close(self):
+        """Write out every queued line and stop the thread"""
+        self._queue.put(self._sentinel)
+        self.join()
+
+
+def start_async(stream=None, max_pending=10000):
+    """Send log output through a background writer thread"""
+    global _writer
+    if _writer is None:
+        _writer = AsyncWriter(stream, max_pending)
+        _writer.start()
+    return _writer
+
+
+def stop_async():
+    """Flush the background writer and go back to synchronous output"""
+    global _writer
+    writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+
+
+def _emit(level, prefix, msg, args):
+    if level < _level:
+        return
+    # %-style arguments are only formatted once we know the line is emitted
+    if args:
+        msg = msg % args
+    line = f"{prefix} {msg}\n"
+    writer = _writer
+    if writer is not None:
+        writer.put(line)
+    else:
+        sys.stdout.write(line)
+
+
+def info(msg, *args):
     """
     print info message [*]
     """
-    print(f"[*] {msg}")
+    _emit(INFO, "[*]", msg, args)
 
-def success(msg):
+def success(msg, *args):
     """
-    print success message [+] 
+    print success message [+]
     """
-    print(f"[+] {msg}")
+    _emit(INFO, "[+]", msg, args)
 
-def error(msg):
+def error(msg, *args):
     """
     print error message [!]
     """
-    print(f"[!] {msg}")
+    _emit(ERROR, "[!]", msg, args)
 
-def debug(msg):
+def debug(msg, *args):
     """
     print debug message [?]
     """
-    print(f"[?] {msg}")
+    _emit(DEBUG, "[?]", msg, args)
+
+
+class RateLimiter:
+    """
+    Token bucket for noisy per-packet messages: allows `rate` messages per
+    second with bursts of up to `burst`, and counts what it suppressed.
+    """
+
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._suppressed = 0
+
+    def allow(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        self._suppressed += 1
+        return False
+
+    def take_suppressed(self):
+        """Return and reset the number of suppressed messages"""
+        n, self._suppressed = self._suppressed, 0
+        return n
+
+
+def ratelimited(limiter, log_fn, msg, *args):
+    """
+    Log through log_fn (info, debug, ...) if the limiter allows it; the
+    number of messages suppressed since the last one is appended.
+    """
+    if not limiter.allow():
+        return
+    suppressed = limiter.take_suppressed()
+    if suppressed:
+        msg += " (%d suppressed)"
+        args += (suppressed,)
+    log_fn(msg, *args)
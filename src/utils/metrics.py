@@ -0,0 +1,154 @@
+"""
+Counters and latency histograms cheap enough for the event loop, and a
+pull endpoint that serves them in the Prometheus text format.
+
+The event loop only increments plain ints and list slots; it never
+formats, locks or allocates per message. The exposition text is built
+by the HTTP server thread when a scrape arrives, reading the same
+numbers (a torn read across metrics is acceptable for monitoring).
+
+http.server (and the email/ssl stack behind it) is imported only when a
+MetricsServer is created, so it does not slow down controller startup.
+"""
+from typing import Callable
+import threading
+
+# histogram bucket i counts values below 2**i nanoseconds (bit length of an int64)
+HISTOGRAM_BUCKETS = 64
+# buckets from ~1us to ~17s are exposed; the lower ones fold into the first
+EXPOSED_BUCKETS = range(10, 35)
+# one message in LATENCY_SAMPLE (a power of two) of each type is timed
+LATENCY_SAMPLE = 16
+
+
+class Histogram:
+    """Log2-bucketed histogram of durations in nanoseconds"""
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, counts=None, total=0):
+        self.counts = counts if counts is not None else [0] * HISTOGRAM_BUCKETS
+        self.sum = total
+        self.count = sum(self.counts)
+
+    def observe(self, ns: int):
+        self.counts[ns.bit_length()] += 1
+        self.sum += ns
+        self.count += 1
+
+
+class Metrics:
+    """
+    Per message type: message count, receive-to-dispatch latency (time
+    the message waited in its read batch) and dispatch-to-reply latency
+    (time in the handler, which queues the replies).
+
+    The caller counts every message in messages[] and only times those
+    where count & sample_mask == 0. Histograms of every message type
+    share one flat list per latency, so observe() is a few list
+    increments and no calls.
+    """
+
+    def __init__(self, latency_sample=LATENCY_SAMPLE):
+        self.messages = [0] * 256
+        self.sample_mask = latency_sample - 1
+        self._waited = [0] * (256 * HISTOGRAM_BUCKETS)
+        self._waited_sum = [0] * 256
+        self._handled = [0] * (256 * HISTOGRAM_BUCKETS)
+        self._handled_sum = [0] * 256
+
+    def observe(self, msg_type: int, received_ns: int, start_ns: int, end_ns: int):
+        base = msg_type * HISTOGRAM_BUCKETS
+        waited = start_ns - received_ns
+        self._waited[base + waited.bit_length()] += 1
+        self._waited_sum[msg_type] += waited
+        handled = end_ns - start_ns
+        self._handled[base + handled.bit_length()] += 1
+        self._handled_sum[msg_type] += handled
+
+    def receive_to_dispatch(self, msg_type: int) -> Histogram:
+        """Snapshot of the receive-to-dispatch histogram of a message type"""
+        base = msg_type * HISTOGRAM_BUCKETS
+        return Histogram(self._waited[base:base + HISTOGRAM_BUCKETS], self._waited_sum[msg_type])
+
+    def dispatch_to_reply(self, msg_type: int) -> Histogram:
+        """Snapshot of the dispatch-to-reply histogram of a message type"""
+        base = msg_type * HISTOGRAM_BUCKETS
+        return Histogram(self._handled[base:base + HISTOGRAM_BUCKETS], self._handled_sum[msg_type])
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Exposition:
+    """Builder for one scrape in the Prometheus text format"""
+
+    def __init__(self):
+        self._lines = []
+        self._declared = set()
+
+    def _declare(self, name, kind, help_text):
+        if name not in self._declared:
+            self._declared.add(name)
+            self._lines.append(f"# HELP {name} {help_text}")
+            self._lines.append(f"# TYPE {name} {kind}")
+
+    def counter(self, name, value, help_text="", **labels):
+        self._declare(name, "counter", help_text)
+        self._lines.append(f"{name}{_labels(labels)} {value}")
+
+    def gauge(self, name, value, help_text="", **labels):
+        self._declare(name, "gauge", help_text)
+        self._lines.append(f"{name}{_labels(labels)} {value:g}" if isinstance(value, float)
+                           else f"{name}{_labels(labels)} {value}")
+
+    def histogram(self, name, hist: Histogram, help_text="", **labels):
+        self._declare(name, "histogram", help_text)
+        counts = list(hist.counts)
+        cumulative = sum(counts[:EXPOSED_BUCKETS.start])
+        for i in EXPOSED_BUCKETS:
+            cumulative += counts[i]
+            le = f"{(1 << i) / 1e9:g}"
+            self._lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+        self._lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {sum(counts)}")
+        self._lines.append(f"{name}_sum{_labels(labels)} {hist.sum / 1e9:g}")
+        self._lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+
+    def text(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+class MetricsServer(threading.Thread):
+    """Serves render() on GET /metrics from a background thread"""
+
+    def __init__(self, render: Callable[[], str], host="127.0.0.1", port=9100):
+        super().__init__(name="metrics", daemon=True)
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # scrapes are not worth a log line
+                pass
+
+        self.httpd = HTTPServer((host, port), Handler)
+        self.port = self.httpd.server_address[1]
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,77 @@
+"""
+Timers for the event loop: one heap shared by every periodic job
+(keepalives of all switches, MAC aging), so thousands of timers cost
+O(log n) per schedule and nothing while they are not due.
+
+The loop calls run_due() each iteration and bounds its select() timeout
+with next_deadline(). Callbacks run on the loop thread.
+"""
+import heapq
+import itertools
+import time
+from typing import Callable, Optional
+
+from src.utils.log import error
+
+
+class Timer:
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when: float, callback: Callable, args: tuple):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """The callback will not run; the heap item is dropped when it comes due"""
+        self.cancelled = True
+
+
+class Scheduler:
+    """Min-heap of timers on a monotonic clock, with lazy cancellation"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        # (when, seq, timer); seq keeps equal deadlines in scheduling order
+        self._heap: list[tuple[float, int, Timer]] = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def call_at(self, when: float, callback: Callable, *args) -> Timer:
+        timer = Timer(when, callback, args)
+        heapq.heappush(self._heap, (when, next(self._seq), timer))
+        return timer
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def next_deadline(self) -> Optional[float]:
+        """Deadline of the earliest pending timer, None if there is none"""
+        heap = self._heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Run every timer due by now; returns how many ran"""
+        if now is None:
+            now = self.clock()
+        heap = self._heap
+        ran = 0
+        while heap and heap[0][0] <= now:
+            timer = heapq.heappop(heap)[2]
+            if timer.cancelled:
+                continue
+            ran += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                # one failing job must not stop the loop or the other timers
+                error("Timer %r failed: %s", timer.callback, e)
+        return ran
+
+    def clear(self):
+        self._heap.clear()
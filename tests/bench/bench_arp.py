@@ -0,0 +1,193 @@
+"""
+Benchmark: PACKET_INs, flood PACKET_OUTs and controller messages per ARP
+resolution in a synthetic L2 domain, with and without the ARP proxy.
+
+The domain is a number of OpenFlow switches whose port UPLINK joins a
+plain learning backbone, and a host population spread over their other
+ports. A broadcast flooded on one switch reaches every other switch
+through the backbone and comes back as one more PACKET_IN from each.
+Hosts answer ARP requests for their own address. Each round a random
+host ARPs for another one; the controller runs in-process and only its
+handling time is counted.
+
+usage: python -m tests.bench.bench_arp [--switches 16] [--hosts 1000] [--requests 5000]
+"""
+import argparse
+import collections
+import random
+import struct
+import time
+
+from src.controller.connection import Connection
+from src.controller.controller import Controller
+from src.openflow.openflow import (
+    OFP_NO_BUFFER, OFPFC_ADD, OFPP_FLOOD, OFPT_FEATURES_REPLY, OFPT_FLOW_MOD, OFPT_PACKET_IN, OFPT_PACKET_OUT,
+)
+from src.parser.ethernet import ARP_REPLY, ARP_REQUEST, make_arp_reply, unpack_arp
+from src.utils import log
+
+UPLINK = 48
+HEADER = struct.Struct("!BBHI")
+BROADCAST = b"\xff" * 6
+
+
+class _CaptureSocket:
+    """Socket stand-in keeping what the controller sends"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.data = bytearray()
+
+    def fileno(self):
+        return self.fd
+
+    def sendmsg(self, buffers):
+        size = 0
+        for b in buffers:
+            self.data += b
+            size += len(b)
+        return size
+
+    def close(self):
+        pass
+
+    def take(self):
+        data, self.data = bytes(self.data), bytearray()
+        offset = 0
+        while offset < len(data):
+            _, msg_type, length, _ = HEADER.unpack_from(data, offset)
+            yield msg_type, data[offset:offset + length]
+            offset += length
+
+
+def arp_request(mac, ip, target_ip):
+    frame = BROADCAST + mac + b"\x08\x06" + struct.pack(
+        "!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, ARP_REQUEST, mac, ip, bytes(6), target_ip)
+    return frame.ljust(60, b"\x00")
+
+
+class Domain:
+    def __init__(self, ctrl, switches, hosts):
+        self.ctrl = ctrl
+        # (mac, ip, dpid, port)
+        self.hosts = [((0x020000000000 + i).to_bytes(6, "big"), (0x0a000000 + i + 1).to_bytes(4, "big"),
+                       1 + i % switches, 1 + (i // switches) % (UPLINK - 1)) for i in range(hosts)]
+        self.by_mac = {h[0]: h for h in self.hosts}
+        self.at_port = collections.defaultdict(list)
+        for h in self.hosts:
+            self.at_port[(h[2], h[3])].append(h)
+        self.ports = {dpid: sorted({h[3] for h in self.hosts if h[2] == dpid}) + [UPLINK]
+                      for dpid in range(1, switches + 1)}
+        # dpid -> {(in_port, dl_src, dl_dst): out_port} installed by FLOW_MODs
+        self.flows = {dpid: {} for dpid in self.ports}
+        self.conns = {}
+        self.queue = collections.deque()
+        self.packet_ins = self.floods = self.sent = self.resolved = 0
+        self.seconds = 0.0
+        for dpid in self.ports:
+            conn = Connection(_CaptureSocket(dpid), ("bench", dpid))
+            ctrl.connections[dpid] = conn
+            self.conns[dpid] = conn
+            body = struct.pack("!QIB3xII", dpid, 256, 1, 0, 0)
+            self._to_controller(dpid, HEADER.pack(1, OFPT_FEATURES_REPLY, 8 + len(body), 0) + body)
+
+    def _to_controller(self, dpid, msg):
+        conn = self.conns[dpid]
+        start = time.perf_counter()
+        self.ctrl.handle_messages(conn, conn.feed(msg))
+        conn.flush()
+        self.seconds += time.perf_counter() - start
+        return conn.sock.take()
+
+    def arrive(self, dpid, in_port, frame):
+        out_port = self.flows[dpid].get((in_port, frame[6:12], frame[0:6]))
+        if out_port is not None:
+            self.output(dpid, in_port, out_port, frame)
+            return
+        self.packet_ins += 1
+        body = struct.pack("!IHHBx", OFP_NO_BUFFER, len(frame), in_port, 0) + frame
+        for msg_type, msg in self._to_controller(dpid, HEADER.pack(1, OFPT_PACKET_IN, 8 + len(body), 0) + body):
+            self.sent += 1
+            if msg_type == OFPT_PACKET_OUT:
+                actions_len, = struct.unpack_from("!H", msg, 14)
+                if actions_len:
+                    port, = struct.unpack_from("!H", msg, 20)
+                    self.floods += port == OFPP_FLOOD
+                    self.output(dpid, in_port, port, msg[16 + actions_len:])
+            elif msg_type == OFPT_FLOW_MOD and struct.unpack_from("!H", msg, 56)[0] == OFPFC_ADD:
+                match_in_port, src, dst = struct.unpack_from("!H6s6s", msg, 12)
+                self.flows[dpid][(match_in_port, src, dst)] = struct.unpack_from("!H", msg, 76)[0]
+
+    def output(self, dpid, in_port, out_port, frame):
+        ports = [p for p in self.ports[dpid] if p != in_port] if out_port == OFPP_FLOOD else [out_port]
+        for port in ports:
+            if port == UPLINK:
+                self.backbone(dpid, frame)
+            else:
+                for host in self.at_port[(dpid, port)]:
+                    self.host_receive(host, frame)
+
+    def backbone(self, dpid, frame):
+        dst = frame[0:6]
+        if dst == BROADCAST:
+            for other in self.ports:
+                if other != dpid:
+                    self.queue.append((other, UPLINK, frame))
+            return
+        host = self.by_mac.get(dst)
+        if host is not None and host[2] != dpid:
+            self.queue.append((host[2], UPLINK, frame))
+
+    def host_receive(self, host, frame):
+        if frame[12:14] != b"\x08\x06" or frame[0:6] not in (BROADCAST, host[0]):
+            return
+        opcode, sha, spa, _, tpa = unpack_arp(frame[14:])
+        if opcode == ARP_REQUEST and tpa == host[1]:
+            self.queue.append((host[2], host[3], make_arp_reply(host[0], host[1], sha, spa)))
+        elif opcode == ARP_REPLY:
+            self.resolved += 1
+
+    def resolve(self, requester, target):
+        self.queue.append((requester[2], requester[3], arp_request(requester[0], requester[1], target[1])))
+        while self.queue:
+            self.arrive(*self.queue.popleft())
+
+
+def run(switches, hosts, requests, arp_timeout):
+    ctrl = Controller(admission_control=False, discovery_interval=0, arp_timeout=arp_timeout)
+    domain = Domain(ctrl, switches, hosts)
+    domain.sent = 0
+    domain.seconds = 0.0
+    rng = random.Random(2)
+    for _ in range(requests):
+        requester, target = rng.sample(domain.hosts, 2)
+        domain.resolve(requester, target)
+    ctrl.close()
+    return domain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--switches", type=int, default=16)
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    log.set_level(log.ERROR)
+
+    print(f"{args.switches} switches, {args.hosts} hosts, {args.requests} ARP requests")
+    print(f"{'proxy':>6} {'resolved':>9} {'pkt_in/req':>11} {'floods/req':>11} {'sent/req':>9} "
+          f"{'ctrl msgs/s':>12} {'ctrl s':>8}")
+    results = {}
+    for name, arp_timeout in (("off", 0), ("on", 3600.0)):
+        d = run(args.switches, args.hosts, args.requests, arp_timeout)
+        results[name] = d
+        n = args.requests
+        print(f"{name:>6} {d.resolved / n:>9.2f} {d.packet_ins / n:>11.2f} {d.floods / n:>11.2f} "
+              f"{d.sent / n:>9.2f} {(d.packet_ins + d.sent) / d.seconds:>12.0f} {d.seconds:>8.2f}")
+    off, on = results["off"], results["on"]
+    print(f"\nwith the proxy: {1 - on.floods / off.floods:.0%} fewer flood PACKET_OUTs, "
+          f"{1 - (on.packet_ins + on.sent) / (off.packet_ins + off.sent):.0%} fewer controller messages")
+
+
+if __name__ == "__main__":
+    main()
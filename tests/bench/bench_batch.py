@@ -0,0 +1,82 @@
+"""
+Benchmark: PACKET_IN handling one message at a time (dispatcher) against
+one call per read (dispatch_batch), with and without the NumPy column
+path, for several burst sizes.
+
+usage: python -m tests.bench.bench_batch [--bursts 1,16,64,256] [--seconds 1]
+"""
+import argparse
+import random
+import struct
+import time
+
+from src.controller.connection import Connection
+from src.controller.controller import Controller
+from src.openflow import batch as packet_in_batch
+from src.openflow.openflow import OFPT_PACKET_IN, dispatch_batch, dispatcher, parse_features_reply, parseheader
+from src.utils import log
+
+HOSTS = 256
+PORTS = 8
+
+
+class _Sink:
+    def fileno(self):
+        return 0
+
+    def sendmsg(self, buffers):
+        return sum(len(b) for b in buffers)
+
+
+def _packet_ins(n, rng):
+    msgs = []
+    for i in range(n):
+        src, dst = rng.randrange(HOSTS), rng.randrange(HOSTS)
+        frame = (b'\x02\x00\x00\x00' + dst.to_bytes(2, "big") + b'\x02\x00\x00\x00' + src.to_bytes(2, "big")
+                 + b'\x08\x00' + bytes(46))
+        body = struct.pack("!IHHBx", i, len(frame), 1 + src % PORTS, 0) + frame
+        msgs.append(struct.pack("!BBHI", 1, OFPT_PACKET_IN, 8 + len(body), i) + body)
+    return [parseheader(memoryview(m)) for m in msgs]
+
+
+def run(burst, batched, seconds):
+    ctrl = Controller(admission_control=False)
+    conn = Connection(_Sink(), ("bench", 0))
+    conn.datapath = ctrl.datapaths.register(parse_features_reply(struct.pack("!QIB3xII", 1, 256, 1, 0, 0)), conn)
+    batches = [_packet_ins(burst, random.Random(seed)) for seed in range(16)]
+    handled = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for msgs in batches:
+            if batched:
+                dispatch_batch(ctrl, conn, OFPT_PACKET_IN, msgs)
+            else:
+                for hdr, body in msgs:
+                    dispatcher(ctrl, conn, hdr, body)
+            handled += len(msgs)
+    return handled / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bursts", default="1,16,64,256")
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+    log.set_level(log.ERROR)
+
+    has_numpy = packet_in_batch.enable_numpy()
+    packet_in_batch.disable_numpy()
+    print(f"{'burst':>6} {'per-message/s':>14} {'batch/s':>14} {'numpy/s':>14}")
+    for burst in map(int, args.bursts.split(",")):
+        single = run(burst, False, args.seconds)
+        batched = run(burst, True, args.seconds)
+        vectorized = "-"
+        if has_numpy:
+            packet_in_batch.enable_numpy()
+            vectorized = f"{run(burst, True, args.seconds):>14.0f}"
+            packet_in_batch.disable_numpy()
+        print(f"{burst:>6} {single:>14.0f} {batched:>14.0f} {vectorized:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: per-message decode and encode cost for each OpenFlow message type,
+encoding both through the builders and through the pre-encoded templates.
+
+usage: python -m tests.bench.bench_codec [--iterations 200000]
+"""
+import argparse
+import struct
+import time
+
+from src.openflow.match import match_l2
+from src.openflow.openflow import (
+    OFHeader,
+    parseheader,
+    parse_features_reply,
+    parse_packet_in,
+    make_hello,
+    make_echo_reply,
+    make_features_request,
+    make_packet_out,
+    make_flow_mod,
+    templates,
+    FLOW_IDLE_TIMEOUT,
+    FLOW_HARD_TIMEOUT,
+    OFPT_ECHO_REQUEST,
+    OFP_NO_BUFFER,
+)
+from src.utils import log
+
+
+def _features_reply_body(n_ports):
+    ports = b''.join(
+        struct.pack("!H6s16sIIIIII", i, bytes(6), f"eth{i}".encode(), 0, 0, 0, 0, 0, 0)
+        for i in range(1, n_ports + 1)
+    )
+    return struct.pack("!QIB3xII", 1, 256, 1, 0, 0) + ports
+
+
+def ns_per_op(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+    log.set_level(log.ERROR)
+
+    frame = memoryview(b'\x02' * 6 + b'\x04' * 6 + b'\x08\x00' + b'\x00' * 46)
+    packet_in = memoryview(struct.pack("!BBHIIHHBx", 1, 10, 18 + len(frame), 1, 7, len(frame), 1, 0) + frame)
+    features_body = memoryview(_features_reply_body(8))
+    echo = OFHeader(1, OFPT_ECHO_REQUEST, 8, 1)
+    src, dst = b'\x02' * 6, b'\x04' * 6
+    match = match_l2(1, src, dst)
+
+    decoders = {
+        "header": lambda: parseheader(packet_in),
+        "PACKET_IN": lambda: parse_packet_in(packet_in[8:]),
+        "FEATURES_REPLY(8 ports)": lambda: parse_features_reply(features_body),
+    }
+    encoders = {
+        "HELLO": lambda: make_hello(1),
+        "ECHO_REPLY": lambda: make_echo_reply(echo),
+        "FEATURES_REQUEST": lambda: make_features_request(1),
+        "PACKET_OUT(buffered)": lambda: make_packet_out(1, 7, 1, 2),
+        "PACKET_OUT(+frame)": lambda: make_packet_out(1, OFP_NO_BUFFER, 1, 2, frame),
+        "FLOW_MOD": lambda: make_flow_mod(1, match, out_port=2, idle_timeout=FLOW_IDLE_TIMEOUT,
+                                          hard_timeout=FLOW_HARD_TIMEOUT, buffer_id=7),
+    }
+    # pre-encoded templates for the same messages
+    template_encoders = {
+        "HELLO": lambda: templates.hello(1),
+        "ECHO_REPLY": lambda: templates.echo_reply(1),
+        "FEATURES_REQUEST": lambda: templates.features_request(1),
+        "PACKET_OUT(buffered)": lambda: templates.packet_out(1, 7, 1, 2),
+        "PACKET_OUT(+frame)": lambda: templates.packet_out(1, OFP_NO_BUFFER, 1, 2, frame),
+        "FLOW_MOD": lambda: templates.flow_mod_output(1, 1, src, dst, 2, 7),
+    }
+    print(f"{'decode':<28} {'ns/msg':>10}")
+    for name, fn in decoders.items():
+        n = args.iterations // 10 if "FEATURES" in name else args.iterations
+        print(f"{name:<28} {ns_per_op(fn, n):>10.0f}")
+    print(f"{'encode':<28} {'builder':>10} {'template':>10}")
+    for name, fn in encoders.items():
+        built = ns_per_op(fn, args.iterations)
+        patched = ns_per_op(template_encoders[name], args.iterations)
+        print(f"{name:<28} {built:>10.0f} {patched:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Microbenchmark: frames/second for the native Ethernet parser against Scapy.
+
+usage: python -m tests.bench.bench_ethernet [--frames 100000]
+"""
+import argparse
+import socket
+import struct
+import time
+
+from src.parser.ethernet import parse_ethernet, parse_ethernet_scapy
+
+
+def sample_frame():
+    l4 = struct.pack("!HHIIBBHHH", 40000, 80, 1, 0, 0x50, 0x02, 1024, 0, 0)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4), 0, 0, 64, 6, 0,
+                     socket.inet_aton("10.0.0.1"), socket.inet_aton("10.0.0.2")) + l4
+    frame = bytes.fromhex("0242ac110003") + bytes.fromhex("0242ac110002") + b'\x08\x00' + ip
+    return frame + b'\x00' * max(0, 60 - len(frame))
+
+
+def bench(parse, frames, raw):
+    start = time.perf_counter()
+    for _ in range(frames):
+        eth = parse(raw)
+        eth.src
+        eth.dst
+    return frames / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100000)
+    args = parser.parse_args()
+
+    raw = memoryview(sample_frame())
+    print(f"{'parser':>8} {'frames/s':>12}")
+    print(f"{'native':>8} {bench(parse_ethernet, args.frames, raw):>12.0f}")
+    try:
+        import scapy  # noqa: F401
+    except ImportError:
+        print(f"{'scapy':>8} {'not installed':>12}")
+        return
+    # scapy is far slower; fewer frames keep the run short
+    print(f"{'scapy':>8} {bench(parse_ethernet_scapy, args.frames // 20, raw):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
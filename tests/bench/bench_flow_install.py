@@ -0,0 +1,126 @@
+"""
+Benchmark: proactive flow installation against the switch simulator
+(tests.bench.switch_sim). Every switch gets the same number of FLOW_MODs,
+either one at a time, each confirmed by a BARRIER_REPLY before the next
+is sent, or pipelined in batches behind one BARRIER_REQUEST each
+(Controller.install_flows). Reports confirmed flows per second.
+
+usage: python -m tests.bench.bench_flow_install [--switches 16] [--flows 2000] [--batches 1,100,all]
+"""
+import argparse
+import multiprocessing
+import time
+
+from src.controller.controller import Controller
+from src.openflow.match import match_l2
+from src.utils import log
+from tests.bench.switch_sim import SwitchSimulator, raise_fd_limit
+
+
+def _run_switches(port, switches):
+    raise_fd_limit()
+    sim = SwitchSimulator(("127.0.0.1", port), switches)
+    try:
+        sim.connect()
+        # until the controller is done and closes every connection
+        while sim.n_closed < switches:
+            sim.poll()
+    finally:
+        sim.close()
+
+
+def make_flows(n):
+    return [(match_l2(1 + i % 8, (0x020000000000 + i).to_bytes(6, "big"), (0x040000000000 + i).to_bytes(6, "big")),
+             1 + (i + 1) % 8) for i in range(n)]
+
+
+class Run:
+    """Installs the flows on every switch in batches of batch_size, one batch in flight per switch"""
+
+    def __init__(self, ctrl, flows, batch_size, done):
+        self.ctrl = ctrl
+        self.flows = flows
+        self.batch_size = batch_size
+        self.done = done
+        self.remaining = 0
+        self.rejected = 0
+        self.start = self.seconds = 0.0
+
+    def begin(self):
+        conns = [conn for conn in self.ctrl.connections.values() if conn.datapath is not None]
+        self.remaining = len(conns)
+        self.start = time.perf_counter()
+        for conn in conns:
+            self._next(conn, 0)
+
+    def _next(self, conn, offset):
+        if offset >= len(self.flows):
+            self.remaining -= 1
+            if not self.remaining:
+                self.seconds = time.perf_counter() - self.start
+                self.done(self)
+            return
+        batch = self.flows[offset:offset + self.batch_size]
+        future = self.ctrl.install_flows(conn, batch)
+        future.add_done_callback(lambda f: self._completed(conn, offset + len(batch), f))
+
+    def _completed(self, conn, offset, future):
+        self.rejected += len(future.result().failed)
+        self._next(conn, offset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--switches", type=int, default=16)
+    parser.add_argument("--flows", type=int, default=2000, help="flows installed on each switch")
+    parser.add_argument("--batches", default="1,100,all", help="comma separated FLOW_MODs per barrier")
+    args = parser.parse_args()
+    log.set_level(log.ERROR)
+    raise_fd_limit()
+
+    flows = make_flows(args.flows)
+    sizes = [args.flows if b == "all" else int(b) for b in args.batches.split(",")]
+    ctrl = Controller(host="127.0.0.1", port=0, admission_control=False, discovery_interval=0)
+    ctrl.listen()
+    switches = multiprocessing.Process(target=_run_switches, args=(ctrl.port, args.switches), daemon=True)
+    switches.start()
+    results = []
+
+    def finished(run):
+        results.append(run)
+        if len(results) == len(sizes):
+            ctrl.stop()
+        else:
+            start_run()
+
+    def start_run():
+        for conn in ctrl.connections.values():
+            if conn.datapath is not None:
+                conn.datapath.flow_table.clear()
+        Run(ctrl, flows, sizes[len(results)], finished).begin()
+
+    def wait_for_switches():
+        if len(ctrl.datapaths) < args.switches:
+            ctrl.scheduler.call_later(0.05, wait_for_switches)
+            return
+        start_run()
+
+    ctrl.scheduler.call_later(0.05, wait_for_switches)
+    try:
+        ctrl.serve_forever()
+    finally:
+        ctrl.close()
+        switches.join(timeout=10)
+
+    total = args.switches * args.flows
+    print(f"{args.switches} switches, {args.flows} flows each")
+    print(f"{'per barrier':>12} {'barriers':>9} {'seconds':>8} {'flows/s':>10} {'rejected':>9}")
+    for size, run in zip(sizes, results):
+        barriers = args.switches * -(-args.flows // size)
+        print(f"{size:>12} {barriers:>9} {run.seconds:>8.2f} {total / run.seconds:>10.0f} {run.rejected:>9}")
+    print(f"\npipelined behind one barrier: {results[0].seconds / results[-1].seconds:.0f}x "
+          f"the throughput of one barrier per flow")
+
+
+if __name__ == "__main__":
+    main()
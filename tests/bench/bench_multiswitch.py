@@ -0,0 +1,131 @@
+"""
+Load test: aggregate PACKET_IN throughput against the number of connected switches.
+
+Runs the controller in a child process and drives N fake switches from this
+process. Every round each switch sends a burst of PACKET_INs followed by an
+ECHO_REQUEST; the ECHO_REPLY tells us the burst was handled.
+
+usage: python -m tests.bench.bench_multiswitch [--switches 1,2,4,8,16] [--seconds 2]
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import socket
+import struct
+import time
+
+OFPT_HELLO = 0
+OFPT_ECHO_REQUEST = 2
+OFPT_FEATURES_REPLY = 6
+OFPT_PACKET_IN = 10
+
+
+def _run_controller(port_queue):
+    from src.controller.controller import Controller
+    from src.utils import log
+    log.set_level(log.INFO)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # every PACKET_IN is handled: this measures throughput, not admission
+        ctrl = Controller(host="127.0.0.1", port=0, admission_control=False)
+        ctrl.listen()
+        port_queue.put(ctrl.port)
+        ctrl.serve_forever()
+
+
+def _recv_exact(sock, nbytes):
+    data = b''
+    while len(data) < nbytes:
+        chunk = sock.recv(nbytes - len(data))
+        if not chunk:
+            raise ConnectionError("controller closed the connection")
+        data += chunk
+    return data
+
+
+def _recv_until(sock, msg_type, xid=None):
+    """Read messages until one of msg_type (and xid) arrives."""
+    while True:
+        _, t, length, x = struct.unpack("!BBHI", _recv_exact(sock, 8))
+        _recv_exact(sock, length - 8)
+        if t == msg_type and (xid is None or x == xid):
+            return
+
+
+def _msg(msg_type, xid, body=b''):
+    return struct.pack("!BBHI", 1, msg_type, 8 + len(body), xid) + body
+
+
+def packet_in(in_port, src, dst, xid=0):
+    frame = dst + src + b'\x08\x00' + b'\x00' * 46
+    body = struct.pack("!IHHBx", 0xffffffff, len(frame), in_port, 0) + frame
+    return _msg(OFPT_PACKET_IN, xid, body)
+
+
+def features_reply(dpid):
+    return _msg(OFPT_FEATURES_REPLY, 0, struct.pack("!QIB3xII", dpid, 256, 1, 0, 0))
+
+
+class FakeSwitch:
+    def __init__(self, port, dpid, burst):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _recv_until(self.sock, 5)  # FEATURES_REQUEST
+        self.sock.sendall(_msg(OFPT_HELLO, 1) + features_reply(dpid))
+        # two hosts chatting on ports 1 and 2
+        a = struct.pack("!Q", 0x020000000000 | (dpid << 8) | 1)[2:]
+        b = struct.pack("!Q", 0x020000000000 | (dpid << 8) | 2)[2:]
+        self.burst = b''.join(
+            packet_in(1 + i % 2, a if i % 2 == 0 else b, b if i % 2 == 0 else a)
+            for i in range(burst)
+        )
+
+    def send_round(self, xid):
+        self.sock.sendall(self.burst + _msg(OFPT_ECHO_REQUEST, xid))
+
+    def wait_round(self, xid):
+        _recv_until(self.sock, 3, xid)
+
+    def close(self):
+        self.sock.close()
+
+
+def run(n_switches, seconds, burst, port):
+    switches = [FakeSwitch(port, i + 1, burst) for i in range(n_switches)]
+    rounds = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        rounds += 1
+        for sw in switches:
+            sw.send_round(rounds)
+        for sw in switches:
+            sw.wait_round(rounds)
+    elapsed = time.perf_counter() - start
+    for sw in switches:
+        sw.close()
+    return rounds * burst * n_switches / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--switches", default="1,2,4,8,16,64")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--burst", type=int, default=32)
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_controller, args=(port_queue,), daemon=True)
+    proc.start()
+    port = port_queue.get(timeout=10)
+    try:
+        print(f"{'switches':>8} {'packet_in/s':>12}")
+        for n in (int(x) for x in args.switches.split(",")):
+            rate = run(n, args.seconds, args.burst, port)
+            print(f"{n:>8} {rate:>12.0f}")
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
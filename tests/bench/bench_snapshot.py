@@ -0,0 +1,81 @@
+"""
+Benchmark: warm restart from a state snapshot. For a number of switches
+with full MAC tables and shadow flow tables, the time the event loop is
+held to capture the state, the background encode+write time, the file
+size, and the time from opening the file (mmap) to a controller holding
+the restored state, for both MAC table kinds.
+
+usage: python -m tests.bench.bench_snapshot [--switches 16] [--macs 20000] [--flows 5000]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+from src.controller.controller import Controller
+from src.controller.snapshot import capture, read_snapshot, restore, write_snapshot
+from src.openflow.openflow import OFFeaturesReply, OFPhyPort
+from src.utils import log
+
+
+def populate(ctrl, switches, macs, flows):
+    now = time.time()
+    for dpid in range(1, switches + 1):
+        ports = [OFPhyPort(n, "02:00:00:00:00:%02x" % n, "eth%d" % n, 0, 0, 0, 0, 0, 0) for n in range(1, 49)]
+        dp = ctrl.datapaths.register(OFFeaturesReply(dpid, 256, 1, 0xc7, 0xfff, ports))
+        table = dp.mac_table
+        for i in range(macs):
+            raw = (0x020000000000 + i).to_bytes(6, "big")
+            table.learn(table.mac_key(raw), 1 + i % 48, now - i * 1e-3)
+        for i in range(flows):
+            src = (0x020000000000 + i).to_bytes(6, "big")
+            dst = (0x020000000000 + i + 1).to_bytes(6, "big")
+            dp.flow_table.install_l2(1 + i % 48, src, dst, 1 + (i + 1) % 48, 0x8000, 60, 0, now)
+
+
+def run(path, switches, macs, flows, compact):
+    ctrl = Controller(admission_control=False, discovery_interval=0, compact_mac_tables=compact)
+    populate(ctrl, switches, macs, flows)
+    gc.collect()
+    start = time.perf_counter()
+    snapshot = capture(ctrl)
+    captured = time.perf_counter() - start
+    start = time.perf_counter()
+    size = write_snapshot(path, snapshot)
+    written = time.perf_counter() - start
+    del snapshot, ctrl
+    gc.collect()
+    restarted = Controller(admission_control=False, discovery_interval=0, compact_mac_tables=compact)
+    start = time.perf_counter()
+    stats = restore(restarted, read_snapshot(path))
+    loaded = time.perf_counter() - start
+    assert stats.macs == switches * macs and stats.flows == switches * flows
+    return captured, written, size, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--switches", type=int, default=16)
+    parser.add_argument("--macs", type=int, default=20000, help="MACs learned per switch")
+    parser.add_argument("--flows", type=int, default=5000, help="flows pushed per switch")
+    args = parser.parse_args()
+    log.set_level(log.ERROR)
+
+    fd, path = tempfile.mkstemp(suffix=".ofsnap")
+    os.close(fd)
+    print(f"{args.switches} switches, {args.macs} MACs and {args.flows} flows each")
+    print(f"{'table':>8} {'capture ms':>11} {'write ms':>9} {'MB':>6} {'load ms':>8} {'MACs/s loaded':>14}")
+    try:
+        for name, compact in (("default", False), ("compact", True)):
+            captured, written, size, loaded = run(path, args.switches, args.macs, args.flows, compact)
+            print(f"{name:>8} {captured * 1000:>11.2f} {written * 1000:>9.1f} {size / 1e6:>6.1f} "
+                  f"{loaded * 1000:>8.1f} {args.switches * args.macs / loaded:>14.0f}")
+    finally:
+        for p in (path, path + ".tmp"):
+            if os.path.exists(p):
+                os.unlink(p)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: controller startup, from `python -m src.main` to a listening
+socket that completes a TCP handshake, and the resident memory once it
+is listening. Restart time after a failover is bounded by this.
+
+For reference, the same is measured for an interpreter that also imports
+scapy up front (what the entry point used to pay before the parser
+loaded it lazily), when scapy is installed.
+
+usage: python -m tests.bench.bench_startup [--runs 10]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_kib(pid: int) -> int:
+    """VmRSS of a process in KiB (Linux), 0 when /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def start_once(preload=()) -> tuple[float, int]:
+    """Seconds until the controller accepts a connection, and its RSS then"""
+    port = _free_port()
+    code = "".join(f"import {m}\n" for m in preload) + "from src.main import main\nmain()\n"
+    argv = [sys.executable, "-c", code, "--host", "127.0.0.1", "--port", str(port), "--log-level", "error"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(argv, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"controller exited with {proc.returncode}")
+                time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        return elapsed, _rss_kib(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def report(name, runs, preload=()):
+    samples = [start_once(preload) for _ in range(runs)]
+    times = sorted(t for t, _ in samples)
+    rss = statistics.median(r for _, r in samples)
+    print(f"{name:<22} {statistics.median(times) * 1000:>10.1f} {times[0] * 1000:>10.1f} {rss / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'startup':<22} {'median ms':>10} {'min ms':>10} {'RSS MiB':>10}")
+    report("src.main", args.runs)
+    try:
+        import scapy  # noqa: F401
+    except ImportError:
+        return
+    report("src.main + scapy.all", args.runs, preload=("scapy.all",))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: the topology graph on k-ary fat-trees (5k²/4 switches): time
+to build every shortest-path tree, the cost of one link going down and
+coming back (and how many trees it rebuilt), and next_hop() lookups/sec.
+
+usage: python -m tests.bench.bench_topology [--k 8,12,16,20] [--changes 50]
+"""
+import argparse
+import gc
+import random
+import time
+
+from src.controller.state.topology import Topology
+
+
+def fat_tree(k: int) -> list[tuple[int, int, int, int]]:
+    """
+    Cables (dpid, port, peer, peer_port) of a k-ary fat-tree. Edge switches
+    use ports 1..k/2 for hosts and k/2+1..k towards the aggregation layer;
+    aggregation switches use 1..k/2 down and k/2+1..k up; core switch
+    ports are numbered by pod.
+    """
+    half = k // 2
+    cores = [1 + i for i in range(half * half)]
+    first_pod_switch = 1 + len(cores)
+    cables = []
+    for pod in range(k):
+        aggs = [first_pod_switch + pod * k + a for a in range(half)]
+        edges = [first_pod_switch + pod * k + half + e for e in range(half)]
+        for a, agg in enumerate(aggs):
+            for e, edge in enumerate(edges):
+                cables.append((edge, half + 1 + a, agg, 1 + e))
+            for c in range(half):
+                cables.append((agg, half + 1 + c, cores[a * half + c], 1 + pod))
+    return cables
+
+
+def build(cables) -> Topology:
+    topology = Topology()
+    for dpid, port, peer, peer_port in cables:
+        topology.add_link(dpid, port, peer, peer_port)
+        topology.add_link(peer, peer_port, dpid, port)
+    topology.refresh()
+    return topology
+
+
+def link_changes(topology, cables, changes, rng):
+    """Mean seconds and rebuilt trees per cable going down, then per cable coming back"""
+    down = up = 0.0
+    rebuilt_down = rebuilt_up = 0
+    for dpid, port, peer, peer_port in rng.sample(cables, changes):
+        before = topology.recomputed
+        start = time.perf_counter()
+        topology.remove_port(dpid, port)
+        topology.refresh()
+        down += time.perf_counter() - start
+        rebuilt_down += topology.recomputed - before
+        before = topology.recomputed
+        start = time.perf_counter()
+        topology.add_link(dpid, port, peer, peer_port)
+        topology.add_link(peer, peer_port, dpid, port)
+        topology.refresh()
+        up += time.perf_counter() - start
+        rebuilt_up += topology.recomputed - before
+    return down / changes, rebuilt_down / changes, up / changes, rebuilt_up / changes
+
+
+def lookups_per_sec(topology, rng, n=1_000_000):
+    switches = topology.switches()
+    pairs = [(rng.choice(switches), rng.choice(switches)) for _ in range(n)]
+    next_hop = topology.next_hop
+    start = time.perf_counter()
+    for src, dst in pairs:
+        next_hop(src, dst)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", default="8,12,16,20", help="comma separated fat-tree arities")
+    parser.add_argument("--changes", type=int, default=50, help="cables taken down and back per size")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'k':>3} {'switches':>9} {'links':>7} {'build ms':>9} {'down ms':>8} {'trees':>6} "
+          f"{'up ms':>8} {'trees':>6} {'lookup/s':>12}")
+    for k in map(int, args.k.split(",")):
+        cables = fat_tree(k)
+        gc.collect()
+        start = time.perf_counter()
+        topology = build(cables)
+        elapsed = time.perf_counter() - start
+        down, trees_down, up, trees_up = link_changes(topology, cables, min(args.changes, len(cables)), rng)
+        lookup = lookups_per_sec(topology, rng)
+        print(f"{k:>3} {len(topology.switches()):>9} {len(topology):>7} {elapsed * 1000:>9.1f} "
+              f"{down * 1000:>8.2f} {trees_down:>6.0f} {up * 1000:>8.2f} {trees_up:>6.0f} {lookup:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: aggregate PACKET_IN throughput against the number of worker processes.
+
+For each worker count N, starts a ShardSupervisor with N workers and N load
+generator processes, each driving --switches fake switches (see
+bench_multiswitch). Throughput should grow close to linearly up to the
+number of cores (the load generators need cores too).
+
+usage: python -m tests.bench.bench_workers [--workers 1,2,4] [--seconds 3]
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import time
+
+from src.controller.shard import ShardSupervisor
+from src.utils import log
+from tests.bench.bench_multiswitch import FakeSwitch
+
+
+def _load(port, first_dpid, n_switches, burst, seconds, results):
+    switches = [FakeSwitch(port, first_dpid + i, burst) for i in range(n_switches)]
+    rounds = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        rounds += 1
+        for sw in switches:
+            sw.send_round(rounds)
+        for sw in switches:
+            sw.wait_round(rounds)
+    elapsed = time.perf_counter() - start
+    for sw in switches:
+        sw.close()
+    results.put(rounds * burst * n_switches / elapsed)
+
+
+def run(workers, switches, burst, seconds):
+    sup = ShardSupervisor(workers, host="127.0.0.1", port=0, log_level=log.ERROR, admission_control=False)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        sup.start()
+    try:
+        results = multiprocessing.Queue()
+        loaders = [
+            multiprocessing.Process(target=_load, args=(sup.port, 1 + i * switches, switches, burst, seconds, results))
+            for i in range(workers)
+        ]
+        for p in loaders:
+            p.start()
+        total = sum(results.get(timeout=seconds + 30) for _ in loaders)
+        for p in loaders:
+            p.join()
+        return total
+    finally:
+        sup.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    default_workers = ",".join(str(n) for n in (1, 2, 4, 8, 16) if n <= max(1, os.cpu_count() // 2)) or "1"
+    parser.add_argument("--workers", default=default_workers)
+    parser.add_argument("--switches", type=int, default=8, help="switches per load generator")
+    parser.add_argument("--burst", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>8} {'packet_in/s':>12} {'per worker':>12}")
+    for n in (int(x) for x in args.workers.split(",")):
+        rate = run(n, args.switches, args.burst, args.seconds)
+        print(f"{n:>8} {rate:>12.0f} {rate / n:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark suite: runs the switch simulator scenarios against a controller
+and saves the results as bench-results/<commit>.json, so runs on two
+commits can be compared.
+
+usage: python -m tests.bench.suite [--quick] [--only NAME,...] [--compare bench-results/<other>.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+from tests.bench.switch_sim import run_scenario, spawn_controller
+
+RESULTS_DIR = "bench-results"
+
+# name -> simulator parameters
+SCENARIOS = {
+    "single-switch": dict(switches=1, hosts=64, flood_ratio=0.1, window=32),
+    "100-switches": dict(switches=100, hosts=64, flood_ratio=0.1),
+    "1000-switches": dict(switches=1000, hosts=16, flood_ratio=0.1, window=2),
+    "flood-heavy": dict(switches=10, hosts=64, flood_ratio=0.5),
+    "large-population": dict(switches=4, hosts=20_000, flood_ratio=0.01, window=32),
+}
+
+
+def commit_id() -> str:
+    """Short hash of HEAD, with -dirty when the tree has local changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\n{'scenario':<18} {'msgs/s':>10} {'base':>10} {'change':>8} {'p99 us':>10} {'base':>10}")
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        rate, base_rate = result["msgs_per_s"], base["msgs_per_s"]
+        change = (rate / base_rate - 1) * 100 if base_rate else 0.0
+        print(f"{name:<18} {rate:>10.0f} {base_rate:>10.0f} {change:>+7.1f}% "
+              f"{result['latency_us']['p99']:>10.0f} {base['latency_us']['p99']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--quick", action="store_true", help="1 second per scenario")
+    parser.add_argument("--only", help="comma separated scenario names")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--output", help=f"results file (default {RESULTS_DIR}/<commit>.json)")
+    args = parser.parse_args()
+
+    seconds = 1.0 if args.quick else args.seconds
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    results = {}
+    print(f"{'scenario':<18} {'msgs/s':>10} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10}")
+    for name in names:
+        # a fresh controller per scenario, answering every PACKET_IN
+        with spawn_controller(admission_control=False) as port:
+            result = run_scenario(port, seconds=seconds, **SCENARIOS[name])
+        results[name] = result
+        latency = result["latency_us"]
+        print(f"{name:<18} {result['msgs_per_s']:>10.0f} {latency['p50']:>10.0f} "
+              f"{latency['p90']:>10.0f} {latency['p99']:>10.0f}")
+
+    commit = commit_id()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seconds": seconds,
+            "scenarios": results,
+        }, f, indent=2)
+    print(f"\nsaved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
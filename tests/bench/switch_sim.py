@@ -0,0 +1,372 @@
+"""
+Pure-Python OpenFlow 1.0 switch simulator for benchmarks.
+
+One SwitchSimulator drives any number of simulated switches over
+non-blocking sockets from a single selector loop. Every switch answers
+the handshake (HELLO, FEATURES_REQUEST), ECHO_REQUEST and
+BARRIER_REQUEST, and replays a deterministic PACKET_IN workload:
+
+- hosts: MAC population per switch, spread over its ports
+- flood_ratio: share of PACKET_INs sent to the broadcast address
+- window: PACKET_INs each switch keeps outstanding (closed loop)
+
+Every PACKET_IN is buffered under a unique buffer_id. The controller
+answers with a FLOW_MOD or PACKET_OUT carrying that buffer_id, which
+gives the end-to-end response latency of each PACKET_IN.
+
+The simulator only uses its own wire encoding, never the controller's.
+
+usage: python -m tests.bench.switch_sim [--switches 100] [--hosts 64] [--flood-ratio 0.1] [--seconds 5]
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import selectors
+import socket
+import struct
+import time
+
+OFPT_HELLO = 0
+OFPT_ECHO_REQUEST = 2
+OFPT_ECHO_REPLY = 3
+OFPT_FEATURES_REQUEST = 5
+OFPT_FEATURES_REPLY = 6
+OFPT_PACKET_IN = 10
+OFPT_PACKET_OUT = 13
+OFPT_FLOW_MOD = 14
+OFPT_BARRIER_REQUEST = 18
+OFPT_BARRIER_REPLY = 19
+
+OFPFC_ADD = 0
+OFP_NO_BUFFER = 0xffffffff
+BROADCAST = b'\xff' * 6
+
+HEADER = struct.Struct("!BBHI")
+FEATURES = struct.Struct("!QIB3xII")
+PHY_PORT = struct.Struct("!H6s16sIIIIII")
+PACKET_IN = struct.Struct("!IHHBx")
+# buffer_id in PACKET_OUT, and command / buffer_id in FLOW_MOD
+PACKET_OUT_BUFFER_ID = struct.Struct("!I")
+FLOW_MOD_COMMAND = struct.Struct("!H")
+FLOW_MOD_BUFFER_ID = struct.Struct("!I")
+
+RECV_SIZE = 256 * 1024
+# handshakes in progress at once; more overflow the controller's accept
+# backlog and the dropped ones only recover after SYN-ACK retransmits
+CONNECT_BATCH = 64
+
+
+def raise_fd_limit():
+    """Allow as many sockets as the hard limit permits"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _msg(msg_type, xid, body=b''):
+    return HEADER.pack(1, msg_type, 8 + len(body), xid) + body
+
+
+def _mac(dpid, host):
+    # locally administered, unique per (switch, host)
+    return struct.pack("!HHH", 0x0200 | (dpid >> 16 & 0xff), dpid & 0xffff, host)
+
+
+class SimSwitch:
+    """
+    One simulated switch. The simulator calls on_readable/on_writable; the
+    switch keeps `window` PACKET_INs outstanding once start() is called.
+    """
+
+    def __init__(self, sim, dpid, n_ports, hosts, flood_ratio, seed):
+        self.sim = sim
+        self.dpid = dpid
+        self.n_ports = n_ports
+        self.flood_ratio = flood_ratio
+        self.rng = random.Random(seed)
+        # (mac, port) of every host behind this switch
+        self.hosts = [(_mac(dpid, i), 1 + i % n_ports) for i in range(hosts)]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.rbuf = bytearray()
+        self.out = bytearray()
+        self.ready = False
+        self.closed = False
+        self.window = 0
+        # buffer_id -> perf_counter() when the PACKET_IN was sent
+        self.outstanding = {}
+        self._next_buffer_id = 0
+        self._frame_pad = b'\x08\x00' + b'\x00' * 46
+
+    def connect(self, addr):
+        self.sock.connect_ex(addr)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, data):
+        if not self.out:
+            try:
+                n = self.sock.send(data)
+            except BlockingIOError:
+                n = 0
+            if n == len(data):
+                return
+            data = data[n:]
+            self.sim.want_write(self)
+        self.out += data
+
+    def on_writable(self):
+        try:
+            n = self.sock.send(self.out)
+        except BlockingIOError:
+            return
+        del self.out[:n]
+        if not self.out:
+            self.sim.done_writing(self)
+
+    def on_readable(self):
+        try:
+            data = self.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        if not data:
+            self.closed = True
+            self.sim.closed(self)
+            return
+        buf = self.rbuf
+        buf += data
+        offset = 0
+        while len(buf) - offset >= 8:
+            _, msg_type, length, xid = HEADER.unpack_from(buf, offset)
+            if len(buf) - offset < length:
+                break
+            self.handle(msg_type, xid, buf, offset, length)
+            offset += length
+        del buf[:offset]
+
+    def handle(self, msg_type, xid, buf, offset, length):
+        if msg_type == OFPT_PACKET_OUT:
+            self.answered(PACKET_OUT_BUFFER_ID.unpack_from(buf, offset + 8)[0])
+        elif msg_type == OFPT_FLOW_MOD:
+            if FLOW_MOD_COMMAND.unpack_from(buf, offset + 56)[0] == OFPFC_ADD:
+                self.answered(FLOW_MOD_BUFFER_ID.unpack_from(buf, offset + 64)[0])
+        elif msg_type == OFPT_ECHO_REQUEST:
+            self.send(_msg(OFPT_ECHO_REPLY, xid, bytes(buf[offset + 8:offset + length])))
+        elif msg_type == OFPT_BARRIER_REQUEST:
+            self.send(_msg(OFPT_BARRIER_REPLY, xid))
+        elif msg_type == OFPT_FEATURES_REQUEST:
+            ports = b''.join(
+                PHY_PORT.pack(port, _mac(self.dpid, 0xff00 | port), f"eth{port}".encode(), 0, 0, 0, 0, 0, 0)
+                for port in range(1, self.n_ports + 1))
+            self.send(_msg(OFPT_HELLO, xid) + _msg(OFPT_FEATURES_REPLY, xid, FEATURES.pack(
+                self.dpid, 256, 1, 0, 0) + ports))
+            self.ready = True
+            self.sim.switch_ready(self)
+
+    def packet_in(self, in_port, src, dst):
+        buffer_id = self._next_buffer_id
+        self._next_buffer_id = (buffer_id + 1) % OFP_NO_BUFFER
+        frame = dst + src + self._frame_pad
+        self.outstanding[buffer_id] = time.perf_counter()
+        self.sim.sent += 1
+        return _msg(OFPT_PACKET_IN, 0, PACKET_IN.pack(buffer_id, len(frame), in_port, 0) + frame)
+
+    def next_packet_in(self):
+        rng = self.rng
+        src, in_port = self.hosts[rng.randrange(len(self.hosts))]
+        if rng.random() < self.flood_ratio:
+            return self.packet_in(in_port, src, BROADCAST)
+        # a known host behind another port, so the controller always answers
+        while True:
+            dst, port = self.hosts[rng.randrange(len(self.hosts))]
+            if port != in_port:
+                return self.packet_in(in_port, src, dst)
+
+    def warm_up(self):
+        """Let the controller learn every host with one broadcast each"""
+        self.send(b''.join(self.packet_in(port, mac, BROADCAST) for mac, port in self.hosts))
+
+    def start(self, window):
+        self.window = window
+        self.send(b''.join(self.next_packet_in() for _ in range(window - len(self.outstanding))))
+
+    def answered(self, buffer_id):
+        sent_at = self.outstanding.pop(buffer_id, None)
+        if sent_at is None:
+            return
+        self.sim.answered(time.perf_counter() - sent_at)
+        if self.window:
+            self.send(self.next_packet_in())
+
+    def close(self):
+        self.sock.close()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class SwitchSimulator:
+    def __init__(self, addr, switches, hosts=64, n_ports=8, flood_ratio=0.1, seed=1):
+        self.addr = addr
+        self.selector = selectors.DefaultSelector()
+        self.switches = [
+            SimSwitch(self, dpid, n_ports, hosts, flood_ratio, seed * 1_000_003 + dpid)
+            for dpid in range(1, switches + 1)
+        ]
+        self.n_ready = 0
+        self.n_closed = 0
+        self.sent = 0
+        self.responses = 0
+        self.latencies = []
+        self._recording = False
+
+    # callbacks from the switches
+    def want_write(self, sw):
+        self.selector.modify(sw, selectors.EVENT_READ | selectors.EVENT_WRITE, sw)
+
+    def done_writing(self, sw):
+        self.selector.modify(sw, selectors.EVENT_READ, sw)
+
+    def switch_ready(self, sw):
+        self.n_ready += 1
+
+    def closed(self, sw):
+        self.n_closed += 1
+        self.selector.unregister(sw)
+
+    def answered(self, latency):
+        self.responses += 1
+        if self._recording:
+            self.latencies.append(latency)
+
+    def poll(self, timeout=0.05):
+        for key, events in self.selector.select(timeout):
+            sw = key.data
+            if events & selectors.EVENT_WRITE:
+                sw.on_writable()
+            if events & selectors.EVENT_READ and not sw.closed:
+                sw.on_readable()
+
+    def _run_until(self, done, timeout, what):
+        deadline = time.monotonic() + timeout
+        while not done():
+            if time.monotonic() > deadline:
+                raise TimeoutError(what())
+            self.poll()
+
+    def connect(self, timeout=60.0):
+        """Open every connection, CONNECT_BATCH at a time, and wait for all handshakes"""
+        deadline = time.monotonic() + timeout
+        for started, sw in enumerate(self.switches):
+            self._run_until(lambda: started - self.n_ready < CONNECT_BATCH, deadline - time.monotonic(),
+                            lambda: f"{self.n_ready}/{len(self.switches)} switches completed the handshake")
+            sw.connect(self.addr)
+            self.selector.register(sw, selectors.EVENT_READ, sw)
+        self._run_until(lambda: self.n_ready == len(self.switches), deadline - time.monotonic(),
+                        lambda: f"{self.n_ready}/{len(self.switches)} switches completed the handshake")
+
+    def warm_up(self, timeout=60.0):
+        for sw in self.switches:
+            sw.warm_up()
+        self._run_until(lambda: not any(sw.outstanding for sw in self.switches), timeout,
+                        lambda: "warm-up PACKET_INs were not answered")
+
+    def measure(self, seconds, window=8) -> dict:
+        """Closed-loop run: returns throughput and latency percentiles"""
+        self.sent = self.responses = 0
+        self.latencies = []
+        self._recording = True
+        start = time.perf_counter()
+        for sw in self.switches:
+            sw.start(window)
+        while time.perf_counter() - start < seconds:
+            self.poll()
+        elapsed = time.perf_counter() - start
+        self._recording = False
+        for sw in self.switches:
+            sw.window = 0
+        latencies = sorted(self.latencies)
+        return {
+            "packet_ins": self.sent,
+            "responses": self.responses,
+            "seconds": round(elapsed, 3),
+            "msgs_per_s": round(self.responses / elapsed, 1),
+            "latency_us": {
+                name: round(percentile(latencies, q) * 1e6, 1)
+                for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+            },
+            "closed": self.n_closed,
+        }
+
+    def close(self):
+        for sw in self.switches:
+            sw.close()
+        self.selector.close()
+
+
+def _run_controller(port_queue, controller_kwargs):
+    from src.controller.controller import Controller
+    from src.utils import log
+    raise_fd_limit()
+    log.set_level(log.ERROR)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        ctrl = Controller(host="127.0.0.1", port=0, **controller_kwargs)
+        ctrl.listen()
+        port_queue.put(ctrl.port)
+        ctrl.serve_forever()
+
+
+@contextlib.contextmanager
+def spawn_controller(**controller_kwargs):
+    """Run a Controller in a child process; yields its port"""
+    port_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_controller, args=(port_queue, controller_kwargs), daemon=True)
+    proc.start()
+    try:
+        yield port_queue.get(timeout=10)
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def run_scenario(port, switches, hosts=64, n_ports=8, flood_ratio=0.1, window=8, seconds=5.0, seed=1) -> dict:
+    raise_fd_limit()
+    sim = SwitchSimulator(("127.0.0.1", port), switches, hosts, n_ports, flood_ratio, seed)
+    try:
+        sim.connect()
+        sim.warm_up()
+        result = sim.measure(seconds, window)
+    finally:
+        sim.close()
+    result.update(switches=switches, hosts=hosts, ports=n_ports, flood_ratio=flood_ratio, window=window)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--switches", type=int, default=100)
+    parser.add_argument("--hosts", type=int, default=64)
+    parser.add_argument("--ports", type=int, default=8)
+    parser.add_argument("--flood-ratio", type=float, default=0.1)
+    parser.add_argument("--window", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    # every PACKET_IN is answered: this measures the controller, not its admission control
+    with spawn_controller(admission_control=False) as port:
+        result = run_scenario(port, args.switches, args.hosts, args.ports, args.flood_ratio,
+                              args.window, args.seconds, args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
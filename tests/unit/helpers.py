@@ -0,0 +1,72 @@
+"""Stand-ins and message builders shared by the unit tests"""
+import struct
+
+from src.openflow.openflow import OFHeader, OFPT_PACKET_IN, OFP_NO_BUFFER
+
+
+class FakeClock:
+    """Scheduler clock that only moves when a test advances `now`"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSocket:
+    """
+    Socket stand-in. recv_into() returns one queued chunk per call;
+    sendmsg() accepts at most `capacity` bytes per call, raises
+    BlockingIOError when that is zero and keeps what it accepted in `data`.
+    """
+
+    def __init__(self, chunks=(), capacity=1 << 30):
+        self.chunks = list(chunks)
+        self.reads = 0
+        self.capacity = capacity
+        self.calls = []
+        self.data = b''
+
+    def recv_into(self, buf):
+        self.reads += 1
+        chunk = self.chunks.pop(0)
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+    def sendmsg(self, buffers):
+        joined = b''.join(bytes(b) for b in buffers)
+        if self.capacity == 0:
+            raise BlockingIOError()
+        sent = joined[:self.capacity]
+        self.calls.append(len(buffers))
+        self.data += sent
+        return len(sent)
+
+    def fileno(self):
+        return 3
+
+    def close(self):
+        pass
+
+
+def ethernet_frame(src, dst, ethertype=b"\x08\x00", payload=bytes(46)):
+    """Frame between two raw MACs; the default payload makes it 60 bytes"""
+    return dst + src + ethertype + payload
+
+
+def packet_in_body(in_port, frame, buffer_id=OFP_NO_BUFFER):
+    """PACKET_IN body carrying the whole frame"""
+    return struct.pack("!IHHBx", buffer_id, len(frame), in_port, 0) + frame
+
+
+def packet_in(in_port, frame, buffer_id=OFP_NO_BUFFER, xid=7):
+    """PACKET_IN message as the switch sends it"""
+    body = packet_in_body(in_port, frame, buffer_id)
+    return struct.pack("!BBHI", 1, OFPT_PACKET_IN, 8 + len(body), xid) + body
+
+
+def packet_in_parsed(in_port, frame, buffer_id=OFP_NO_BUFFER):
+    """(header, body) of a PACKET_IN, as dispatcher() and dispatch_batch() take them"""
+    body = packet_in_body(in_port, frame, buffer_id)
+    return OFHeader(1, OFPT_PACKET_IN, 8 + len(body), 1), body
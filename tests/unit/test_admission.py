@@ -0,0 +1,72 @@
+import unittest
+from src.controller.admission import AdmissionControl, TokenBucket
+
+A = b'\x02\x00\x00\x00\x00\x01'
+B = b'\x02\x00\x00\x00\x00\x02'
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test cases for TokenBucket"""
+
+    def test_burst_then_rate(self):
+        """Test a bucket allows its burst at once, then refills at its rate"""
+        bucket = TokenBucket(rate=10, burst=3, now=0)
+        self.assertEqual([bucket.take(0) for _ in range(4)], [True, True, True, False])
+        self.assertFalse(bucket.take(0.05))
+        self.assertTrue(bucket.take(0.1))
+
+    def test_refill_capped_at_burst(self):
+        """Test an idle bucket does not save up more than its burst"""
+        bucket = TokenBucket(rate=10, burst=2, now=0)
+        self.assertEqual(sum(bucket.take(100) for _ in range(5)), 2)
+
+
+class TestAdmissionControl(unittest.TestCase):
+    """Test cases for AdmissionControl"""
+
+    def setUp(self):
+        self.admission = AdmissionControl(datapath_rate=10, datapath_burst=4,
+                                          port_rate=10, port_burst=2, coalesce_seconds=0.1)
+
+    def test_port_bucket(self):
+        """Test one busy port is limited without affecting another port"""
+        self.assertEqual([self.admission.admit(1, 1, 0) for _ in range(3)], [True, True, False])
+        self.assertTrue(self.admission.admit(1, 2, 0))
+        self.assertEqual(self.admission.stats.dropped_port, 1)
+
+    def test_datapath_bucket(self):
+        """Test a switch is limited across its ports, other switches are not"""
+        admitted = [self.admission.admit(1, port, 0) for port in (1, 1, 2, 2, 3)]
+        self.assertEqual(admitted, [True, True, True, True, False])
+        self.assertEqual(self.admission.stats.dropped_datapath, 1)
+        self.assertTrue(self.admission.admit(2, 1, 0))
+        self.assertEqual(self.admission.stats.admitted, 5)
+
+    def test_coalesce_misses(self):
+        """Test an identical miss is dropped while the first one is pending"""
+        self.assertTrue(self.admission.first_miss(1, A, B, 0))
+        self.assertFalse(self.admission.first_miss(1, A, B, 0.05))
+        self.assertTrue(self.admission.first_miss(1, B, A, 0.05))
+        self.assertTrue(self.admission.first_miss(2, A, B, 0.05))
+        self.assertTrue(self.admission.first_miss(1, A, B, 0.2))
+        self.assertEqual(self.admission.stats.coalesced, 1)
+
+    def test_group_misses_not_coalesced(self):
+        """Test distinct broadcast and multicast frames from one host are all flooded"""
+        for dst in (b'\xff' * 6, b'\x01\x00\x5e\x00\x00\x01'):
+            self.assertTrue(self.admission.first_miss(1, A, dst, 0))
+            self.assertTrue(self.admission.first_miss(1, A, dst, 0.05))
+        self.assertEqual(self.admission.stats.coalesced, 0)
+
+    def test_forget(self):
+        """Test a reconnecting switch starts with full buckets"""
+        self.admission.admit(1, 1, 0)
+        self.admission.admit(1, 1, 0)
+        self.admission.first_miss(1, A, B, 0)
+        self.admission.forget(1)
+        self.assertTrue(self.admission.admit(1, 1, 0))
+        self.assertTrue(self.admission.first_miss(1, A, B, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
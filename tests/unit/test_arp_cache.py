@@ -0,0 +1,67 @@
+import unittest
+
+from src.controller.state.arp_cache import ARPCache
+
+IP1 = bytes([10, 0, 0, 1])
+IP2 = bytes([10, 0, 0, 2])
+IP3 = bytes([10, 0, 0, 3])
+MAC1 = bytes.fromhex("020000000001")
+MAC2 = bytes.fromhex("020000000002")
+
+
+class TestARPCache(unittest.TestCase):
+    """Test cases for the IPv4 to MAC cache of the ARP proxy"""
+
+    def test_learn_and_lookup(self):
+        """Test a learned binding is found and a new MAC replaces the old one"""
+        cache = ARPCache(timeout_seconds=60)
+        cache.learn(IP1, MAC1, now=0.0)
+        self.assertEqual(cache.lookup(IP1, now=1.0), MAC1)
+        self.assertIsNone(cache.lookup(IP2, now=1.0))
+        cache.learn(IP1, MAC2, now=2.0)
+        self.assertEqual(cache.lookup(IP1, now=3.0), MAC2)
+        self.assertEqual((cache.lookups, cache.lookup_hits), (3, 2))
+
+    def test_expired_binding_not_returned(self):
+        """Test a binding older than the timeout is dropped on lookup"""
+        cache = ARPCache(timeout_seconds=60)
+        cache.learn(IP1, MAC1, now=0.0)
+        self.assertEqual(cache.lookup(IP1, now=60.0), MAC1)
+        self.assertIsNone(cache.lookup(IP1, now=60.5))
+        self.assertNotIn(IP1, cache)
+
+    def test_age_out_oldest_first(self):
+        """Test aging drops only expired bindings and a relearn renews one"""
+        cache = ARPCache(timeout_seconds=60)
+        cache.learn(IP1, MAC1, now=0.0)
+        cache.learn(IP2, MAC2, now=10.0)
+        cache.learn(IP3, MAC2, now=20.0)
+        cache.learn(IP1, MAC1, now=30.0)
+        self.assertEqual(cache.age_out(now=85.0), 2)
+        self.assertEqual(len(cache), 1)
+        self.assertIn(IP1, cache)
+
+    def test_full_cache_evicts_oldest(self):
+        """Test a full cache evicts the least recently learned binding"""
+        cache = ARPCache(timeout_seconds=60, max_entries=2)
+        cache.learn(IP1, MAC1, now=0.0)
+        cache.learn(IP2, MAC2, now=1.0)
+        cache.learn(IP1, MAC1, now=2.0)
+        cache.learn(IP3, MAC2, now=3.0)
+        self.assertNotIn(IP2, cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evicted, 1)
+
+    def test_echo_of_flooded_request(self):
+        """Test a flooded request is recognised again only within the echo window"""
+        cache = ARPCache(echo_window=1.0)
+        cache.flooded(IP1, IP2, now=0.0)
+        self.assertTrue(cache.is_echo(IP1, IP2, now=0.5))
+        self.assertFalse(cache.is_echo(IP2, IP1, now=0.5))
+        self.assertFalse(cache.is_echo(IP1, IP2, now=1.5))
+        cache.flooded(IP1, IP3, now=2.0)
+        self.assertEqual(len(cache._flooded), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
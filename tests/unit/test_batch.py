@@ -0,0 +1,50 @@
+import struct
+import unittest
+
+from src.openflow import batch
+from src.openflow.batch import NUMPY_MIN_BATCH, packet_in_columns
+
+try:
+    import numpy  # noqa: F401
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+def _body(i, frame_len=60):
+    dst = bytes([2, 0, 0, 0, 0, i & 0xff])
+    src = bytes([2, 0, 0, 0, 1, i & 0xff])
+    frame = (dst + src + b'\x08\x00' + bytes(frame_len))[:frame_len]
+    return memoryview(struct.pack("!IHHBx", 1000 + i, len(frame), 1 + i % 48, 0) + frame)
+
+
+class TestPacketInColumns(unittest.TestCase):
+    """Test cases for PACKET_IN column extraction"""
+
+    def tearDown(self):
+        batch.disable_numpy()
+
+    def test_columns(self):
+        """Test buffer_id, in_port and both MACs are extracted per body"""
+        buffer_ids, in_ports, dsts, srcs = packet_in_columns([_body(1), _body(2)])
+        self.assertEqual(list(buffer_ids), [1001, 1002])
+        self.assertEqual(list(in_ports), [2, 3])
+        self.assertEqual(list(dsts), [b'\x02\x00\x00\x00\x00\x01', b'\x02\x00\x00\x00\x00\x02'])
+        self.assertEqual(srcs[1], b'\x02\x00\x00\x00\x01\x02')
+
+    def test_short_frame_rejected(self):
+        """Test a frame shorter than an Ethernet header raises ValueError"""
+        with self.assertRaises(ValueError):
+            packet_in_columns([_body(1), _body(2, frame_len=13)])
+
+    @unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+    def test_numpy_matches_struct(self):
+        """Test the NumPy path returns the same columns as the struct path"""
+        bodies = [_body(i) for i in range(NUMPY_MIN_BATCH)]
+        expected = [list(c) for c in packet_in_columns(bodies)]
+        self.assertTrue(batch.enable_numpy())
+        self.assertEqual([list(c) for c in packet_in_columns(bodies)], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from src.controller.connection import Connection
+from tests.unit.helpers import FakeSocket
+
+
+class TestConnectionOutput(unittest.TestCase):
+    """Test cases for the per-connection output queue"""
+
+    def setUp(self):
+        self.sock = FakeSocket()
+        self.pending = set()
+        self.conn = Connection(self.sock, ('127.0.0.1', 1), self.pending,
+                               high_watermark=100, low_watermark=20)
+
+    def test_send_only_queues(self):
+        """Test send() queues output and registers for the next flush"""
+        self.conn.send(b'hello')
+        self.assertEqual(self.sock.calls, [])
+        self.assertIn(self.conn, self.pending)
+        self.assertEqual(self.conn.pending_bytes, 5)
+
+    def test_flush_coalesces(self):
+        """Test several queued messages go out in a single sendmsg()"""
+        for i in range(5):
+            self.conn.send(bytes([i]) * 8)
+        self.conn.flush()
+        self.assertEqual(self.sock.calls, [5])
+        self.assertEqual(self.sock.data, b''.join(bytes([i]) * 8 for i in range(5)))
+        self.assertFalse(self.conn.want_write())
+
+    def test_partial_write_keeps_tail(self):
+        """Test a short write keeps the unsent bytes in order"""
+        self.sock.capacity = 10
+        self.conn.send(b'a' * 8)
+        self.conn.send(b'b' * 8)
+        self.conn.flush()
+        self.assertEqual(self.sock.data, b'a' * 8 + b'bb')
+        self.assertEqual(self.conn.pending_bytes, 6)
+        self.sock.capacity = 1 << 30
+        self.conn.flush()
+        self.assertEqual(self.sock.data, b'a' * 8 + b'b' * 8)
+        self.assertEqual(self.conn.pending_bytes, 0)
+
+    def test_would_block(self):
+        """Test a full socket buffer leaves everything queued"""
+        self.sock.capacity = 0
+        self.conn.send(b'x' * 8)
+        self.conn.flush()
+        self.assertEqual(self.conn.pending_bytes, 8)
+
+    def test_backpressure_watermarks(self):
+        """Test reads pause above the high watermark and resume below the low one"""
+        self.sock.capacity = 0
+        self.conn.send(b'x' * 120)
+        self.assertTrue(self.conn.update_backpressure())
+        self.sock.capacity = 90
+        self.conn.flush()
+        # 30 bytes left: between the watermarks, still paused
+        self.assertTrue(self.conn.update_backpressure())
+        self.sock.capacity = 15
+        self.conn.flush()
+        self.assertFalse(self.conn.update_backpressure())
+
+    def test_without_pending_set_sends_immediately(self):
+        """Test a standalone connection flushes on send()"""
+        conn = Connection(self.sock, ('127.0.0.1', 1))
+        conn.send(b'now')
+        self.assertEqual(self.sock.data, b'now')
+
+
+if __name__ == '__main__':
+    unittest.main()
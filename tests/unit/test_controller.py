@@ -1,6 +1,12 @@
+import socket
+import struct
+import threading
 import unittest
 from unittest.mock import Mock, patch, MagicMock
-from src.controller.controller import Controller
+from src.controller.controller import Controller, LISTEN_BACKLOG
+from src.controller.connection import Connection
+from src.openflow.match import match_l2
+from tests.unit.helpers import FakeSocket, ethernet_frame, packet_in
 
 
 class TestController(unittest.TestCase):
@@ -21,31 +27,305 @@ class TestController(unittest.TestCase):
         self.assertEqual(controller.host, '0.0.0.0')
         self.assertEqual(controller.port, 6634)
 
+    @patch('src.controller.controller.selectors.DefaultSelector')
     @patch('src.controller.controller.socket.socket')
-    def test_start_creates_socket(self, mock_socket):
+    def test_start_creates_socket(self, mock_socket, mock_selector):
         """Test that start() creates and configures a socket"""
         mock_sock = MagicMock()
         mock_socket.return_value = mock_sock
-        # Make accept raise KeyboardInterrupt to exit the while True loop
-        mock_sock.accept.side_effect = KeyboardInterrupt()
+        # Make select raise KeyboardInterrupt to exit the event loop
+        mock_selector.return_value.select.side_effect = KeyboardInterrupt()
 
         self.controller.start()
 
         mock_socket.assert_called_once()
         mock_sock.bind.assert_called_once_with(('127.0.0.1', 6634))
-        mock_sock.listen.assert_called_once_with(5)
+        mock_sock.listen.assert_called_once_with(LISTEN_BACKLOG)
+        mock_sock.setblocking.assert_called_once_with(False)
 
     def test_recv_msg(self):
         """Test recv_msg receives data from connection"""
-        mock_conn = MagicMock()
         test_data = b'\x01\x00\x00\x08\x00\x00\x00\x01'
-        mock_conn.recv.return_value = test_data
+        sock = FakeSocket([test_data])
+        conn = Connection(sock, ('127.0.0.1', 1))
 
-        result = self.controller.recv_msg(mock_conn)
+        result = self.controller.recv_msg(conn)
 
-        self.assertEqual(result, test_data)
-        # recv is called twice: once for header (8 bytes), once for body (0 bytes)
-        self.assertEqual(mock_conn.recv.call_count, 1)
+        self.assertEqual([bytes(m) for m in result], [test_data])
+        # a single read returns every complete message
+        self.assertEqual(sock.reads, 1)
+
+    def test_recv_msg_multiple_and_partial(self):
+        """Test recv_msg splits coalesced messages and keeps partial ones"""
+        hello = b'\x01\x00\x00\x08\x00\x00\x00\x01'
+        echo = b'\x01\x02\x00\x0c\x00\x00\x00\x02ABCD'
+        sock = FakeSocket([hello + echo + echo[:5], echo[5:]])
+        conn = Connection(sock, ('127.0.0.1', 1))
+
+        self.assertEqual([bytes(m) for m in self.controller.recv_msg(conn)], [hello, echo])
+        self.assertEqual([bytes(m) for m in self.controller.recv_msg(conn)], [echo])
+        self.assertEqual(sock.reads, 2)
+
+    def test_recv_msg_closed(self):
+        """Test recv_msg returns None when the peer closed the connection"""
+        conn = Connection(FakeSocket([b'']), ('127.0.0.1', 1))
+
+        self.assertIsNone(self.controller.recv_msg(conn))
+
+
+def _packet_in(in_port):
+    return packet_in(in_port, ethernet_frame(b'\x02' * 6, b'\xff' * 6, b'\x08\x06'))
+
+
+class TestControllerDispatch(unittest.TestCase):
+    """Test cases for the order and admission of messages from one read"""
+
+    def setUp(self):
+        self.controller = Controller(host='127.0.0.1', port=0)
+        self.controller._selector = MagicMock()
+
+    def _read(self, data):
+        conn = Connection(FakeSocket([data]), ('127.0.0.1', 1), set())
+        with patch('sys.stdout'):
+            self.controller._on_readable(conn)
+        return [struct.unpack_from("!B", m, 1)[0] for m in conn._out]
+
+    def test_echo_ahead_of_packet_in(self):
+        """Test an ECHO_REQUEST behind PACKET_INs is answered first"""
+        echo = b'\x01\x02\x00\x08\x00\x00\x00\x09'
+        sent = self._read(_packet_in(1) + _packet_in(2) + echo)
+        self.assertEqual(sent, [3, 13, 13])
+
+    def test_port_bucket_drops_storm(self):
+        """Test PACKET_INs over the port's burst are dropped and counted"""
+        self.controller.admission.port_burst = 2
+        sent = self._read(_packet_in(1) * 5 + _packet_in(2))
+        self.assertEqual(sent, [13, 13, 13])
+        stats = self.controller.admission.stats
+        self.assertEqual((stats.admitted, stats.dropped_port), (3, 3))
+
+    def test_admission_disabled(self):
+        """Test every PACKET_IN is handled without admission control"""
+        self.controller.admission = None
+        self.assertEqual(self._read(_packet_in(1) * 5), [13] * 5)
+
+    def test_disconnect_removes_links(self):
+        """Test a switch that disconnects takes its links and hosts out of the topology"""
+        features = struct.pack("!BBHIQIB3xII", 1, 6, 32, 1, 2, 256, 1, 0, 0)
+        conn = Connection(FakeSocket([features]), ('127.0.0.1', 1), set())
+        with patch('sys.stdout'):
+            self.controller._on_readable(conn)
+        topology = self.controller.topology
+        topology.add_link(1, 1, 2, 1)
+        topology.add_link(2, 1, 1, 1)
+        topology.learn_host(b'\x02' * 6, 2, 4)
+        with patch('sys.stdout'):
+            self.controller.close_connection(conn)
+        self.assertEqual(topology.links, {})
+        self.assertEqual(topology.hosts, {})
+
+
+class TestControllerRequests(unittest.TestCase):
+    """Test cases for requests awaiting replies and bulk flow installs"""
+
+    def setUp(self):
+        self.controller = Controller(host='127.0.0.1', port=0)
+        self.conn = Connection(FakeSocket([]), ('127.0.0.1', 1), set())
+        features = struct.pack("!BBHIQIB3xII", 1, 6, 32, 1, 0x2a, 256, 1, 0, 0)
+        with patch('sys.stdout'):
+            self.controller.handle_messages(self.conn, self.conn.feed(features))
+        self.controller.connections[self.conn.fileno()] = self.conn
+
+    def _sent(self):
+        """(type, xid) of every message queued on the connection"""
+        data = b''.join(self.conn._out)
+        msgs = []
+        offset = 0
+        while offset < len(data):
+            _, msg_type, length, xid = struct.unpack_from("!BBHI", data, offset)
+            msgs.append((msg_type, xid))
+            offset += length
+        return msgs
+
+    def _receive(self, msg_type, xid, body=b''):
+        with patch('sys.stdout'):
+            self.controller.handle_messages(
+                self.conn, self.conn.feed(struct.pack("!BBHI", 1, msg_type, 8 + len(body), xid) + body))
+
+    def test_install_flows_behind_one_barrier(self):
+        """Test FLOW_MODs go out back to back and one barrier reports the rejected ones"""
+        flows = [(match_l2(1, b'\x02' * 6, bytes([4, 0, 0, 0, 0, i])), 2) for i in range(3)]
+        future = self.controller.install_flows(self.conn, flows)
+        sent = self._sent()
+        self.assertEqual([t for t, _ in sent], [14, 14, 14, 18])
+        xids = [xid for _, xid in sent]
+        self.assertEqual(xids, list(range(xids[0], xids[0] + 4)))
+        self.assertEqual(len(self.conn.datapath.flow_table), 3)
+        # the second FLOW_MOD is rejected: OFPET_FLOW_MOD_FAILED, OFPFMFC_ALL_TABLES_FULL
+        self._receive(1, xids[1], struct.pack("!HH", 3, 0) + bytes(64))
+        self.assertFalse(future.done())
+        self._receive(19, xids[3])
+        result = future.result(timeout=0)
+        self.assertEqual((result.sent, [(i, e.err_type) for i, e in result.failed]), (3, [(1, 3)]))
+        self.assertEqual(len(self.conn.datapath.flow_table), 2)
+        self.assertEqual(len(self.controller.requests), 0)
+
+    def test_xid_wraps_and_skips_pending(self):
+        """Test xids wrap after 0xffffffff, skipping 0 and xids still awaiting a reply"""
+        self.controller.xid = 0xfffffffe
+        future = self.controller.barrier(self.conn)
+        self.assertEqual(self._sent()[-1], (18, 0xffffffff))
+        self.controller.xid = 0xfffffffe
+        self.assertEqual(self.controller.next_xid(), 1)
+        self.assertFalse(future.done())
+
+    def test_unexpected_error_keeps_connection(self):
+        """Test an ERROR nobody waits for is logged and the switch stays connected"""
+        self._receive(1, 12345, struct.pack("!HH", 1, 2) + bytes(64))
+        self.assertFalse(self.conn.closed)
+
+    def test_close_fails_pending(self):
+        """Test waiting requests fail when their switch disconnects"""
+        future = self.controller.barrier(self.conn)
+        with patch('sys.stdout'):
+            self.controller.close_connection(self.conn)
+        self.assertIsInstance(future.exception(timeout=0), ConnectionError)
+
+
+def _recv_exact(sock, nbytes):
+    data = b''
+    while len(data) < nbytes:
+        chunk = sock.recv(nbytes - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def _recv_header(sock):
+    version, msg_type, length, xid = struct.unpack("!BBHI", _recv_exact(sock, 8))
+    _recv_exact(sock, length - 8)
+    return msg_type, xid
+
+
+class TestControllerEventLoop(unittest.TestCase):
+    """Test cases for serving several switches concurrently"""
+
+    def setUp(self):
+        self.controller = Controller(host='127.0.0.1', port=0)
+        with patch('sys.stdout'):
+            self.controller.listen()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        with patch('sys.stdout'):
+            self.controller.serve_forever()
+            self.controller.close()
+
+    def tearDown(self):
+        self.controller.stop()
+        self.thread.join(timeout=5)
+
+    def _connect(self):
+        sock = socket.create_connection(('127.0.0.1', self.controller.port), timeout=5)
+        self.addCleanup(sock.close)
+        # handshake: HELLO then FEATURES_REQUEST
+        self.assertEqual(_recv_header(sock)[0], 0)
+        self.assertEqual(_recv_header(sock)[0], 5)
+        return sock
+
+    def test_serves_switches_concurrently(self):
+        """Test a second switch is served while the first stays connected"""
+        first = self._connect()
+        second = self._connect()
+
+        second.sendall(b'\x01\x02\x00\x08\x00\x00\x00\x07')
+        self.assertEqual(_recv_header(second), (3, 7))
+
+        first.sendall(b'\x01\x02\x00\x08\x00\x00\x00\x08')
+        self.assertEqual(_recv_header(first), (3, 8))
+
+
+class TestControllerKeepalive(unittest.TestCase):
+    """Test cases for ECHO keepalives and dead-switch detection"""
+
+    def setUp(self):
+        self.controller = Controller(host='127.0.0.1', port=0, keepalive_interval=1.0, keepalive_timeout=3.0)
+        self.controller._selector = MagicMock()
+        self.conn = Connection(FakeSocket([]), ('127.0.0.1', 1), set())
+        features = struct.pack("!BBHIQIB3xII", 1, 6, 32, 1, 0x2a, 256, 1, 0, 0)
+        with patch('sys.stdout'):
+            self.controller.handle_messages(self.conn, self.conn.feed(features))
+        self.controller.connections[self.conn.fileno()] = self.conn
+
+    def test_echo_request_and_rtt(self):
+        """Test a probe sends ECHO_REQUEST and its reply records the RTT"""
+        self.controller._keepalive(self.conn)
+        request = self.conn._out[-1]
+        self.assertEqual(struct.unpack("!BBHI", request), (1, 2, 8, self.conn.echo_xid))
+        self.assertIsNotNone(self.conn.keepalive)
+        reply = struct.pack("!BBHI", 1, 3, 8, self.conn.echo_xid)
+        with patch('sys.stdout'):
+            self.controller.handle_messages(self.conn, self.conn.feed(reply))
+        self.assertIsNone(self.conn.echo_xid)
+        self.assertGreaterEqual(self.conn.echo_rtt, 0)
+
+    def test_echo_rtt_on_scheduler_clock(self):
+        """Test the RTT is measured on the scheduler's clock the probe was stamped with"""
+        now = [1000.0]
+        self.controller.scheduler.clock = lambda: now[0]
+        self.controller._keepalive(self.conn)
+        now[0] += 0.25
+        reply = struct.pack("!BBHI", 1, 3, 8, self.conn.echo_xid)
+        with patch('sys.stdout'):
+            self.controller.handle_messages(self.conn, self.conn.feed(reply))
+        self.assertAlmostEqual(self.conn.echo_rtt, 0.25)
+
+    def test_zero_disables_keepalives(self):
+        """Test a zero interval or timeout turns keepalives off instead of dropping every switch"""
+        for interval, timeout in ((0, 15.0), (5.0, 0), (None, 15.0)):
+            controller = Controller(host='127.0.0.1', port=0, keepalive_interval=interval, keepalive_timeout=timeout)
+            self.assertIsNone(controller.keepalive_interval)
+
+    def test_silent_switch_is_purged(self):
+        """Test a switch silent past the timeout is disconnected and unregistered"""
+        self.conn.received_at -= int(4e9)
+        with patch('sys.stdout'):
+            self.controller._keepalive(self.conn)
+        self.assertTrue(self.conn.closed)
+        self.assertEqual(self.controller.keepalive_timeouts, 1)
+        self.assertIsNone(self.controller.datapaths.get(0x2a))
+        self.assertEqual(self.controller.connections, {})
+
+    def test_probe_never_overshoots_deadline(self):
+        """Test the next probe is scheduled no later than the silence deadline"""
+        self.conn.received_at -= int(2.5e9)
+        self.controller._keepalive(self.conn)
+        delay = self.conn.keepalive.when - self.controller.scheduler.clock()
+        self.assertLessEqual(delay, 0.5)
+
+    def test_event_loop_disconnects_silent_switch(self):
+        """Test a switch that never answers is closed by the running loop"""
+        controller = Controller(host='127.0.0.1', port=0, keepalive_interval=0.05, keepalive_timeout=0.3)
+        with patch('sys.stdout'):
+            controller.listen()
+        thread = threading.Thread(target=lambda: (controller.serve_forever(), controller.close()), daemon=True)
+        with patch('sys.stdout'):
+            thread.start()
+            sock = socket.create_connection(('127.0.0.1', controller.port), timeout=5)
+            self.addCleanup(sock.close)
+            types = []
+            while True:
+                header = sock.recv(8)
+                if not header:
+                    break
+                types.append(header[1])
+            controller.stop()
+            thread.join(timeout=5)
+        self.assertEqual(types[:2], [0, 5])
+        self.assertIn(2, types[2:])
+        self.assertEqual(controller.keepalive_timeouts, 1)
 
 
 if __name__ == '__main__':
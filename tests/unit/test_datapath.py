@@ -0,0 +1,74 @@
+import unittest
+from src.controller.state.datapath import DatapathRegistry
+from src.openflow.openflow import OFFeaturesReply, OFPhyPort
+
+
+def make_features(dpid, port_nos=()):
+    ports = [OFPhyPort(n, "00:00:00:00:00:00", f"eth{n}", 0, 0, 0, 0, 0, 0) for n in port_nos]
+    return OFFeaturesReply(dpid, 256, 1, 0xc7, 0xfff, ports)
+
+
+class TestDatapathRegistry(unittest.TestCase):
+    """Test cases for DatapathRegistry"""
+
+    def setUp(self):
+        self.registry = DatapathRegistry(mac_timeout_seconds=60)
+
+    def test_register(self):
+        """Test FEATURES_REPLY fields and ports are kept per dpid"""
+        conn = object()
+        dp = self.registry.register(make_features(1, [1, 2]), conn)
+        self.assertIs(self.registry.get(1), dp)
+        self.assertEqual(dp.capabilities, 0xc7)
+        self.assertEqual(sorted(dp.ports), [1, 2])
+        self.assertIs(dp.conn, conn)
+        self.assertEqual(dp.mac_table.timeout_seconds, 60)
+
+    def test_mac_tables_are_separate(self):
+        """Test MACs learned on one switch are invisible to another"""
+        dp1 = self.registry.register(make_features(1))
+        dp2 = self.registry.register(make_features(2))
+        dp1.mac_table.learn("02:00:00:00:00:01", 1)
+        self.assertEqual(dp1.mac_table.lookup("02:00:00:00:00:01"), 1)
+        self.assertIsNone(dp2.mac_table.lookup("02:00:00:00:00:01"))
+
+    def test_reregister_keeps_state(self):
+        """Test a repeated FEATURES_REPLY refreshes ports but keeps learned MACs"""
+        dp = self.registry.register(make_features(1, [1]))
+        dp.mac_table.learn("02:00:00:00:00:01", 1)
+        again = self.registry.register(make_features(1, [1, 2]))
+        self.assertIs(again, dp)
+        self.assertEqual(sorted(dp.ports), [1, 2])
+        self.assertEqual(dp.mac_table.lookup("02:00:00:00:00:01"), 1)
+
+    def test_reregister_forgets_flows(self):
+        """Test a reconnecting switch starts with an empty shadow flow table"""
+        dp = self.registry.register(make_features(1))
+        dp.flow_table.install_l2(1, b'\x02' * 6, b'\x04' * 6, 2, 0x8000)
+        self.registry.register(make_features(1))
+        self.assertEqual(len(dp.flow_table), 0)
+
+    def test_unregister_checks_connection(self):
+        """Test a stale connection cannot remove a reconnected datapath"""
+        old, new = object(), object()
+        self.registry.register(make_features(1), old)
+        self.registry.register(make_features(1), new)
+        self.assertIsNone(self.registry.unregister(1, old))
+        self.assertIn(1, self.registry)
+        self.assertIsNotNone(self.registry.unregister(1, new))
+        self.assertNotIn(1, self.registry)
+        self.assertEqual(len(self.registry), 0)
+
+    def test_age_out_reports_datapath(self):
+        """Test expired MACs are reported with the datapath they belonged to"""
+        expired = []
+        registry = DatapathRegistry(mac_timeout_seconds=10,
+                                    on_mac_expire=lambda dp, e: expired.append((dp.dpid, e.mac)))
+        registry.register(make_features(1)).mac_table.learn("02:00:00:00:00:01", 1, now=0)
+        registry.register(make_features(2)).mac_table.learn("02:00:00:00:00:02", 1, now=5)
+        self.assertEqual(registry.age_out(now=11), 1)
+        self.assertEqual(expired, [(1, "02:00:00:00:00:01")])
+
+
+if __name__ == '__main__':
+    unittest.main()
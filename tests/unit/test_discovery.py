@@ -0,0 +1,207 @@
+import struct
+import unittest
+from unittest.mock import MagicMock
+
+from src.controller.discovery import LinkDiscovery
+from src.controller.state.datapath import DatapathRegistry
+from src.controller.state.topology import Topology
+from src.openflow.openflow import (
+    OFHeader,
+    dispatcher,
+    dispatch_batch,
+    OFPT_FEATURES_REPLY,
+    OFPT_PACKET_IN,
+    OFPT_PACKET_OUT,
+    OFPT_FLOW_MOD,
+    OFPFC_DELETE,
+    OFPP_NONE,
+    OFP_NO_BUFFER,
+    OFPPS_LINK_DOWN,
+)
+from src.parser.lldp import parse_lldp
+from src.utils.scheduler import Scheduler
+from tests.unit.helpers import FakeClock, packet_in_parsed
+
+A = bytes.fromhex("020000000001")
+B = bytes.fromhex("020000000002")
+
+
+def features_reply(dpid, ports, down=()):
+    body = struct.pack("!QIB3xII", dpid, 256, 1, 0, 0)
+    for port_no in ports:
+        state = OFPPS_LINK_DOWN if port_no in down else 0
+        body += struct.pack("!H6s16sIIIIII", port_no, bytes([2, 0, 0, 0, dpid, port_no]),
+                            b"eth%d" % port_no, 0, state, 0, 0, 0, 0)
+    return body
+
+
+def sent(conn):
+    return [c.args[0] for c in conn.send.call_args_list]
+
+
+class TestLinkDiscovery(unittest.TestCase):
+    """Test cases for LLDP probes, the links they find and forwarding over them"""
+
+    def setUp(self):
+        self.ctrl = MagicMock()
+        self.ctrl.datapaths = DatapathRegistry()
+        self.ctrl.metrics = None
+        self.ctrl.admission = None
+        self.ctrl.topology = Topology()
+        self.clock = FakeClock()
+        self.ctrl.scheduler = Scheduler(self.clock)
+        self.xid = iter(range(100, 1000))
+        self.ctrl.next_xid.side_effect = lambda: next(self.xid)
+        self.discovery = self.ctrl.discovery = LinkDiscovery(self.ctrl, interval=5.0)
+        # switch 1 port 1 <-> switch 2 port 3; port 2 of switch 1 is down
+        self.conn1, self.conn2 = MagicMock(closed=False), MagicMock(closed=False)
+        for dpid, conn, ports, down in ((1, self.conn1, (1, 2, 5), (2,)), (2, self.conn2, (3, 5), ())):
+            body = features_reply(dpid, ports, down)
+            dispatcher(self.ctrl, conn, OFHeader(1, OFPT_FEATURES_REPLY, 8 + len(body), 1), body)
+
+    def _probes(self, conn):
+        """(action port, probe origin) of the PACKET_OUTs sent on conn"""
+        probes = []
+        for msg in sent(conn):
+            self.assertEqual(msg[1], OFPT_PACKET_OUT)
+            self.assertEqual(struct.unpack("!IH", msg[8:14]), (OFP_NO_BUFFER, OFPP_NONE))
+            probes.append((struct.unpack("!H", msg[20:22])[0], parse_lldp(msg[24:])))
+        return probes
+
+    def _deliver(self, from_conn, out_port, to_conn, in_port):
+        """Hand the probe sent out of out_port back as a PACKET_IN from the switch at the far end"""
+        frame = next(msg[24:] for msg in sent(from_conn) if struct.unpack("!H", msg[20:22])[0] == out_port)
+        dispatcher(self.ctrl, to_conn, *packet_in_parsed(in_port, frame))
+
+    def _link(self):
+        self.discovery.probe_all()
+        self._deliver(self.conn1, 1, self.conn2, 3)
+        self._deliver(self.conn2, 3, self.conn1, 1)
+        self.conn1.send.reset_mock()
+        self.conn2.send.reset_mock()
+
+    def test_probes_every_up_port(self):
+        """Test one probe per up port, each naming its switch and port"""
+        self.assertEqual(self.discovery.probe_all(), 4)
+        self.assertEqual(self._probes(self.conn1), [(1, (1, 1)), (5, (1, 5))])
+        self.assertEqual(self._probes(self.conn2), [(3, (2, 3)), (5, (2, 5))])
+
+    def test_probe_packet_in_records_link(self):
+        """Test a returned probe becomes a link and is neither learned nor forwarded"""
+        self.discovery.probe_all()
+        self.conn2.send.reset_mock()
+        self._deliver(self.conn1, 1, self.conn2, 3)
+        self.assertEqual(self.ctrl.topology.links, {(1, 1): (2, 3)})
+        self.assertEqual(sent(self.conn2), [])
+        self.assertEqual(len(self.conn2.datapath.mac_table), 0)
+        self.assertEqual(self.discovery.probes_received, 1)
+
+    def test_batch_separates_probes(self):
+        """Test probes in a batch are consumed and the other PACKET_INs forwarded"""
+        self.discovery.probe_all()
+        probe = next(msg[24:] for msg in sent(self.conn1) if struct.unpack("!H", msg[20:22])[0] == 1)
+        self.conn2.send.reset_mock()
+        frame = b"\xff" * 6 + A + b"\x08\x00" + bytes(46)
+        dispatch_batch(self.ctrl, self.conn2, OFPT_PACKET_IN, [packet_in_parsed(3, probe), packet_in_parsed(5, frame)])
+        self.assertEqual(self.ctrl.topology.links, {(1, 1): (2, 3)})
+        self.assertEqual([m[1] for m in sent(self.conn2)], [OFPT_PACKET_OUT])
+        self.assertEqual(self.conn2.datapath.mac_table.lookup(self.conn2.datapath.mac_table.mac_key(A)), 5)
+
+    def _flood_ports(self, conn):
+        """Output ports of the single PACKET_OUT sent on conn"""
+        msg, = sent(conn)
+        self.assertEqual(msg[1], OFPT_PACKET_OUT)
+        actions_len = struct.unpack("!H", msg[14:16])[0]
+        return [struct.unpack("!H", msg[i + 4:i + 6])[0] for i in range(16, 16 + actions_len, 8)]
+
+    def test_flood_follows_spanning_tree(self):
+        """Test floods leave by edge and tree ports only and copies off the tree are dropped"""
+        self._link()
+        # a second cable between the switches closes a loop; port 1 stays on the tree
+        self.ctrl.topology.add_link(1, 5, 2, 5)
+        self.ctrl.topology.add_link(2, 5, 1, 5)
+        frame = b"\xff" * 6 + A + b"\x08\x00" + bytes(46)
+        dispatcher(self.ctrl, self.conn1, *packet_in_parsed(1, frame))
+        self.assertEqual(self._flood_ports(self.conn1), [2])
+        dispatcher(self.ctrl, self.conn2, *packet_in_parsed(5, frame))
+        self.assertEqual(sent(self.conn2), [])
+        self.ctrl.topology.remove_link(1, 5)
+        self.ctrl.topology.remove_link(2, 5)
+        self.conn1.send.reset_mock()
+        dispatcher(self.ctrl, self.conn1, *packet_in_parsed(1, frame))
+        self.assertEqual(self._flood_ports(self.conn1), [2, 5])
+
+    def test_forwards_over_path_to_remote_host(self):
+        """Test a host on another switch is reached through the link port"""
+        self._link()
+        dispatcher(self.ctrl, self.conn2, *packet_in_parsed(5, b"\xff" * 6 + B + b"\x08\x00" + bytes(46)))
+        self.assertEqual(self.ctrl.topology.hosts[B], (2, 5))
+        # B's broadcast also reached switch 1 over the link; that must not move it
+        dispatcher(self.ctrl, self.conn1, *packet_in_parsed(1, b"\xff" * 6 + B + b"\x08\x00" + bytes(46)))
+        self.assertEqual(self.ctrl.topology.hosts[B], (2, 5))
+        self.conn1.send.reset_mock()
+        dispatcher(self.ctrl, self.conn1, *packet_in_parsed(5, B + A + b"\x08\x00" + bytes(46)))
+        flow_mod = sent(self.conn1)[0]
+        self.assertEqual(flow_mod[1], OFPT_FLOW_MOD)
+        self.assertEqual(struct.unpack("!H", flow_mod[76:78])[0], 1)
+
+    def test_host_moved_to_other_switch(self):
+        """Test flows towards a host are deleted on every switch when it moves to another one"""
+        self._link()
+        dispatcher(self.ctrl, self.conn2, *packet_in_parsed(5, b"\xff" * 6 + B + b"\x08\x00" + bytes(46)))
+        dispatcher(self.ctrl, self.conn1, *packet_in_parsed(5, B + A + b"\x08\x00" + bytes(46)))
+        self.conn1.send.reset_mock()
+        dispatcher(self.ctrl, self.conn1, *packet_in_parsed(5, A + B + b"\x08\x00" + bytes(46)))
+        self.assertEqual(self.ctrl.topology.hosts[B], (1, 5))
+        deletes = [m for m in sent(self.conn1) if m[1] == OFPT_FLOW_MOD and struct.unpack("!H", m[56:58])[0] == OFPFC_DELETE]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(deletes[0][20:26], B)
+
+    def test_silent_link_expires(self):
+        """Test a link whose probes stop coming back is removed with the flows over it"""
+        self._link()
+        self.conn1.datapath.flow_table.install_l2(5, A, B, 1, 0x8000)
+        self.clock.now += 10
+        self.discovery._seen[(2, 3)] = self.clock.now
+        self.clock.now += 6
+        self.assertEqual(self.discovery.expire(self.clock.now), 1)
+        self.assertEqual(self.ctrl.topology.links, {(2, 3): (1, 1)})
+        self.assertEqual(len(self.conn1.datapath.flow_table), 0)
+        delete = sent(self.conn1)[0]
+        self.assertEqual(struct.unpack("!H", delete[56:58])[0], OFPFC_DELETE)
+        self.assertEqual(struct.unpack("!H", delete[68:70])[0], 1)
+
+    def test_silent_link_deletes_unshadowed_flows(self):
+        """Test flows over an expired link are deleted even if the shadow table holds none"""
+        self._link()
+        self.clock.now += 10
+        self.discovery._seen[(2, 3)] = self.clock.now
+        self.clock.now += 6
+        self.discovery.expire(self.clock.now)
+        delete = sent(self.conn1)[0]
+        self.assertEqual(struct.unpack("!HH", delete[56:58] + delete[68:70]), (OFPFC_DELETE, 1))
+
+    def test_port_down_removes_links(self):
+        """Test PORT_STATUS for a downed link port removes the link both ways"""
+        self._link()
+        port = struct.pack("!H6s16sIIIIII", 3, bytes(6), b"eth3", 0, OFPPS_LINK_DOWN, 0, 0, 0, 0)
+        body = struct.pack("!B7x", 2) + port
+        dispatcher(self.ctrl, self.conn2, OFHeader(1, 12, 8 + len(body), 1), body)
+        self.assertEqual(self.ctrl.topology.links, {})
+
+    def test_runs_from_scheduler(self):
+        """Test start() probes at once and then every interval"""
+        self.discovery.start()
+        self.ctrl.scheduler.run_due()
+        self.assertEqual(self.discovery.probes_sent, 4)
+        self.clock.now += 5
+        self.ctrl.scheduler.run_due()
+        self.assertEqual(self.discovery.probes_sent, 8)
+        self.discovery.stop()
+        self.clock.now += 5
+        self.ctrl.scheduler.run_due()
+        self.assertEqual(self.discovery.probes_sent, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import socket
+import struct
+import unittest
+from src.parser.ethernet import (
+    parse_ethernet,
+    ETH_TYPE_ARP,
+    ETH_TYPE_IPV4,
+    ETH_TYPE_VLAN,
+    IP_PROTO_TCP,
+    IP_PROTO_UDP,
+)
+
+DST = bytes.fromhex("ffffffffffff")
+SRC = bytes.fromhex("0242ac110002")
+
+
+def _ipv4(proto, l4):
+    return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4), 0, 0, 64, proto, 0,
+                       socket.inet_aton("10.0.0.1"), socket.inet_aton("10.0.0.2")) + l4
+
+
+class TestParseEthernet(unittest.TestCase):
+    """Test cases for the native Ethernet parser"""
+
+    def test_l2_addresses(self):
+        """Test src/dst decode as colon separated strings"""
+        eth = parse_ethernet(DST + SRC + b'\x08\x00' + b'\x00' * 46)
+        self.assertEqual(eth.dst, "ff:ff:ff:ff:ff:ff")
+        self.assertEqual(eth.src, "02:42:ac:11:00:02")
+        self.assertEqual(eth.ethertype, ETH_TYPE_IPV4)
+        self.assertIsNone(eth.vlan_id)
+
+    def test_memoryview_input(self):
+        """Test a memoryview frame is parsed without conversion"""
+        eth = parse_ethernet(memoryview(DST + SRC + b'\x08\x06' + b'\x00' * 46))
+        self.assertEqual(eth.src, "02:42:ac:11:00:02")
+        self.assertEqual(eth.ethertype, ETH_TYPE_ARP)
+
+    def test_vlan_tags(self):
+        """Test stacked VLAN tags are skipped and recorded"""
+        frame = DST + SRC + struct.pack("!HHHH", 0x88a8, 100, ETH_TYPE_VLAN, 0x2000 | 200) \
+            + b'\x08\x00' + _ipv4(IP_PROTO_UDP, struct.pack("!HHHH", 53, 5353, 8, 0))
+        eth = parse_ethernet(frame)
+        self.assertEqual(eth.vlans, (100, 200))
+        self.assertEqual(eth.vlan_id, 100)
+        self.assertEqual(eth.ethertype, ETH_TYPE_IPV4)
+        self.assertEqual(eth.udp.dst_port, 5353)
+
+    def test_arp(self):
+        """Test ARP request fields"""
+        arp = struct.pack("!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, 1, SRC, socket.inet_aton("10.0.0.1"),
+                          b'\x00' * 6, socket.inet_aton("10.0.0.2"))
+        eth = parse_ethernet(DST + SRC + b'\x08\x06' + arp)
+        self.assertEqual(eth.arp.opcode, 1)
+        self.assertEqual(eth.arp.sender_mac, "02:42:ac:11:00:02")
+        self.assertEqual(eth.arp.sender_ip, "10.0.0.1")
+        self.assertEqual(eth.arp.target_ip, "10.0.0.2")
+        self.assertIsNone(eth.ipv4)
+
+    def test_ipv4_tcp(self):
+        """Test IPv4 and TCP headers"""
+        tcp = struct.pack("!HHIIBBHHH", 40000, 80, 1, 0, 0x50, 0x02, 1024, 0, 0)
+        eth = parse_ethernet(DST + SRC + b'\x08\x00' + _ipv4(IP_PROTO_TCP, tcp))
+        self.assertEqual(eth.ipv4.src, "10.0.0.1")
+        self.assertEqual(eth.ipv4.dst, "10.0.0.2")
+        self.assertEqual(eth.tcp.dst_port, 80)
+        self.assertEqual(eth.tcp.flags, 0x02)
+        self.assertIsNone(eth.udp)
+        self.assertIsNone(eth.arp)
+
+    def test_truncated_vlan_tag(self):
+        """Test a frame ending inside a VLAN tag raises on access but not in repr()"""
+        eth = parse_ethernet(DST + SRC + struct.pack("!HH", ETH_TYPE_VLAN, 100))
+        with self.assertRaises(ValueError):
+            eth.vlans
+        self.assertIn("truncated", repr(eth))
+
+    def test_too_short(self):
+        """Test frames shorter than an Ethernet header are rejected"""
+        with self.assertRaises(ValueError):
+            parse_ethernet(b'\x00' * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from src.openflow.flow import FlowTable, flow_key, l2_flow_key
+from src.openflow.match import OFMatch, OFPFW_ALL, OFPFW_IN_PORT, match_l2, match_dl_dst
+
+A = b'\x02\x00\x00\x00\x00\x01'
+B = b'\x02\x00\x00\x00\x00\x02'
+C = b'\x02\x00\x00\x00\x00\x03'
+PRIORITY = 0x8000
+
+
+class TestFlowTable(unittest.TestCase):
+    """Test cases for the shadow FlowTable"""
+
+    def setUp(self):
+        self.table = FlowTable(suppress_seconds=1.0)
+
+    def test_l2_key_matches_flow_key(self):
+        """Test the match_l2 shortcut key equals the generic key"""
+        self.assertEqual(l2_flow_key(1, A, B, PRIORITY), flow_key(match_l2(1, A, B), PRIORITY))
+
+    def test_duplicate_suppressed(self):
+        """Test the same flow pushed twice within the window is sent once"""
+        self.assertTrue(self.table.install_l2(1, A, B, 2, PRIORITY, 10, 30, now=0))
+        self.assertFalse(self.table.install_l2(1, A, B, 2, PRIORITY, 10, 30, now=0.5))
+        self.assertEqual(self.table.suppressed, 1)
+        self.assertEqual(len(self.table), 1)
+
+    def test_resent_after_window(self):
+        """Test a PACKET_IN after the window means the flow is gone and is resent"""
+        self.table.install_l2(1, A, B, 2, PRIORITY, 10, 30, now=0)
+        self.assertTrue(self.table.install_l2(1, A, B, 2, PRIORITY, 10, 30, now=2))
+
+    def test_changed_port_not_suppressed(self):
+        """Test a flow to a different output port is always sent"""
+        self.table.install_l2(1, A, B, 2, PRIORITY, now=0)
+        self.assertTrue(self.table.install_l2(1, A, B, 3, PRIORITY, now=0.1))
+        self.assertEqual(self.table.lookup(match_l2(1, A, B), now=0.1).out_port, 3)
+
+    def test_priority_and_wildcards(self):
+        """Test lookup returns the highest priority flow covering the packet"""
+        self.table.install(match_dl_dst(B), 5, priority=10, now=0)
+        self.table.install(match_l2(1, A, B), 2, priority=PRIORITY, now=0)
+        self.assertEqual(self.table.lookup(match_l2(1, A, B), now=0).out_port, 2)
+        self.assertEqual(self.table.lookup(match_l2(3, C, B), now=0).out_port, 5)
+        self.assertIsNone(self.table.lookup(match_l2(1, A, C), now=0))
+
+    def test_nw_prefix_wildcards(self):
+        """Test nw_src wildcard bits mask the low address bits"""
+        wildcards = OFPFW_ALL & ~(0x3f << 8) | (8 << 8)
+        self.table.install(OFMatch(wildcards=wildcards, nw_src=0x0a000100), 1, priority=1, now=0)
+        self.assertIsNotNone(self.table.lookup(OFMatch(wildcards=0, nw_src=0x0a0001fe), now=0))
+        self.assertIsNone(self.table.lookup(OFMatch(wildcards=0, nw_src=0x0a000201), now=0))
+
+    def test_age_out(self):
+        """Test flows are forgotten after the shorter of idle and hard timeout"""
+        self.table.install_l2(1, A, B, 2, PRIORITY, idle_timeout=10, hard_timeout=30, now=0)
+        self.table.install_l2(1, A, C, 3, PRIORITY, now=0)
+        self.assertEqual(self.table.age_out(now=9), 0)
+        self.assertEqual(self.table.age_out(now=10), 1)
+        self.assertEqual(len(self.table), 1)
+        self.assertIsNone(self.table.lookup(match_l2(1, A, B), now=10))
+
+    def test_reinstall_postpones_expiry(self):
+        """Test a resent flow gets a new deadline"""
+        self.table.install_l2(1, A, B, 2, PRIORITY, idle_timeout=10, now=0)
+        self.table.install_l2(1, A, B, 2, PRIORITY, idle_timeout=10, now=5)
+        self.assertEqual(self.table.age_out(now=12), 0)
+        self.assertEqual(self.table.age_out(now=15), 1)
+
+    def test_invalidate_dst(self):
+        """Test every flow towards a moved MAC is removed at once"""
+        self.table.install_l2(1, A, C, 3, PRIORITY, now=0)
+        self.table.install_l2(2, B, C, 3, PRIORITY, now=0)
+        self.table.install_l2(3, C, A, 1, PRIORITY, now=0)
+        removed = self.table.invalidate_dst(C)
+        self.assertEqual(sorted(e.match.in_port for e in removed), [1, 2])
+        self.assertEqual(len(self.table), 1)
+        self.assertEqual(self.table.invalidate_dst(C), [])
+        # the flows are pushed again rather than suppressed
+        self.assertTrue(self.table.install_l2(1, A, C, 4, PRIORITY, now=0.1))
+
+    def test_invalidate_port(self):
+        """Test flows in from or out to a port are removed, and only those"""
+        self.table.install_l2(1, A, C, 3, PRIORITY, now=0)
+        self.table.install_l2(3, C, A, 1, PRIORITY, now=0)
+        self.table.install_l2(2, B, A, 1, PRIORITY, now=0)
+        self.table.install_l2(2, B, C, 4, PRIORITY, now=0)
+        removed = self.table.invalidate_port(3)
+        self.assertEqual(sorted((e.match.in_port, e.out_port) for e in removed), [(1, 3), (3, 1)])
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(self.table.invalidate_port(3), [])
+        self.assertEqual(len(self.table.invalidate_port(1)), 1)
+        self.assertEqual(len(self.table.invalidate_dst(C)), 1)
+        self.assertEqual(self.table.invalidate_port(4), [])
+
+    def test_invalidate_port_after_out_port_change(self):
+        """Test a flow re-pointed to another port is indexed under the new one"""
+        self.table.install_l2(1, A, B, 2, PRIORITY, now=0)
+        self.table.install_l2(1, A, B, 5, PRIORITY, now=0.5)
+        self.assertEqual(self.table.invalidate_port(2), [])
+        self.assertEqual([e.out_port for e in self.table.invalidate_port(5)], [5])
+        self.assertEqual(len(self.table), 0)
+
+    def test_remove_drops_empty_class(self):
+        """Test removing the last flow of a class drops it from lookups"""
+        match = OFMatch(wildcards=OFPFW_ALL & ~OFPFW_IN_PORT, in_port=4)
+        self.table.install(match, 1, priority=7, now=0)
+        self.assertIsNotNone(self.table.remove(match, 7))
+        self.assertEqual(self.table._class_order, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import struct
+import unittest
+from src.openflow.framer import MessageFramer, OFP_MAX_MSG_LEN
+
+
+def _msg(msg_type, xid, body=b''):
+    return struct.pack("!BBHI", 1, msg_type, 8 + len(body), xid) + body
+
+
+class TestMessageFramer(unittest.TestCase):
+    """Test cases for MessageFramer"""
+
+    def setUp(self):
+        self.framer = MessageFramer()
+
+    def test_split_coalesced_messages(self):
+        """Test every complete message in one chunk is returned"""
+        data = _msg(0, 1) + _msg(2, 2, b'ping') + _msg(10, 3, b'x' * 100)
+        self.framer.feed(data)
+
+        msgs = self.framer.messages()
+
+        self.assertEqual([bytes(m) for m in msgs], [_msg(0, 1), _msg(2, 2, b'ping'), _msg(10, 3, b'x' * 100)])
+        self.assertEqual(len(self.framer), 0)
+
+    def test_messages_are_views(self):
+        """Test messages are memoryview slices, not copies"""
+        self.framer.feed(_msg(0, 1))
+        msg, = self.framer.messages()
+        self.assertIsInstance(msg, memoryview)
+
+    def test_partial_message_kept(self):
+        """Test a partial header and body wait for more data"""
+        data = _msg(2, 7, b'abcdef')
+        self.framer.feed(data[:5])
+        self.assertEqual(self.framer.messages(), [])
+        self.framer.feed(data[5:10])
+        self.assertEqual(self.framer.messages(), [])
+        self.framer.feed(data[10:])
+        self.assertEqual([bytes(m) for m in self.framer.messages()], [data])
+
+    def test_compaction_keeps_partial_message(self):
+        """Test a partial message survives moving to the buffer front"""
+        big = _msg(10, 1, b'a' * (OFP_MAX_MSG_LEN - 8))
+        tail = _msg(10, 2, b'b' * 1000)
+        for _ in range(3):
+            self.framer.feed(big)
+            self.assertEqual(len(self.framer.messages()), 1)
+        self.framer.feed(tail[:100])
+        self.assertEqual(self.framer.messages(), [])
+        self.framer.feed(tail[100:])
+        self.assertEqual([bytes(m) for m in self.framer.messages()], [tail])
+
+    def test_invalid_length(self):
+        """Test a length below the header size is rejected"""
+        self.framer.feed(b'\x01\x00\x00\x04\x00\x00\x00\x01')
+        with self.assertRaises(ValueError):
+            self.framer.messages()
+
+
+if __name__ == '__main__':
+    unittest.main()
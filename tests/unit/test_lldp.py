@@ -0,0 +1,35 @@
+import struct
+import unittest
+
+from src.parser.lldp import make_lldp, parse_lldp, ETH_TYPE_LLDP, LLDP_MAC
+
+SRC = bytes.fromhex("0242ac110002")
+
+
+class TestLLDP(unittest.TestCase):
+    """Test cases for the link discovery probe frames"""
+
+    def test_roundtrip(self):
+        """Test a probe decodes to the datapath and port it was built for"""
+        frame = make_lldp(0x1234abcd, 7, SRC)
+        self.assertEqual(frame[:6], LLDP_MAC)
+        self.assertEqual(frame[6:12], SRC)
+        self.assertEqual(struct.unpack("!H", frame[12:14])[0], ETH_TYPE_LLDP)
+        self.assertEqual(len(frame), 60)
+        self.assertEqual(parse_lldp(frame), (0x1234abcd, 7))
+        self.assertEqual(parse_lldp(memoryview(make_lldp(2 ** 64 - 1, 0xfeff, SRC))), (2 ** 64 - 1, 0xfeff))
+
+    def test_foreign_frames_ignored(self):
+        """Test other ethertypes, other speakers' LLDP and truncated probes give None"""
+        frame = make_lldp(1, 2, SRC)
+        self.assertIsNone(parse_lldp(frame[:12] + b"\x08\x00" + frame[14:]))
+        # chassis ID subtype 4 (MAC address), as a host's LLDP agent sends
+        foreign = LLDP_MAC + SRC + b"\x88\xcc" + struct.pack("!HB6s", 1 << 9 | 7, 4, SRC) \
+            + struct.pack("!HB2s", 2 << 9 | 3, 2, b"\x00\x01") + b"\x00\x00"
+        self.assertIsNone(parse_lldp(foreign))
+        self.assertIsNone(parse_lldp(frame[:30]))
+        self.assertIsNone(parse_lldp(frame[:10]))
+
+
+if __name__ == '__main__':
+    unittest.main()
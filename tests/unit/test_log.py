@@ -1,7 +1,8 @@
 import unittest
 from unittest.mock import patch
 from io import StringIO
-from src.utils.log import info, success, error, debug
+from src.utils import log
+from src.utils.log import info, success, error, debug, RateLimiter, ratelimited
 
 
 class TestLogFunctions(unittest.TestCase):
@@ -42,6 +43,89 @@ class TestLogFunctions(unittest.TestCase):
         output = mock_stdout.getvalue()
         self.assertEqual(output, "[*] Connection from 127.0.0.1\n")
 
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_lazy_arguments(self, mock_stdout):
+        """Test %-style arguments are formatted into the message"""
+        info("xid = %d, port = %s", 7, "eth0")
+        self.assertEqual(mock_stdout.getvalue(), "[*] xid = 7, port = eth0\n")
+
+
+class Unprintable:
+    def __repr__(self):
+        raise AssertionError("formatted below the log level")
+
+    __str__ = __repr__
+
+
+class TestLogLevels(unittest.TestCase):
+    """Test cases for level filtering"""
+
+    def tearDown(self):
+        log.set_level(log.DEBUG)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_below_level_not_formatted(self, mock_stdout):
+        """Test messages below the level are neither printed nor formatted"""
+        log.set_level(log.INFO)
+        debug("frame %r", Unprintable())
+        self.assertEqual(mock_stdout.getvalue(), "")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_set_level(self, mock_stdout):
+        """Test raising and lowering the level"""
+        log.set_level(log.ERROR)
+        info("hidden")
+        error("shown")
+        log.set_level(log.DEBUG)
+        self.assertTrue(log.enabled(log.DEBUG))
+        debug("also shown")
+        self.assertEqual(mock_stdout.getvalue(), "[!] shown\n[?] also shown\n")
+
+
+class TestAsyncWriter(unittest.TestCase):
+    """Test cases for the background writer"""
+
+    def test_lines_written_in_order_on_stop(self):
+        """Test queued lines are all written, in order, by stop_async"""
+        stream = StringIO()
+        log.start_async(stream)
+        for i in range(1000):
+            info("line %d", i)
+        log.stop_async()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines, [f"[*] line {i}" for i in range(1000)])
+
+    def test_drops_when_full(self):
+        """Test lines beyond max_pending are dropped and counted"""
+        writer = log.AsyncWriter(StringIO(), max_pending=10)
+        for i in range(15):
+            writer.put(f"{i}\n")
+        self.assertEqual(writer.dropped, 5)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for rate limited logging"""
+
+    def test_token_bucket(self):
+        """Test burst, refill and the suppressed count"""
+        limiter = RateLimiter(rate=1.0, burst=2)
+        self.assertTrue(limiter.allow(now=limiter._last))
+        self.assertTrue(limiter.allow(now=limiter._last))
+        self.assertFalse(limiter.allow(now=limiter._last))
+        self.assertTrue(limiter.allow(now=limiter._last + 1.0))
+        self.assertEqual(limiter.take_suppressed(), 1)
+        self.assertEqual(limiter.take_suppressed(), 0)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_ratelimited_reports_suppressed(self, mock_stdout):
+        """Test the next allowed message reports how many were dropped"""
+        limiter = RateLimiter(rate=0.0, burst=1)
+        for i in range(3):
+            ratelimited(limiter, info, "packet %d", i)
+        limiter.rate = 1e9
+        ratelimited(limiter, info, "packet %d", 3)
+        self.assertEqual(mock_stdout.getvalue(), "[*] packet 0\n[*] packet 3 (2 suppressed)\n")
+
 
 if __name__ == '__main__':
     unittest.main()
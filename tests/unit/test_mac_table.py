@@ -0,0 +1,198 @@
+import unittest
+from src.controller.state.mac_table import MACLearningTable, CompactMACTable, mac_to_int, int_to_mac, mac_to_bytes
+
+A = "02:00:00:00:00:01"
+B = "02:00:00:00:00:02"
+C = "02:00:00:00:00:03"
+
+
+class TestMACLearningTable(unittest.TestCase):
+    """Test cases for MACLearningTable"""
+
+    def setUp(self):
+        self.expired = []
+        self.table = MACLearningTable(timeout_seconds=10, on_expire=lambda e: self.expired.append(e.mac))
+
+    def test_learn_and_lookup(self):
+        """Test a learned MAC is found on its port"""
+        self.table.learn(A, 1, now=0)
+        self.assertEqual(self.table.lookup(A, now=5), 1)
+        self.assertIsNone(self.table.lookup(B, now=5))
+
+    def test_learn_returns_previous_port(self):
+        """Test learn reports the port a known MAC was on, so moves can be detected"""
+        self.assertIsNone(self.table.learn(A, 1, now=0))
+        self.assertEqual(self.table.learn(A, 2, now=1), 1)
+
+    def test_learn_many(self):
+        """Test a burst is learned at one timestamp and moved MACs are reported"""
+        self.table.learn(A, 1, now=0)
+        self.table.learn(B, 2, now=0)
+        self.assertEqual(self.table.learn_many({A: 1, B: 3, C: 4}, now=5), [B])
+        self.assertEqual([self.table.lookup(m, now=14) for m in (A, B, C)], [1, 3, 4])
+        self.assertEqual((self.table.learns, self.table.learn_hits), (5, 2))
+        self.assertEqual(self.table.age_out(now=16), 3)
+
+    def test_learn_many_evicts_at_capacity(self):
+        """Test a burst over max_entries evicts the least recently used"""
+        table = MACLearningTable(timeout_seconds=10, max_entries=2,
+                                 on_expire=lambda e: self.expired.append(e.mac))
+        table.learn(A, 1, now=0)
+        table.learn_many({B: 2, C: 3}, now=1)
+        self.assertEqual(self.expired, [A])
+        self.assertEqual(len(table), 2)
+
+    def test_remove_port(self):
+        """Test a port's MACs are removed through the port index, moves included"""
+        self.table.learn(A, 1, now=0)
+        self.table.learn(B, 1, now=0)
+        self.table.learn(C, 2, now=0)
+        self.table.learn(B, 2, now=1)
+        self.assertEqual(sorted(e.mac for e in self.table.remove_port(2)), [B, C])
+        self.assertEqual(self.table.remove_port(2), [])
+        self.assertEqual(self.table.port_macs(1), {A})
+        self.assertEqual(self.expired, [])
+        self.table.remove(A)
+        self.assertEqual(self.table.port_macs(1), set())
+
+    def test_lookup_expires_lazily(self):
+        """Test lookup drops an entry past its timeout"""
+        self.table.learn(A, 1, now=0)
+        self.assertIsNone(self.table.lookup(A, now=11))
+        self.assertNotIn(A, self.table)
+        self.assertEqual(self.expired, [A])
+
+    def test_age_out(self):
+        """Test age_out expires only stale entries and reports them"""
+        self.table.learn(A, 1, now=0)
+        self.table.learn(B, 2, now=5)
+        self.assertEqual(self.table.age_out(now=10), 0)
+        self.assertEqual(self.table.age_out(now=11), 1)
+        self.assertEqual(self.expired, [A])
+        self.assertEqual(self.table.lookup(B, now=11), 2)
+
+    def test_refresh_postpones_expiry(self):
+        """Test relearning a MAC moves its deadline"""
+        self.table.learn(A, 1, now=0)
+        self.table.learn(A, 3, now=8)
+        self.assertEqual(self.table.age_out(now=11), 0)
+        self.assertEqual(self.table.lookup(A, now=11), 3)
+        self.assertEqual(self.table.age_out(now=19), 1)
+
+    def test_relearn_does_not_grow_expiry_index(self):
+        """Test a MAC relearned on every packet keeps one heap item"""
+        for t in range(1000):
+            self.table.learn(A, 1, now=t * 0.001)
+        self.assertEqual(len(self.table._expiry), 1)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted at capacity"""
+        table = MACLearningTable(timeout_seconds=10, max_entries=2,
+                                 on_expire=lambda e: self.expired.append(e.mac))
+        table.learn(A, 1, now=0)
+        table.learn(B, 2, now=0)
+        table.lookup(A, now=1)
+        table.learn(C, 3, now=2)
+        self.assertEqual(self.expired, [B])
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.lookup(A, now=3), 1)
+        self.assertEqual(table.lookup(C, now=3), 3)
+
+    def test_evicted_then_relearned(self):
+        """Test a stale heap item of an evicted MAC does not expire its new entry"""
+        table = MACLearningTable(timeout_seconds=10, max_entries=1)
+        table.learn(A, 1, now=0)
+        table.learn(B, 2, now=1)
+        table.learn(A, 1, now=5)
+        self.assertEqual(table.age_out(now=11), 0)
+        self.assertEqual(table.lookup(A, now=11), 1)
+
+    def test_clear(self):
+        """Test clear removes all entries"""
+        self.table.learn(A, 1, now=0)
+        self.table.clear()
+        self.assertEqual(len(self.table), 0)
+        self.assertEqual(self.table.age_out(now=100), 0)
+
+
+class TestCompactMACTable(unittest.TestCase):
+    """Test cases for CompactMACTable"""
+
+    def setUp(self):
+        self.expired = []
+        self.table = CompactMACTable(timeout_seconds=10, on_expire=lambda e: self.expired.append(e.mac))
+        self.a, self.b, self.c = mac_to_int(A), mac_to_int(B), mac_to_int(C)
+
+    def test_mac_conversions(self):
+        """Test string, integer and byte MAC conversions round trip"""
+        self.assertEqual(self.a, 0x020000000001)
+        self.assertEqual(int_to_mac(self.a), A)
+        self.assertEqual(mac_to_int(mac_to_bytes(A)), self.a)
+        self.assertEqual(mac_to_bytes(self.a), mac_to_bytes(A))
+        self.assertEqual(CompactMACTable.mac_key(mac_to_bytes(A)), self.a)
+
+    def test_learn_lookup_refresh(self):
+        """Test learn, port moves and lazy expiry on lookup"""
+        self.table.learn(self.a, 1, now=0)
+        self.table.learn(self.a, 4, now=5)
+        self.assertEqual(self.table.lookup(self.a, now=14), 4)
+        self.assertIsNone(self.table.lookup(self.a, now=16))
+        self.assertEqual(self.expired, [self.a])
+        self.assertEqual(len(self.table), 0)
+
+    def test_learn_many(self):
+        """Test a burst appends new MACs to the columns and reports moved ones"""
+        self.table.learn(self.a, 1, now=0)
+        self.assertEqual(self.table.learn_many({self.a: 2, self.b: 3, self.c: 4}, now=5), [self.a])
+        self.assertEqual([self.table.lookup(m, now=14) for m in (self.a, self.b, self.c)], [2, 3, 4])
+        self.assertEqual(self.table.remove(self.b).port, 3)
+        self.assertEqual(self.table.lookup(self.c, now=14), 4)
+        self.assertEqual(self.table.age_out(now=16), 2)
+        self.assertEqual(len(self.table), 0)
+
+    def test_remove_port(self):
+        """Test a port's MACs are removed and the remaining slots stay valid"""
+        self.table.learn(self.a, 1, now=0)
+        self.table.learn_many({self.b: 2, self.c: 1}, now=0)
+        self.table.learn(self.c, 2, now=1)
+        self.assertEqual(sorted(e.mac for e in self.table.remove_port(2)), [self.b, self.c])
+        self.assertEqual(self.table.lookup(self.a, now=2), 1)
+        self.assertEqual(self.table.port_macs(1), {self.a})
+        self.assertEqual(self.table.age_out(now=11), 1)
+        self.assertEqual(self.table.port_macs(1), set())
+
+    def test_remove_keeps_other_slots(self):
+        """Test removing a slot moves the last entry without losing it"""
+        for i, mac in enumerate((self.a, self.b, self.c)):
+            self.table.learn(mac, i + 1, now=0)
+        self.assertEqual(self.table.remove(self.a).port, 1)
+        self.assertEqual(self.table.lookup(self.b, now=1), 2)
+        self.assertEqual(self.table.lookup(self.c, now=1), 3)
+        self.assertNotIn(self.a, self.table)
+
+    def test_age_out(self):
+        """Test age_out expires only entries past their deadline"""
+        self.table.learn(self.a, 1, now=0)
+        self.table.learn(self.b, 2, now=5)
+        self.table.learn(self.c, 3, now=0)
+        self.table.learn(self.c, 3, now=6)
+        self.assertEqual(self.table.age_out(now=11), 1)
+        self.assertEqual(self.expired, [self.a])
+        self.assertEqual(self.table.age_out(now=16), 1)
+        self.assertEqual(self.table.age_out(now=17), 1)
+        self.assertEqual(len(self.table), 0)
+
+    def test_capacity_evicts_oldest_learned(self):
+        """Test the least recently learned entry is evicted at capacity"""
+        table = CompactMACTable(timeout_seconds=10, max_entries=2,
+                                on_expire=lambda e: self.expired.append(e.mac))
+        table.learn(self.a, 1, now=0)
+        table.learn(self.b, 2, now=1)
+        table.learn(self.a, 1, now=2)
+        table.learn(self.c, 3, now=3)
+        self.assertEqual(self.expired, [self.b])
+        self.assertEqual(table.lookup(self.a, now=4), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import struct
+import unittest
+import urllib.request
+from unittest.mock import MagicMock, patch
+from src.controller.connection import Connection
+from src.controller.controller import Controller
+from src.controller.metrics import ControllerMetrics
+from src.openflow.openflow import parse_features_reply
+from src.utils.metrics import Exposition, Histogram, Metrics, MetricsServer
+from tests.unit.helpers import FakeSocket
+
+
+class TestHistogram(unittest.TestCase):
+    """Test cases for Histogram and its exposition"""
+
+    def test_log2_buckets(self):
+        """Test values land in the bucket of their bit length"""
+        hist = Histogram()
+        for ns in (0, 1, 1000, 1023, 1024, (1 << 63) - 1):
+            hist.observe(ns)
+        self.assertEqual(hist.counts[0], 1)
+        self.assertEqual(hist.counts[10], 2)
+        self.assertEqual(hist.counts[11], 1)
+        self.assertEqual(hist.counts[-1], 1)
+        self.assertEqual(hist.count, 6)
+
+    def test_metrics_snapshot(self):
+        """Test per-type histograms are kept apart in the flat lists"""
+        metrics = Metrics()
+        metrics.observe(10, 0, 1500, 1600)
+        metrics.observe(2, 0, 100, 5000)
+        waited = metrics.receive_to_dispatch(10)
+        self.assertEqual((waited.count, waited.sum, waited.counts[11]), (1, 1500, 1))
+        self.assertEqual(metrics.dispatch_to_reply(2).counts[13], 1)
+
+    def test_exposition_is_cumulative(self):
+        """Test exposed buckets are cumulative and end with +Inf"""
+        hist = Histogram()
+        for ns in (500, 1500, 3000):
+            hist.observe(ns)
+        out = Exposition()
+        out.histogram("x_seconds", hist, "help", type="ECHO")
+        lines = out.text().splitlines()
+        self.assertEqual(lines[:2], ["# HELP x_seconds help", "# TYPE x_seconds histogram"])
+        self.assertIn('x_seconds_bucket{type="ECHO",le="1.024e-06"} 1', lines)
+        self.assertIn('x_seconds_bucket{type="ECHO",le="2.048e-06"} 2', lines)
+        self.assertIn('x_seconds_bucket{type="ECHO",le="+Inf"} 3', lines)
+        self.assertIn('x_seconds_count{type="ECHO"} 3', lines)
+
+
+class TestControllerMetrics(unittest.TestCase):
+    """Test cases for the controller metrics and their endpoint"""
+
+    def setUp(self):
+        self.ctrl = Controller(host='127.0.0.1', port=0)
+        self.ctrl._selector = MagicMock()
+        # time every message
+        self.ctrl.metrics = Metrics(latency_sample=1)
+
+    def test_dispatch_is_counted(self):
+        """Test dispatched messages and connection traffic show up in a scrape"""
+        echo = b'\x01\x02\x00\x08\x00\x00\x00\x09'
+        features = struct.pack("!BBHIQIB3xII", 1, 6, 32, 1, 1, 256, 1, 0, 0)
+        conn = Connection(FakeSocket([features + echo]), ('127.0.0.1', 5000), set())
+        self.ctrl.connections[1] = conn
+        with patch('sys.stdout'):
+            self.ctrl._on_readable(conn)
+        self.assertEqual((conn.messages_in, conn.bytes_in), (2, 40))
+        self.assertEqual((conn.messages_out, conn.bytes_out), (1, 8))
+        self.assertEqual(self.ctrl.metrics.messages[2], 1)
+
+        text = ControllerMetrics(self.ctrl).render()
+        self.assertIn('openflow_messages_total{type="ECHO_REQUEST"} 1', text)
+        self.assertIn('openflow_dispatch_to_reply_seconds_count{type="FEATURES_REPLY"} 1', text)
+        self.assertIn('openflow_connection_received_bytes_total{peer="127.0.0.1:5000",dpid="0x1"} 40', text)
+        self.assertIn('openflow_mac_table_entries{dpid="0x1"} 0', text)
+        self.assertIn('openflow_packet_in_admission_total{result="admitted"} 0', text)
+        self.assertIn('openflow_topology_links 0', text)
+        self.assertIn('openflow_arp_cache_entries{dpid="0x1"} 0', text)
+        self.assertIn('openflow_lldp_probes_total{direction="sent"} 0', text)
+
+    def test_latency_sampling(self):
+        """Test every message is counted but only one in latency_sample is timed"""
+        self.ctrl.metrics = Metrics(latency_sample=4)
+        echo = b'\x01\x02\x00\x08\x00\x00\x00\x09'
+        conn = Connection(FakeSocket([echo * 8]), ('127.0.0.1', 5000), set())
+        self.ctrl._on_readable(conn)
+        self.assertEqual(self.ctrl.metrics.messages[2], 8)
+        self.assertEqual(self.ctrl.metrics.receive_to_dispatch(2).count, 2)
+
+    def test_rates_between_scrapes(self):
+        """Test per-connection rates appear from the second scrape on"""
+        conn = Connection(FakeSocket([]), ('127.0.0.1', 5000), set())
+        self.ctrl.connections[1] = conn
+        exporter = ControllerMetrics(self.ctrl)
+        self.assertNotIn("per_second", exporter.render())
+        conn.messages_in = 10
+        self.assertIn("openflow_connection_received_messages_per_second", exporter.render())
+
+    def test_hit_ratio(self):
+        """Test MAC lookup hit ratio per datapath"""
+        body = struct.pack("!QIB3xII", 7, 256, 1, 0, 0)
+        with patch('sys.stdout'):
+            dp = self.ctrl.datapaths.register(parse_features_reply(body))
+        dp.mac_table.learn("02:00:00:00:00:01", 1)
+        dp.mac_table.lookup("02:00:00:00:00:01")
+        dp.mac_table.lookup("02:00:00:00:00:02")
+        text = ControllerMetrics(self.ctrl).render()
+        self.assertIn('openflow_mac_lookup_hit_ratio{dpid="0x7"} 0.5', text)
+        self.assertIn('openflow_mac_lookup_total{dpid="0x7",result="miss"} 1', text)
+
+    def test_http_endpoint(self):
+        """Test the endpoint serves the exposition over HTTP"""
+        server = MetricsServer(lambda: "up 1\n", port=0)
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as resp:
+                self.assertEqual(resp.read(), b"up 1\n")
+        finally:
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,20 +1,56 @@
+import struct
+import time
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+from src.controller.admission import AdmissionControl
+from src.controller.state.datapath import DatapathRegistry
+from src.controller.state.topology import Topology
+from src.utils.metrics import Metrics
+from src.openflow.match import match_l2
+from src.parser.ethernet import parse_ethernet
+from tests.unit.helpers import ethernet_frame, packet_in_parsed
 from src.openflow.openflow import (
     OFHeader,
     packheader,
     parseheader,
     make_hello,
     make_features_request,
+    make_packet_out,
+    make_flow_mod,
+    make_echo_reply,
+    parse_features_reply,
+    parse_packet_in,
+    MESSAGE_SPECS,
+    MessageTemplates,
+    FLOW_IDLE_TIMEOUT,
+    FLOW_HARD_TIMEOUT,
     dispatcher,
+    dispatch_batch,
     OFPT_HELLO,
     OFPT_FEATURES_REQUEST,
     OFPT_FEATURES_REPLY,
     OFPT_PACKET_IN,
+    OFPT_PACKET_OUT,
+    OFPT_FLOW_MOD,
     OFPT_ECHO_REQUEST,
+    OFPT_PORT_STATUS,
+    OFPP_FLOOD,
+    OFP_NO_BUFFER,
+    OFPFC_ADD,
+    OFPFC_DELETE,
+    OFPPR_ADD,
+    OFPPR_DELETE,
+    OFPPR_MODIFY,
+    OFPPS_LINK_DOWN,
+    parse_port_status,
 )
 
 
+def make_frame(src, dst):
+    """ethernet_frame() between two MACs written as strings"""
+    return ethernet_frame(bytes.fromhex(src.replace(":", "")), bytes.fromhex(dst.replace(":", "")))
+
+
 class TestOFHeader(unittest.TestCase):
     """Test cases for OFHeader dataclass"""
 
@@ -116,5 +152,483 @@ class TestDispatcher(unittest.TestCase):
         self.mock_conn.send.assert_called_once()
 
 
+def make_phy_port(port_no, name):
+    return struct.pack("!H6s16sIIIIII", port_no, bytes([2, 0, 0, 0, 0, port_no]), name.encode(),
+                       0, 1, 0xc0, 0, 0, 0)
+
+
+class TestCodec(unittest.TestCase):
+    """Test cases for struct-based decoding and encoding"""
+
+    def test_parse_features_reply_ports(self):
+        """Test ports are decoded from a memoryview body in place"""
+        body = struct.pack("!QIB3xII", 0xabc, 256, 2, 0xc7, 0xfff) + make_phy_port(1, "eth1") + make_phy_port(2, "eth2")
+        features = parse_features_reply(memoryview(body))
+        self.assertEqual(features.datapath_id, 0xabc)
+        self.assertEqual((features.n_buffers, features.n_tables, features.capabilities), (256, 2, 0xc7))
+        self.assertEqual([p.port_no for p in features.ports], [1, 2])
+        self.assertEqual(features.ports[1].name, "eth2")
+        self.assertEqual(features.ports[1].hw_addr, "02:00:00:00:00:02")
+        self.assertEqual(features.ports[0].state, 1)
+
+    def test_parse_packet_in(self):
+        """Test PACKET_IN fields and frame data"""
+        body = struct.pack("!IHHBx", 7, 4, 3, 1) + b'abcd'
+        pktin = parse_packet_in(memoryview(body))
+        self.assertEqual((pktin.buffer_id, pktin.total_len, pktin.in_port, pktin.reason), (7, 4, 3, 1))
+        self.assertEqual(bytes(pktin.data), b'abcd')
+
+    def test_spec_round_trip(self):
+        """Test a spec decodes what it encodes"""
+        spec = MESSAGE_SPECS[OFPT_PACKET_IN]
+        msg = spec.encode(5, 7, 4, 3, 1, tail=b'abcd')
+        header, body = parseheader(msg)
+        self.assertEqual((header.msg_type, header.length, header.xid), (OFPT_PACKET_IN, 22, 5))
+        self.assertEqual(spec.decode(body), (7, 4, 3, 1))
+
+    def test_echo_reply_echoes_data(self):
+        """Test the echo reply carries the request data and a matching length"""
+        header = OFHeader(version=1, msg_type=OFPT_ECHO_REQUEST, length=12, xid=9)
+        reply = make_echo_reply(header, b'ping')
+        self.assertEqual(reply, b'\x01\x03\x00\x0c\x00\x00\x00\x09ping')
+
+
+class TestForwardingMessages(unittest.TestCase):
+    """Test cases for PACKET_OUT and FLOW_MOD builders"""
+
+    def test_make_packet_out_unbuffered(self):
+        """Test PACKET_OUT carries the frame when nothing is buffered"""
+        msg = make_packet_out(7, OFP_NO_BUFFER, 1, OFPP_FLOOD, b'frame')
+        version, msg_type, length, xid = struct.unpack("!BBHI", msg[:8])
+        self.assertEqual((msg_type, length, xid), (OFPT_PACKET_OUT, len(msg), 7))
+        buffer_id, in_port, actions_len = struct.unpack("!IHH", msg[8:16])
+        self.assertEqual((buffer_id, in_port, actions_len), (OFP_NO_BUFFER, 1, 8))
+        self.assertEqual(struct.unpack("!HHHH", msg[16:24]), (0, 8, OFPP_FLOOD, 0))
+        self.assertEqual(msg[24:], b'frame')
+
+    def test_make_packet_out_buffered(self):
+        """Test PACKET_OUT omits data when the switch buffered the frame"""
+        msg = make_packet_out(7, 42, 1, 2, b'frame')
+        self.assertEqual(len(msg), 24)
+        self.assertEqual(struct.unpack("!I", msg[8:12])[0], 42)
+
+    def test_make_flow_mod(self):
+        """Test FLOW_MOD layout: header, match, fields, output action"""
+        match = match_l2(1, b'\x02' * 6, b'\x04' * 6)
+        msg = make_flow_mod(9, match, OFPFC_ADD, 2, idle_timeout=10, hard_timeout=30, buffer_id=5)
+        version, msg_type, length, xid = struct.unpack("!BBHI", msg[:8])
+        self.assertEqual((msg_type, length, xid), (OFPT_FLOW_MOD, 80, 9))
+        self.assertEqual(len(msg), 80)
+        cookie, command, idle, hard, prio, buffer_id, out_port, flags = struct.unpack("!QHHHHIHH", msg[48:72])
+        self.assertEqual((command, idle, hard, buffer_id), (OFPFC_ADD, 10, 30, 5))
+        self.assertEqual(struct.unpack("!HHHH", msg[72:80]), (0, 8, 2, 0))
+
+
+class TestMessageTemplates(unittest.TestCase):
+    """Test the pre-encoded templates produce the same bytes as the builders"""
+
+    def setUp(self):
+        self.templates = MessageTemplates()
+
+    def test_header_only(self):
+        """Test HELLO and FEATURES_REQUEST for several xids"""
+        for xid in (0, 1, 0x1234, 0xffffffff):
+            self.assertEqual(self.templates.hello(xid), make_hello(xid))
+            self.assertEqual(self.templates.features_request(xid), make_features_request(xid))
+
+    def test_echo_reply(self):
+        """Test ECHO_REPLY with and without data, in either order"""
+        for xid, data in ((3, b'ping'), (4, b''), (5, b'longer payload')):
+            header = OFHeader(version=1, msg_type=OFPT_ECHO_REQUEST, length=8 + len(data), xid=xid)
+            self.assertEqual(self.templates.echo_reply(xid, data), make_echo_reply(header, data))
+
+    def test_packet_out(self):
+        """Test buffered, unbuffered and flood PACKET_OUTs after each other"""
+        cases = (
+            (1, OFP_NO_BUFFER, 1, OFPP_FLOOD, b'frame'),
+            (2, 42, 3, OFPP_FLOOD, b'frame'),
+            (3, 43, 2, 7, b''),
+            (4, OFP_NO_BUFFER, 5, 6, memoryview(b'another frame')),
+        )
+        for xid, buffer_id, in_port, out_port, data in cases:
+            self.assertEqual(self.templates.packet_out(xid, buffer_id, in_port, out_port, data),
+                             make_packet_out(xid, buffer_id, in_port, out_port, data))
+
+    def test_flow_mod_output(self):
+        """Test the output FLOW_MOD against make_flow_mod with match_l2"""
+        for xid, in_port, out_port, buffer_id in ((1, 1, 2, 5), (2, 7, 3, OFP_NO_BUFFER)):
+            src, dst = bytes([2, 0, 0, 0, 0, in_port]), bytes([2, 0, 0, 0, 0, out_port])
+            expected = make_flow_mod(xid, match_l2(in_port, src, dst), OFPFC_ADD, out_port,
+                                     idle_timeout=FLOW_IDLE_TIMEOUT, hard_timeout=FLOW_HARD_TIMEOUT,
+                                     buffer_id=buffer_id)
+            self.assertEqual(self.templates.flow_mod_output(xid, in_port, src, dst, out_port, buffer_id), expected)
+
+    def test_returns_copy(self):
+        """Test a message patched into a shared buffer is not changed by the next call"""
+        first = self.templates.hello(1)
+        self.templates.hello(2)
+        self.assertEqual(first, make_hello(1))
+        first = self.templates.packet_out(1, 42, 3, OFPP_FLOOD, b'frame')
+        self.templates.packet_out(2, OFP_NO_BUFFER, 5, 7, b'other')
+        self.assertEqual(first, make_packet_out(1, 42, 3, OFPP_FLOOD, b'frame'))
+        src, dst = bytes([2, 0, 0, 0, 0, 1]), bytes([2, 0, 0, 0, 0, 2])
+        first = self.templates.flow_mod_output(1, 1, src, dst, 2, 5)
+        self.templates.flow_mod_output(2, 4, dst, src, 3, OFP_NO_BUFFER)
+        self.assertEqual(first, make_flow_mod(1, match_l2(1, src, dst), OFPFC_ADD, 2, idle_timeout=FLOW_IDLE_TIMEOUT,
+                                              hard_timeout=FLOW_HARD_TIMEOUT, buffer_id=5))
+
+
+def make_port_status(reason, port_no, state=0, config=0):
+    port = struct.pack("!H6s16sIIIIII", port_no, bytes(6), b"eth%d" % port_no, config, state, 0, 0, 0, 0)
+    return struct.pack("!B7x", reason) + port
+
+
+class TestPortStatus(unittest.TestCase):
+    """Test cases for PORT_STATUS parsing and purging a port that went down"""
+
+    A = "02:00:00:00:00:01"
+    B = "02:00:00:00:00:02"
+
+    def setUp(self):
+        self.ctrl = MagicMock()
+        self.ctrl.datapaths = DatapathRegistry(arp_timeout_seconds=60.0)
+        self.ctrl.metrics = None
+        self.ctrl.topology = Topology()
+        self.ctrl.discovery = None
+        self.ctrl.next_xid.return_value = 9
+        self.conn = MagicMock()
+        body = struct.pack("!QIB3xII", 1, 256, 1, 0, 0) + make_port_status(0, 1)[8:] + make_port_status(0, 2)[8:]
+        dispatcher(self.ctrl, self.conn, OFHeader(1, OFPT_FEATURES_REPLY, 8 + len(body), 1), body)
+        self.dp = self.conn.datapath
+
+    def _port_status(self, *args, **kwargs):
+        self.conn.send.reset_mock()
+        body = make_port_status(*args, **kwargs)
+        dispatcher(self.ctrl, self.conn, OFHeader(1, OFPT_PORT_STATUS, 8 + len(body), 2), body)
+        return [c.args[0] for c in self.conn.send.call_args_list]
+
+    def test_parse(self):
+        """Test reason and port description are decoded"""
+        status = parse_port_status(make_port_status(OFPPR_MODIFY, 3, state=OFPPS_LINK_DOWN))
+        self.assertEqual((status.reason, status.port.port_no, status.port.name), (OFPPR_MODIFY, 3, "eth3"))
+        self.assertEqual(status.port.state, OFPPS_LINK_DOWN)
+        with self.assertRaises(ValueError):
+            parse_port_status(make_port_status(OFPPR_ADD, 3)[:20])
+
+    def test_add_and_delete_update_ports(self):
+        """Test added ports are recorded and deleted ones forgotten"""
+        self._port_status(OFPPR_ADD, 3)
+        self.assertEqual(sorted(self.dp.ports), [1, 2, 3])
+        self._port_status(OFPPR_DELETE, 1)
+        self.assertEqual(sorted(self.dp.ports), [2, 3])
+
+    def test_link_down_purges_port(self):
+        """Test a port going down forgets its MACs and flows and deletes them on the switch"""
+        a, b = bytes.fromhex(self.A.replace(":", "")), bytes.fromhex(self.B.replace(":", ""))
+        self.dp.mac_table.learn(self.A, 1)
+        self.dp.mac_table.learn(self.B, 2)
+        self.dp.flow_table.install_l2(1, a, b, 2, 0x8000)
+        self.dp.flow_table.install_l2(2, b, a, 1, 0x8000)
+        self.assertEqual(self._port_status(OFPPR_MODIFY, 2), [])
+        sent = self._port_status(OFPPR_MODIFY, 2, state=OFPPS_LINK_DOWN)
+        self.assertIsNone(self.dp.mac_table.lookup(self.B))
+        self.assertEqual(self.dp.mac_table.lookup(self.A), 1)
+        self.assertEqual(len(self.dp.flow_table), 0)
+        self.assertEqual([m[1] for m in sent], [OFPT_FLOW_MOD, OFPT_FLOW_MOD])
+        self.assertEqual([struct.unpack("!H", m[56:58])[0] for m in sent], [OFPFC_DELETE] * 2)
+        # out_port filter on the first, in_port match on the second
+        self.assertEqual(struct.unpack("!H", sent[0][68:70])[0], 2)
+        self.assertEqual(struct.unpack("!H", sent[1][12:14])[0], 2)
+
+
+class TestPacketInForwarding(unittest.TestCase):
+    """Test cases for the learning switch in handler_packet_in"""
+
+    A = "02:00:00:00:00:01"
+    B = "02:00:00:00:00:02"
+
+    def setUp(self):
+        self.ctrl = MagicMock()
+        self.ctrl.datapaths = DatapathRegistry(arp_timeout_seconds=60.0)
+        self.ctrl.metrics = None
+        self.ctrl.topology = Topology()
+        self.ctrl.discovery = None
+        self.xid = iter(range(100, 200))
+        self.ctrl.next_xid.side_effect = lambda: next(self.xid)
+        self.conn = MagicMock()
+        # FEATURES_REPLY for dpid 1 with no ports
+        body = struct.pack("!QIB3xII", 1, 256, 1, 0, 0)
+        header = OFHeader(version=1, msg_type=OFPT_FEATURES_REPLY, length=8 + len(body), xid=1)
+        dispatcher(self.ctrl, self.conn, header, body)
+        self.mac_table = self.conn.datapath.mac_table
+
+    def _packet_in(self, in_port, src, dst, buffer_id=OFP_NO_BUFFER):
+        dispatcher(self.ctrl, self.conn, *packet_in_parsed(in_port, make_frame(src, dst), buffer_id))
+        return [c.args[0] for c in self.conn.send.call_args_list]
+
+    def test_unknown_destination_floods(self):
+        """Test an unknown destination is flooded and the source learned"""
+        sent = self._packet_in(1, self.A, self.B, buffer_id=3)
+        self.assertEqual(self.mac_table.lookup(self.A), 1)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0][1], OFPT_PACKET_OUT)
+        self.assertEqual(struct.unpack("!IHH", sent[0][8:16]), (3, 1, 8))
+        self.assertEqual(struct.unpack("!H", sent[0][20:22])[0], OFPP_FLOOD)
+
+    def test_broadcast_floods(self):
+        """Test broadcast is flooded even if ff:ff:.. were somehow learned"""
+        self.mac_table.learn("ff:ff:ff:ff:ff:ff", 3)
+        sent = self._packet_in(1, self.A, "ff:ff:ff:ff:ff:ff")
+        self.assertEqual(sent[0][1], OFPT_PACKET_OUT)
+
+    def test_coalesced_miss_releases_buffer(self):
+        """Test a repeated unicast miss is not flooded again but its buffer is freed"""
+        self.ctrl.admission = AdmissionControl()
+        self._packet_in(1, self.A, self.B, buffer_id=3)
+        self.conn.send.reset_mock()
+        sent = self._packet_in(1, self.A, self.B, buffer_id=4)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(struct.unpack("!HIHH", sent[0][2:4] + sent[0][8:16]), (16, 4, 1, 0))
+        self.assertEqual(self.ctrl.admission.stats.coalesced, 1)
+
+    def test_repeated_broadcast_flooded(self):
+        """Test every broadcast from a host is flooded, however close together"""
+        self.ctrl.admission = AdmissionControl()
+        self._packet_in(1, self.A, "ff:ff:ff:ff:ff:ff")
+        sent = self._packet_in(1, self.A, "ff:ff:ff:ff:ff:ff")
+        self.assertEqual([struct.unpack("!H", m[20:22])[0] for m in sent], [OFPP_FLOOD, OFPP_FLOOD])
+
+    def test_known_destination_installs_flow(self):
+        """Test a known destination installs a flow that releases the buffer"""
+        self.mac_table.learn(self.B, 2)
+        sent = self._packet_in(1, self.A, self.B, buffer_id=3)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0][1], OFPT_FLOW_MOD)
+        self.assertEqual(struct.unpack("!I", sent[0][64:68])[0], 3)
+        self.assertEqual(struct.unpack("!H", sent[0][76:78])[0], 2)
+
+    def test_known_destination_unbuffered(self):
+        """Test an unbuffered packet is also sent out with a PACKET_OUT"""
+        self.mac_table.learn(self.B, 2)
+        sent = self._packet_in(1, self.A, self.B)
+        self.assertEqual([m[1] for m in sent], [OFPT_FLOW_MOD, OFPT_PACKET_OUT])
+
+    def test_before_features_reply_floods(self):
+        """Test a PACKET_IN before the FEATURES_REPLY floods without learning"""
+        self.conn.datapath = None
+        sent = self._packet_in(1, self.A, self.B)
+        self.assertEqual(sent[0][1], OFPT_PACKET_OUT)
+        self.assertIsNone(self.mac_table.lookup(self.A))
+
+    def test_compact_mac_table(self):
+        """Test forwarding with integer-keyed compact MAC tables"""
+        self.ctrl.datapaths = DatapathRegistry(compact_mac_tables=True)
+        body = struct.pack("!QIB3xII", 2, 256, 1, 0, 0)
+        header = OFHeader(version=1, msg_type=OFPT_FEATURES_REPLY, length=8 + len(body), xid=1)
+        dispatcher(self.ctrl, self.conn, header, body)
+        self._packet_in(2, self.B, self.A)
+        self.conn.send.reset_mock()
+        sent = self._packet_in(1, self.A, self.B)
+        self.assertEqual(sent[0][1], OFPT_FLOW_MOD)
+        self.assertEqual(self.conn.datapath.mac_table.lookup(0x020000000001), 1)
+
+    def test_duplicate_flow_suppressed(self):
+        """Test a burst for the same flow sends one FLOW_MOD and then only releases buffers"""
+        self.mac_table.learn(self.B, 2)
+        self._packet_in(1, self.A, self.B, buffer_id=3)
+        sent = self._packet_in(1, self.A, self.B, buffer_id=4)
+        self.assertEqual([m[1] for m in sent], [OFPT_FLOW_MOD, OFPT_PACKET_OUT])
+        self.assertEqual(struct.unpack("!IH", sent[1][8:14]), (4, 1))
+        self.assertEqual(struct.unpack("!H", sent[1][20:22])[0], 2)
+        self.assertEqual(self.conn.datapath.flow_table.suppressed, 1)
+
+    def test_moved_mac_invalidates_flows(self):
+        """Test flows towards a host are deleted when it shows up on another port"""
+        self.mac_table.learn(self.B, 2)
+        self._packet_in(1, self.A, self.B, buffer_id=3)
+        self.conn.send.reset_mock()
+        sent = self._packet_in(5, self.B, self.A, buffer_id=4)
+        self.assertEqual(sent[0][1], OFPT_FLOW_MOD)
+        self.assertEqual(struct.unpack("!H", sent[0][56:58])[0], OFPFC_DELETE)
+        self.assertEqual(sent[0][20:26], bytes.fromhex(self.B.replace(":", "")))
+        self.assertEqual(len(self.conn.datapath.flow_table), 1)
+
+    def test_moved_mac_deletes_aged_out_flows(self):
+        """Test a move deletes flows on the switch even after the shadow table aged them out"""
+        self.mac_table.learn(self.B, 2)
+        self._packet_in(1, self.A, self.B, buffer_id=3)
+        flow_table = self.conn.datapath.flow_table
+        flow_table.age_out(time.time() + FLOW_IDLE_TIMEOUT + 1)
+        self.assertEqual(len(flow_table), 0)
+        for move in (lambda: self._packet_in(5, self.B, self.A, buffer_id=4),
+                     lambda: self._batch((6, self.B, self.A, 5), (6, self.B, self.A, 6))):
+            self.conn.send.reset_mock()
+            sent = move()
+            self.assertEqual(struct.unpack("!H", sent[0][56:58])[0], OFPFC_DELETE)
+            self.assertEqual(sent[0][20:26], bytes.fromhex(self.B.replace(":", "")))
+
+    def test_same_port_dropped(self):
+        """Test nothing is sent when the destination is on the ingress port"""
+        self.mac_table.learn(self.B, 1)
+        self.assertEqual(self._packet_in(1, self.A, self.B), [])
+
+    def test_same_port_releases_buffer(self):
+        """Test a buffered packet for a host on the ingress port has its buffer freed"""
+        self.mac_table.learn(self.B, 1)
+        sent = self._packet_in(1, self.A, self.B, buffer_id=3)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(struct.unpack("!HIHH", sent[0][2:4] + sent[0][8:16]), (16, 3, 1, 0))
+
+    def _batch(self, *packet_ins):
+        batch = [packet_in_parsed(in_port, make_frame(src, dst), buffer_id)
+                 for in_port, src, dst, buffer_id in packet_ins]
+        dispatch_batch(self.ctrl, self.conn, OFPT_PACKET_IN, batch)
+        return [c.args[0] for c in self.conn.send.call_args_list]
+
+    def test_batch_learns_whole_read_first(self):
+        """Test a batch forwards to a host whose first packet is later in the same read"""
+        sent = self._batch((1, self.A, self.B, 3), (2, self.B, self.A, 4))
+        self.assertEqual([m[1] for m in sent], [OFPT_FLOW_MOD, OFPT_FLOW_MOD])
+        self.assertEqual([struct.unpack("!H", m[76:78])[0] for m in sent], [2, 1])
+        self.assertEqual((self.mac_table.learns, self.mac_table.learn_hits), (2, 0))
+
+    def test_batch_moved_mac_invalidates_flows(self):
+        """Test a batch deletes flows towards a host seen on a new port"""
+        self.mac_table.learn(self.B, 2)
+        self._packet_in(1, self.A, self.B, buffer_id=3)
+        self.conn.send.reset_mock()
+        sent = self._batch((5, self.B, self.A, 4), (5, self.B, "ff:ff:ff:ff:ff:ff", 5))
+        self.assertEqual(struct.unpack("!H", sent[0][56:58])[0], OFPFC_DELETE)
+        self.assertEqual([m[1] for m in sent[1:]], [OFPT_FLOW_MOD, OFPT_PACKET_OUT])
+        self.assertEqual(self.mac_table.lookup(self.B), 5)
+
+    def test_batch_skips_runt(self):
+        """Test a runt PACKET_IN in a batch is dropped without failing the others"""
+        self.mac_table.learn(self.B, 2)
+        body = struct.pack("!IHHBx", 9, 4, 1, 0) + b'\x00' * 4
+        runt = (OFHeader(version=1, msg_type=OFPT_PACKET_IN, length=8 + len(body), xid=1), body)
+        with patch('sys.stdout'):
+            dispatch_batch(self.ctrl, self.conn, OFPT_PACKET_IN,
+                           [runt, packet_in_parsed(1, make_frame(self.A, self.B), 3)])
+        sent = [c.args[0] for c in self.conn.send.call_args_list]
+        # the runt's buffer is freed, the valid packet gets its flow
+        self.assertEqual(struct.unpack("!HIHH", sent[0][2:4] + sent[0][8:16]), (16, 9, 1, 0))
+        self.assertEqual(sent[1][1], OFPT_FLOW_MOD)
+        self.assertEqual(self.mac_table.lookup(self.A), 1)
+
+    def test_single_runt_dropped(self):
+        """Test a runt PACKET_IN alone in its read is dropped and its buffer freed"""
+        body = struct.pack("!IHHBx", 9, 10, 1, 0) + b'\x00' * 10
+        header = OFHeader(version=1, msg_type=OFPT_PACKET_IN, length=8 + len(body), xid=1)
+        with patch('sys.stdout'):
+            dispatch_batch(self.ctrl, self.conn, OFPT_PACKET_IN, [(header, body)])
+        sent = [c.args[0] for c in self.conn.send.call_args_list]
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(struct.unpack("!HIHH", sent[0][2:4] + sent[0][8:16]), (16, 9, 1, 0))
+        self.assertIsNone(self.mac_table.lookup(self.A))
+
+    def test_truncated_vlan_tag_logged(self):
+        """Test a frame cut off inside a VLAN tag is logged and flooded on both paths"""
+        frame = bytes.fromhex("ffffffffffff020000000001") + struct.pack("!HH", 0x8100, 100)
+        packet = packet_in_parsed(1, frame)
+        for batch in ([packet], [packet, packet]):
+            self.conn.send.reset_mock()
+            with patch('src.openflow.openflow.ratelimited', side_effect=lambda _, fn, msg, *args: msg % args):
+                dispatch_batch(self.ctrl, self.conn, OFPT_PACKET_IN, batch)
+            sent = [c.args[0] for c in self.conn.send.call_args_list]
+            self.assertEqual([struct.unpack("!H", m[20:22])[0] for m in sent], [OFPP_FLOOD] * len(batch))
+
+    def test_batch_before_features_reply_floods(self):
+        """Test a batch from a switch without a datapath floods every packet"""
+        self.conn.datapath = None
+        sent = self._batch((1, self.A, self.B, 3), (2, self.B, self.A, 4))
+        self.assertEqual([struct.unpack("!IH", m[8:14]) for m in sent], [(3, 1), (4, 2)])
+
+    def _arp(self, in_port, opcode, src, src_ip, target_ip, dst="ff:ff:ff:ff:ff:ff", buffer_id=OFP_NO_BUFFER):
+        sha = bytes.fromhex(src.replace(":", ""))
+        frame = bytes.fromhex(dst.replace(":", "")) + sha + b'\x08\x06' + struct.pack(
+            "!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, opcode, sha, bytes(src_ip), bytes(6), bytes(target_ip))
+        frame += bytes(60 - len(frame))
+        return packet_in_parsed(in_port, frame, buffer_id)
+
+    def test_arp_request_answered_from_cache(self):
+        """Test a request for a learned address is answered out of the ingress port, not flooded"""
+        dispatcher(self.ctrl, self.conn, *self._arp(2, 2, self.B, [10, 0, 0, 2], [10, 0, 0, 1], dst=self.A))
+        self.conn.send.reset_mock()
+        dispatcher(self.ctrl, self.conn, *self._arp(1, 1, self.A, [10, 0, 0, 1], [10, 0, 0, 2], buffer_id=7))
+        sent = [c.args[0] for c in self.conn.send.call_args_list]
+        self.assertEqual([m[1] for m in sent], [OFPT_PACKET_OUT, OFPT_PACKET_OUT])
+        self.assertEqual(struct.unpack("!IHH", sent[0][8:14] + sent[0][20:22]), (OFP_NO_BUFFER, 0xffff, 1))
+        reply = parse_ethernet(sent[0][24:])
+        self.assertEqual((reply.dst, reply.src), (self.A, self.B))
+        self.assertEqual((reply.arp.opcode, reply.arp.sender_mac, reply.arp.sender_ip, reply.arp.target_ip),
+                         (2, self.B, "10.0.0.2", "10.0.0.1"))
+        # the buffered request is released without actions
+        self.assertEqual(struct.unpack("!HIHH", sent[1][2:4] + sent[1][8:16]), (16, 7, 1, 0))
+        self.assertEqual(self.conn.datapath.arp_cache.answered, 1)
+
+    def test_arp_unknown_or_gratuitous_flooded(self):
+        """Test requests for unknown addresses and gratuitous ARP are flooded and learned"""
+        sent = self._packet_in_msg(*self._arp(1, 1, self.A, [10, 0, 0, 1], [10, 0, 0, 9]))
+        self.assertEqual(struct.unpack("!H", sent[0][20:22])[0], OFPP_FLOOD)
+        sent = self._packet_in_msg(*self._arp(2, 1, self.B, [10, 0, 0, 2], [10, 0, 0, 2]))
+        self.assertEqual(struct.unpack("!H", sent[0][20:22])[0], OFPP_FLOOD)
+        self.assertEqual(self.conn.datapath.arp_cache.lookup(bytes([10, 0, 0, 2])), bytes.fromhex("020000000002"))
+        self.assertEqual(self.conn.datapath.arp_cache.answered, 0)
+
+    def test_arp_flood_echo_not_answered(self):
+        """Test copies of a flooded request are not answered after the target replied"""
+        request = self._arp(1, 1, self.A, [10, 0, 0, 1], [10, 0, 0, 2])
+        self._packet_in_msg(*request)
+        self._packet_in_msg(*self._arp(2, 2, self.B, [10, 0, 0, 2], [10, 0, 0, 1], dst=self.A))
+        sent = self._packet_in_msg(*request)
+        self.assertEqual(struct.unpack("!H", sent[0][20:22])[0], OFPP_FLOOD)
+        self.assertEqual(self.conn.datapath.arp_cache.answered, 0)
+
+    def test_arp_bindings_stay_on_their_switch(self):
+        """Test a binding learned on one switch does not answer a request on another"""
+        dispatcher(self.ctrl, self.conn, *self._arp(2, 2, self.B, [10, 0, 0, 2], [10, 0, 0, 1], dst=self.A))
+        other = MagicMock()
+        body = struct.pack("!QIB3xII", 2, 256, 1, 0, 0)
+        dispatcher(self.ctrl, other, OFHeader(version=1, msg_type=OFPT_FEATURES_REPLY, length=8 + len(body), xid=1),
+                   body)
+        dispatcher(self.ctrl, other, *self._arp(1, 1, self.A, [10, 0, 0, 1], [10, 0, 0, 2]))
+        sent = [c.args[0] for c in other.send.call_args_list]
+        self.assertEqual(struct.unpack("!H", sent[-1][20:22])[0], OFPP_FLOOD)
+        self.assertIsNone(other.datapath.arp_cache.lookup(bytes([10, 0, 0, 2])))
+        self.assertEqual(other.datapath.arp_cache.answered, 0)
+
+    def test_arp_proxy_disabled(self):
+        """Test every request is flooded without an ARP cache"""
+        self.conn.datapath.arp_cache = None
+        self._packet_in_msg(*self._arp(2, 1, self.B, [10, 0, 0, 2], [10, 0, 0, 1]))
+        sent = self._packet_in_msg(*self._arp(1, 1, self.A, [10, 0, 0, 1], [10, 0, 0, 2]))
+        self.assertEqual(struct.unpack("!H", sent[0][20:22])[0], OFPP_FLOOD)
+
+    def test_batch_arp_answered(self):
+        """Test a batch answers a request for a host whose ARP came earlier in the same read"""
+        batch = [self._arp(2, 1, self.B, [10, 0, 0, 2], [10, 0, 0, 1]),
+                 self._arp(1, 1, self.A, [10, 0, 0, 1], [10, 0, 0, 2])]
+        dispatch_batch(self.ctrl, self.conn, OFPT_PACKET_IN, batch)
+        sent = [c.args[0] for c in self.conn.send.call_args_list]
+        self.assertEqual([struct.unpack("!H", m[20:22])[0] for m in sent], [OFPP_FLOOD, 1])
+        self.assertEqual(parse_ethernet(sent[1][24:]).arp.sender_ip, "10.0.0.2")
+
+    def _packet_in_msg(self, header, body):
+        self.conn.send.reset_mock()
+        dispatcher(self.ctrl, self.conn, header, body)
+        return [c.args[0] for c in self.conn.send.call_args_list]
+
+    def test_batch_latency_sampling(self):
+        """Test a batch is counted in full and timed once when it covers a sampled message"""
+        self.ctrl.metrics = Metrics(latency_sample=4)
+        packet = (1, self.A, "ff:ff:ff:ff:ff:ff", 3)
+        self._batch(packet, packet, packet)
+        self.assertEqual(self.ctrl.metrics.dispatch_to_reply(OFPT_PACKET_IN).count, 0)
+        self._batch(packet, packet, packet)
+        self.assertEqual(self.ctrl.metrics.messages[OFPT_PACKET_IN], 6)
+        self.assertEqual(self.ctrl.metrics.dispatch_to_reply(OFPT_PACKET_IN).count, 1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+
+from src.controller.pending import FlowBatchResult, OpenFlowError, PendingRequests
+from src.openflow.openflow import OFError, OFPET_FLOW_MOD_FAILED
+from src.utils.scheduler import Scheduler
+from tests.unit.helpers import FakeClock
+
+
+class TestPendingRequests(unittest.TestCase):
+    """Test cases for correlating replies and ERRORs with requests by xid"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = Scheduler(self.clock)
+        self.requests = PendingRequests(self.scheduler, timeout=5.0)
+        self.conn, self.other = object(), object()
+
+    def test_resolve(self):
+        """Test a reply resolves the future of its xid and nothing else"""
+        first = self.requests.expect(self.conn, 7)
+        second = self.requests.expect(self.conn, 8)
+        self.assertTrue(self.requests.resolve(self.conn, 7, "reply"))
+        self.assertEqual(first.result(timeout=0), "reply")
+        self.assertFalse(second.done())
+        self.assertFalse(self.requests.resolve(self.conn, 7, "again"))
+        self.assertEqual((len(self.requests), self.requests.replied), (1, 1))
+
+    def test_reply_on_other_connection(self):
+        """Test a reply with the right xid from another switch is ignored"""
+        future = self.requests.expect(self.conn, 7)
+        self.assertFalse(self.requests.resolve(self.other, 7, "reply"))
+        self.assertFalse(future.done())
+
+    def test_error(self):
+        """Test an ERROR with the request's xid fails its future"""
+        future = self.requests.expect(self.conn, 7)
+        err = OFError(OFPET_FLOW_MOD_FAILED, 0, b"")
+        self.assertTrue(self.requests.fail(self.conn, 7, err))
+        with self.assertRaises(OpenFlowError) as raised:
+            future.result(timeout=0)
+        self.assertIs(raised.exception.error, err)
+        self.assertFalse(self.requests.fail(self.conn, 9, err))
+
+    def test_timeout(self):
+        """Test a request without a reply fails once its timeout has passed"""
+        future = self.requests.expect(self.conn, 7)
+        slow = self.requests.expect(self.conn, 8, timeout=20.0)
+        self.clock.now += 5
+        self.scheduler.run_due()
+        self.assertIsInstance(future.exception(timeout=0), TimeoutError)
+        self.assertFalse(slow.done())
+        self.assertEqual((len(self.requests), self.requests.timeouts), (1, 1))
+
+    def test_answered_request_does_not_time_out(self):
+        """Test the timer of an answered request is cancelled"""
+        future = self.requests.expect(self.conn, 7)
+        self.requests.resolve(self.conn, 7, None)
+        self.clock.now += 10
+        self.scheduler.run_due()
+        self.assertIsNone(future.exception(timeout=0))
+        self.assertEqual(self.requests.timeouts, 0)
+
+    def test_connection_closed(self):
+        """Test the requests of a closed connection fail with ConnectionError"""
+        lost = [self.requests.expect(self.conn, xid) for xid in (7, 8)]
+        kept = self.requests.expect(self.other, 9)
+        self.assertEqual(self.requests.connection_closed(self.conn), 2)
+        for future in lost:
+            self.assertIsInstance(future.exception(timeout=0), ConnectionError)
+        self.assertFalse(kept.done())
+        self.assertEqual(self.requests.connection_closed(self.conn), 0)
+
+    def test_barrier_collects_errors(self):
+        """Test ERRORs for messages in front of a barrier are listed in its result"""
+        future = self.requests.expect_barrier(self.conn, 20, first_xid=10, sent=10)
+        err = OFError(OFPET_FLOW_MOD_FAILED, 1, b"")
+        self.assertTrue(self.requests.fail(self.conn, 13, err))
+        self.assertFalse(self.requests.fail(self.conn, 21, err))
+        self.assertFalse(self.requests.fail(self.other, 14, err))
+        self.clock.now += 0.25
+        self.requests.resolve(self.conn, 20, None)
+        self.assertEqual(future.result(timeout=0), FlowBatchResult(10, [(3, err)], 0.25))
+
+    def test_barrier_across_xid_wrap(self):
+        """Test an ERROR in a batch whose xids wrap past 0xffffffff is matched to its index"""
+        future = self.requests.expect_barrier(self.conn, 2, first_xid=0xfffffffd, sent=4)
+        err = OFError(OFPET_FLOW_MOD_FAILED, 1, b"")
+        self.assertTrue(self.requests.fail(self.conn, 1, err))
+        self.assertFalse(self.requests.fail(self.conn, 0xfffffffc, err))
+        self.requests.resolve(self.conn, 2, None)
+        self.assertEqual(future.result(timeout=0).failed, [(3, err)])
+
+    def test_cancelled_future(self):
+        """Test a future the waiter cancelled is dropped quietly on reply"""
+        future = self.requests.expect(self.conn, 7)
+        future.cancel()
+        self.assertTrue(self.requests.resolve(self.conn, 7, "reply"))
+        self.assertTrue(future.cancelled())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.controller.controller import Controller
+from src.controller.recording import CLOSE, DATA, OPEN, Recorder, read_recording, replay
+from tests.unit.helpers import ethernet_frame, packet_in
+
+ECHO = b'\x01\x02\x00\x08\x00\x00\x00\x09'
+FEATURES = struct.pack("!BBHIQIB3xII", 1, 6, 32, 1, 0x2a, 256, 1, 0, 0)
+
+
+class TestRecording(unittest.TestCase):
+    """Test cases for recording received messages and replaying them"""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".ofrec")
+        os.close(fd)
+        os.unlink(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _record(self, *events):
+        recorder = Recorder(self.path)
+        recorder.start()
+        for kind, conn_id, *msgs in events:
+            if kind == OPEN:
+                recorder.opened(conn_id)
+            elif kind == CLOSE:
+                recorder.closed(conn_id)
+            else:
+                recorder.data(conn_id, [memoryview(m) for m in msgs])
+        recorder.close()
+
+    def test_round_trip(self):
+        """Test records are read back in order with the messages of each read joined"""
+        self._record((OPEN, 5), (DATA, 5, ECHO, ECHO), (CLOSE, 5))
+        records = read_recording(self.path)
+        self.assertEqual([(r[1], r[2], r[3]) for r in records],
+                         [(5, OPEN, b""), (5, DATA, ECHO + ECHO), (5, CLOSE, b"")])
+
+    def test_appends_to_existing_file(self):
+        """Test a second recorder appends instead of overwriting"""
+        self._record((OPEN, 5))
+        self._record((CLOSE, 5))
+        self.assertEqual([r[2] for r in read_recording(self.path)], [OPEN, CLOSE])
+
+    def test_truncated_record_is_ignored(self):
+        """Test a record cut short by a killed writer is skipped"""
+        self._record((OPEN, 5), (DATA, 5, ECHO))
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        self.assertEqual([r[2] for r in read_recording(self.path)], [OPEN])
+
+    def test_rejects_other_files(self):
+        """Test a file without the magic is refused"""
+        with open(self.path, "wb") as f:
+            f.write(ECHO)
+        with self.assertRaises(ValueError):
+            read_recording(self.path)
+
+    def test_replay_dispatches_without_sockets(self):
+        """Test a replay dispatches every recorded message and closes its connections"""
+        a, b = b'\x02' + b'\x00' * 4 + b'\x01', b'\x02' + b'\x00' * 4 + b'\x02'
+        self._record((OPEN, 5), (DATA, 5, FEATURES, ECHO),
+                     (DATA, 5, packet_in(1, ethernet_frame(a, b)), packet_in(2, ethernet_frame(b, a))))
+        ctrl = Controller(admission_control=False)
+        with patch('sys.stdout'):
+            stats = replay(ctrl, read_recording(self.path))
+        self.assertEqual((stats.reads, stats.messages), (2, 4))
+        self.assertEqual([ctrl.metrics.messages[t] for t in (2, 6, 10)], [1, 1, 2])
+        # connections left open at the end of the recording are closed
+        self.assertEqual(ctrl.connections, {})
+        self.assertEqual(list(ctrl.datapaths.all()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
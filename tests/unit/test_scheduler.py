@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+
+from src.utils.scheduler import Scheduler
+from tests.unit.helpers import FakeClock
+
+
+class TestScheduler(unittest.TestCase):
+    """Test cases for the event loop timer heap"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = Scheduler(self.clock)
+        self.ran = []
+
+    def test_runs_due_timers_in_deadline_order(self):
+        """Test only timers due by now run, earliest first"""
+        self.scheduler.call_later(3, self.ran.append, "c")
+        self.scheduler.call_later(1, self.ran.append, "a")
+        self.scheduler.call_later(2, self.ran.append, "b")
+        self.clock.now += 2
+        self.assertEqual(self.scheduler.run_due(), 2)
+        self.assertEqual(self.ran, ["a", "b"])
+        self.assertEqual(self.scheduler.next_deadline(), 103)
+
+    def test_equal_deadlines_keep_scheduling_order(self):
+        """Test timers with the same deadline run in the order they were added"""
+        for name in "abc":
+            self.scheduler.call_at(5, self.ran.append, name)
+        self.scheduler.run_due(5)
+        self.assertEqual(self.ran, ["a", "b", "c"])
+
+    def test_cancel(self):
+        """Test a cancelled timer never runs and no longer sets the next deadline"""
+        timer = self.scheduler.call_later(1, self.ran.append, "a")
+        self.scheduler.call_later(2, self.ran.append, "b")
+        timer.cancel()
+        self.assertEqual(self.scheduler.next_deadline(), 102)
+        self.scheduler.run_due(110)
+        self.assertEqual(self.ran, ["b"])
+        self.assertIsNone(self.scheduler.next_deadline())
+
+    def test_failing_callback_does_not_stop_others(self):
+        """Test an exception in one timer is logged and the rest still run"""
+        self.scheduler.call_at(1, lambda: 1 / 0)
+        self.scheduler.call_at(2, self.ran.append, "b")
+        with patch('sys.stdout'):
+            self.assertEqual(self.scheduler.run_due(5), 2)
+        self.assertEqual(self.ran, ["b"])
+
+    def test_rescheduling_from_callback(self):
+        """Test a periodic job rescheduling itself runs once per due period"""
+        def tick():
+            self.ran.append(self.clock.now)
+            self.scheduler.call_later(1, tick)
+        self.scheduler.call_later(1, tick)
+        for _ in range(3):
+            self.clock.now += 1
+            self.scheduler.run_due()
+        self.assertEqual(self.ran, [101, 102, 103])
+        self.assertEqual(len(self.scheduler), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
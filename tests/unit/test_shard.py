@@ -0,0 +1,108 @@
+import multiprocessing
+import socket
+import struct
+import unittest
+from unittest.mock import patch
+from src.controller.shard import ShardSupervisor
+from src.utils import log
+
+
+def _msg(msg_type, xid, body=b''):
+    return struct.pack("!BBHI", 1, msg_type, 8 + len(body), xid) + body
+
+
+def _recv_until(sock, msg_type, xid=None):
+    buf = b''
+    while True:
+        while len(buf) < 8 or len(buf) < struct.unpack("!H", buf[2:4])[0]:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("closed")
+            buf += chunk
+        length = struct.unpack("!H", buf[2:4])[0]
+        t, x = buf[1], struct.unpack("!I", buf[4:8])[0]
+        buf = buf[length:]
+        if t == msg_type and (xid is None or x == xid):
+            return
+
+
+class TestShardSupervisorRouting(unittest.TestCase):
+    """Test cases for query fan-out without worker processes"""
+
+    def setUp(self):
+        self.sup = ShardSupervisor(workers=2)
+        self.workers = []
+        for _ in range(2):
+            parent_end, worker_end = multiprocessing.Pipe()
+            self.sup._pipes.append(parent_end)
+            self.workers.append(worker_end)
+
+    def test_worker_query_fans_out_to_other_workers(self):
+        """Test a worker query is asked of the other workers and answered back"""
+        asker, other = self.workers
+        asker.send(("query", 7, "02:00:00:00:00:01"))
+        self.sup.poll(1)
+        kind, qid, mac = other.recv()
+        self.assertEqual((kind, mac), ("locate", "02:00:00:00:00:01"))
+        self.assertFalse(asker.poll(0))
+        other.send(("located", qid, [(5, 3)]))
+        self.sup.poll(1)
+        self.assertEqual(asker.recv(), ("result", 7, [(5, 3)]))
+
+    def test_exited_worker_not_waited_for(self):
+        """Test a query is answered without a worker that exits before replying"""
+        asker, other = self.workers
+        answers = []
+        self.sup._fan_out("02:00:00:00:00:01", None, answers.append)
+        asker.recv()
+        kind, qid, _ = other.recv()
+        asker.send(("located", qid, [(5, 3)]))
+        other.close()
+        with patch('sys.stdout'):
+            while self.sup._queries:
+                self.sup.poll(1)
+        self.assertEqual(answers, [[(5, 3)]])
+        self.assertEqual(len(self.sup._pipes), 1)
+
+    def test_result_for_exited_worker_dropped(self):
+        """Test the answer to a worker that exited meanwhile is dropped, not raised"""
+        asker, other = self.workers
+        asker.send(("query", 7, "02:00:00:00:00:01"))
+        self.sup.poll(1)
+        _, qid, _ = other.recv()
+        asker.close()
+        other.send(("located", qid, []))
+        with patch('sys.stdout'):
+            self.sup.poll(1)
+            self.sup.poll(0)
+        self.assertEqual(self.sup._queries, {})
+        self.assertEqual(len(self.sup._pipes), 1)
+
+
+class TestShardWorkers(unittest.TestCase):
+    """Test cases for worker processes sharing a port"""
+
+    def setUp(self):
+        self.sup = ShardSupervisor(workers=2, host='127.0.0.1', port=0, log_level=log.ERROR)
+        with patch('sys.stdout'):
+            self.sup.start()
+        self.addCleanup(self.sup.stop)
+
+    def test_locate_mac_across_workers(self):
+        """Test a MAC learned on any worker's switch is found through the supervisor"""
+        sock = socket.create_connection(('127.0.0.1', self.sup.port), timeout=5)
+        self.addCleanup(sock.close)
+        _recv_until(sock, 5)
+        sock.sendall(_msg(6, 0, struct.pack("!QIB3xII", 42, 256, 1, 0, 0)))
+        frame = b'\xff' * 6 + bytes.fromhex("020000000001") + b'\x08\x00' + b'\x00' * 46
+        sock.sendall(_msg(10, 0, struct.pack("!IHHBx", 0xffffffff, len(frame), 3, 0) + frame))
+        # echo round trip: everything before it was handled
+        sock.sendall(_msg(2, 99))
+        _recv_until(sock, 3, 99)
+
+        self.assertEqual(self.sup.locate_mac("02:00:00:00:00:01"), [(42, 3)])
+        self.assertEqual(self.sup.locate_mac("02:00:00:00:00:02"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
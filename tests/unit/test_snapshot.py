@@ -0,0 +1,189 @@
+import os
+import struct
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from src.controller.connection import Connection
+from src.controller.controller import Controller
+from src.controller.snapshot import SnapshotWriter, capture, read_snapshot, restore, write_snapshot
+from src.controller.state.mac_table import mac_to_int
+from tests.unit.helpers import ethernet_frame, packet_in
+
+A = bytes.fromhex("020000000001")
+B = bytes.fromhex("020000000002")
+IP_A = bytes([10, 0, 0, 1])
+
+
+class NullSocket:
+    def fileno(self):
+        return 5
+
+    def sendmsg(self, buffers):
+        return sum(len(b) for b in buffers)
+
+    def close(self):
+        pass
+
+
+def features_reply(dpid, ports):
+    body = struct.pack("!QIB3xII", dpid, 256, 1, 0xc7, 0xfff)
+    for port_no in ports:
+        body += struct.pack("!H6s16sIIIIII", port_no, bytes([2, 0, 0, 0, dpid, port_no]),
+                            b"eth%d" % port_no, 0, 0, 0x80, 0, 0, 0)
+    return struct.pack("!BBHI", 1, 6, 8 + len(body), 1) + body
+
+
+def arp_request(mac, ip, target_ip):
+    payload = struct.pack("!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, 1, mac, ip, bytes(6), target_ip)
+    return packet_in(1, ethernet_frame(mac, b"\xff" * 6, b"\x08\x06", payload.ljust(46, b"\x00")))
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test cases for saving learned state and restoring it on restart"""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".ofsnap")
+        os.close(fd)
+        os.unlink(self.path)
+
+    def tearDown(self):
+        for path in (self.path, self.path + ".tmp"):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _controller(self, **kwargs):
+        return Controller(admission_control=False, discovery_interval=0, **kwargs)
+
+    def _connect(self, ctrl, dpid, *msgs):
+        conn = Connection(NullSocket(), ("test", dpid))
+        ctrl.connections[dpid] = conn
+        with patch("sys.stdout"):
+            for msg in (features_reply(dpid, (1, 2)),) + msgs:
+                ctrl.handle_messages(conn, conn.feed(msg))
+        return conn
+
+    def _learned(self, **kwargs):
+        """A controller that learned A on port 1, B on port 2, a flow B -> A and A's IP"""
+        ctrl = self._controller(**kwargs)
+        self._connect(ctrl, 7, packet_in(1, ethernet_frame(A, B)), packet_in(2, ethernet_frame(B, A)),
+                      arp_request(A, IP_A, bytes([10, 0, 0, 2])))
+        return ctrl
+
+    def test_round_trip(self):
+        """Test datapaths, ports, MACs, flows and ARP bindings survive a write and read"""
+        ctrl = self._learned()
+        write_snapshot(self.path, capture(ctrl))
+        snapshot = read_snapshot(self.path)
+        self.assertEqual(len(snapshot.datapaths), 1)
+        dp = snapshot.datapaths[0]
+        self.assertEqual((dp.dpid, dp.n_buffers, dp.n_tables, dp.capabilities, dp.actions),
+                         (7, 256, 1, 0xc7, 0xfff))
+        self.assertEqual(dp.ports, list(ctrl.datapaths.get(7).ports.values()))
+        macs, ports, _ = dp.macs
+        self.assertEqual(dict(zip(macs, ports)), {mac_to_int(A): 1, mac_to_int(B): 2})
+        self.assertEqual(dp.flows, ctrl.datapaths.get(7).flow_table.export())
+        self.assertEqual([ip for ip, _ in dp.arp], [IP_A])
+
+    def test_restore_keeps_learned_at(self):
+        """Test restored entries keep their learn time and expire when they would have"""
+        ctrl = self._learned()
+        snapshot = capture(ctrl)
+        write_snapshot(self.path, snapshot)
+        restarted = self._controller()
+        stats = restore(restarted, read_snapshot(self.path))
+        self.assertEqual((stats.datapaths, stats.macs, stats.flows, stats.arp), (1, 2, 1, 1))
+        table = restarted.datapaths.get(7).mac_table
+        key = table.mac_key(A)
+        self.assertEqual(table.lookup(key), 1)
+        expiry = snapshot.taken_at + table.timeout_seconds + 1
+        self.assertEqual(table.age_out(expiry), 2)
+
+    def test_stale_entries_dropped(self):
+        """Test entries that expired while the controller was down are not restored"""
+        ctrl = self._learned()
+        write_snapshot(self.path, capture(ctrl))
+        restarted = self._controller()
+        later = time.time() + 120
+        stats = restore(restarted, read_snapshot(self.path), now=later)
+        # MACs live 300s; ARP bindings 60s and the flow's idle timeout less than that
+        self.assertEqual((stats.macs, stats.stale_macs), (2, 0))
+        self.assertEqual((stats.flows, stats.stale_flows), (0, 1))
+        self.assertEqual((stats.arp, stats.stale_arp), (0, 1))
+        self.assertEqual(len(restarted.datapaths.get(7).flow_table), 0)
+
+    def test_compact_tables(self):
+        """Test the columns of compact MAC tables are restored as they were"""
+        ctrl = self._learned(compact_mac_tables=True)
+        write_snapshot(self.path, capture(ctrl))
+        restarted = self._controller(compact_mac_tables=True)
+        restore(restarted, read_snapshot(self.path))
+        table = restarted.datapaths.get(7).mac_table
+        self.assertEqual((table.lookup(mac_to_int(A)), table.lookup(mac_to_int(B))), (1, 2))
+        self.assertEqual(table.port_macs(2), {mac_to_int(B)})
+
+    def test_reconnect_keeps_restored_state(self):
+        """Test a switch reconnecting after the restart finds its MACs and flows"""
+        write_snapshot(self.path, capture(self._learned()))
+        restarted = self._controller()
+        restore(restarted, read_snapshot(self.path))
+        dp = restarted.datapaths.get(7)
+        self.assertTrue(dp.restored)
+        self.assertIsNone(dp.conn)
+        conn = self._connect(restarted, 7)
+        self.assertIs(conn.datapath, dp)
+        self.assertFalse(dp.restored)
+        self.assertEqual((len(dp.mac_table), len(dp.flow_table)), (2, 1))
+        # a later reconnect means the switch may have lost its flows
+        self._connect(restarted, 7)
+        self.assertEqual(len(dp.flow_table), 0)
+
+    def test_bad_file(self):
+        """Test a truncated or foreign file raises ValueError and is ignored on start"""
+        ctrl = self._learned()
+        write_snapshot(self.path, capture(ctrl))
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, "wb") as f:
+            f.write(data[:-30])
+        with self.assertRaises(ValueError):
+            read_snapshot(self.path)
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+        with self.assertRaises(ValueError):
+            read_snapshot(self.path)
+        restarted = self._controller()
+        with patch("sys.stdout"):
+            restarted.snapshot(self.path)
+            restarted.close()
+        self.assertEqual(len(read_snapshot(self.path).datapaths), 0)
+
+    def test_writer_thread(self):
+        """Test snapshots are written in the background and one submitted while busy is skipped"""
+        writer = SnapshotWriter(self.path)
+        snapshot = capture(self._learned())
+        self.assertTrue(writer.submit(snapshot))
+        self.assertFalse(writer.submit(snapshot))
+        writer.start()
+        writer.close()
+        self.assertEqual((writer.written, writer.skipped), (1, 1))
+        self.assertEqual(writer.last_bytes, os.path.getsize(self.path))
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_close_saves_state(self):
+        """Test closing the controller saves the state of the switches still connected"""
+        ctrl = self._learned()
+        with patch("sys.stdout"):
+            ctrl.snapshot(self.path, interval=60)
+            ctrl.close()
+        self.assertIsNone(ctrl.snapshot_writer)
+        restarted = self._controller()
+        with patch("sys.stdout"):
+            restarted.snapshot(self.path)
+            self.assertEqual(len(restarted.datapaths.get(7).mac_table), 2)
+            restarted.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
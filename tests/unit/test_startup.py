@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# modules only some features need; importing the entry point must not load them
+LAZY_MODULES = ("scapy", "http.server", "multiprocessing", "numpy")
+# generous so a loaded CI machine does not fail it; a cold start is ~0.1s
+IMPORT_BUDGET_SECONDS = 1.0
+
+
+def _import_main() -> list:
+    """Import src.main in a fresh interpreter; return [seconds, loaded lazy modules...]"""
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import src.main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(elapsed, *[m for m in {LAZY_MODULES!r} if m in sys.modules])\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return out.stdout.split()
+
+
+class TestStartup(unittest.TestCase):
+    """Import-time budget of the controller entry point"""
+
+    def test_entry_point_does_not_load_optional_modules(self):
+        """Test scapy, http.server and friends are not imported by src.main"""
+        _, *loaded = _import_main()
+        self.assertEqual(loaded, [])
+
+    def test_entry_point_import_time(self):
+        """Test importing src.main stays within the budget"""
+        elapsed, *_ = _import_main()
+        self.assertLess(float(elapsed), IMPORT_BUDGET_SECONDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
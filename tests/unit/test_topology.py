@@ -0,0 +1,167 @@
+import random
+import unittest
+
+from src.controller.state.topology import Topology
+
+A = bytes.fromhex("020000000001")
+B = bytes.fromhex("020000000002")
+
+
+def connect(topology, a, a_port, b, b_port):
+    """A cable between two switches: one link in each direction"""
+    topology.add_link(a, a_port, b, b_port)
+    topology.add_link(b, b_port, a, a_port)
+
+
+def hops(topology, src, dst):
+    """Hops from src to dst by a plain BFS, the reference for the cached trees"""
+    seen = {src: 0}
+    frontier = [src]
+    while frontier:
+        reached = []
+        for node in frontier:
+            for (dpid, _), (peer, _) in topology.links.items():
+                if dpid == node and peer not in seen:
+                    seen[peer] = seen[node] + 1
+                    reached.append(peer)
+        frontier = reached
+    return seen.get(dst)
+
+
+class TestTopology(unittest.TestCase):
+    """Test cases for the link graph and its cached next hops"""
+
+    def setUp(self):
+        # 1 - 2 - 3 line plus a longer detour 1 - 4 - 5 - 3
+        self.topology = Topology()
+        connect(self.topology, 1, 1, 2, 1)
+        connect(self.topology, 2, 2, 3, 1)
+        connect(self.topology, 1, 2, 4, 1)
+        connect(self.topology, 4, 2, 5, 1)
+        connect(self.topology, 5, 2, 3, 2)
+
+    def test_next_hop_follows_shortest_path(self):
+        """Test next hops lead over the shortest path and None for the switch itself"""
+        self.assertEqual(self.topology.next_hop(1, 3), 1)
+        self.assertEqual(self.topology.next_hop(3, 1), 1)
+        self.assertIsNone(self.topology.next_hop(3, 3))
+        self.assertIsNone(self.topology.next_hop(1, 99))
+        self.assertEqual(self.topology.path(1, 3), [(1, 1), (2, 2)])
+        self.assertEqual(self.topology.path(2, 2), [])
+
+    def test_known_link_is_not_a_change(self):
+        """Test rediscovering a link changes nothing and rebuilds no tree"""
+        self.topology.refresh()
+        built = self.topology.recomputed
+        self.assertFalse(self.topology.add_link(1, 1, 2, 1))
+        self.assertEqual(self.topology.next_hop(1, 3), 1)
+        self.assertEqual(self.topology.recomputed, built)
+
+    def test_removed_link_reroutes_affected_trees_only(self):
+        """Test removing a link rebuilds only the trees that used it"""
+        self.topology.refresh()
+        built = self.topology.recomputed
+        self.assertTrue(self.topology.remove_link(2, 2))
+        self.assertEqual(self.topology.next_hop(1, 3), 2)
+        self.assertEqual(self.topology.path(1, 3), [(1, 2), (4, 2), (5, 2)])
+        # the trees towards 3 and 5 went through 2 -> 3; 1, 2 and 4 did not
+        self.assertEqual(self.topology.recomputed - built, 2)
+
+    def test_added_link_rebuilds_only_shortened_trees(self):
+        """Test a new link rebuilds only the trees it makes shorter"""
+        self.topology.remove_link(2, 2)
+        self.topology.remove_link(3, 1)
+        self.topology.refresh()
+        built = self.topology.recomputed
+        self.assertTrue(self.topology.add_link(2, 2, 3, 1))
+        self.assertEqual(self.topology.next_hop(2, 3), 2)
+        self.assertEqual(self.topology.next_hop(1, 3), 1)
+        # only switch 2 got closer, towards 3 and towards 5 (through 3)
+        self.assertEqual(self.topology.recomputed - built, 2)
+
+    def test_remove_port_and_switch(self):
+        """Test a downed port loses both directions and a gone switch all its links"""
+        self.assertEqual(self.topology.remove_port(2, 2), 2)
+        self.assertFalse(self.topology.is_link_port(3, 1))
+        self.assertEqual(self.topology.next_hop(2, 3), 1)
+        self.assertEqual(self.topology.remove_switch(4), 4)
+        self.assertIsNone(self.topology.next_hop(1, 3))
+        self.assertNotIn(4, self.topology.switches())
+        self.assertEqual(self.topology.next_hop(1, 2), 1)
+
+    def test_recabled_port_replaces_old_link(self):
+        """Test a port seen at a new peer drops the link to the old one"""
+        self.topology.add_link(1, 1, 5, 3)
+        self.assertEqual(self.topology.links[(1, 1)], (5, 3))
+        self.assertEqual(self.topology.next_hop(1, 3), 1)
+        self.assertEqual(self.topology.path(1, 3), [(1, 1), (5, 2)])
+
+    def test_parallel_links_use_lowest_port(self):
+        """Test parallel links route over the lowest port and fail over to the other"""
+        self.topology.add_link(1, 7, 2, 7)
+        self.assertEqual(self.topology.next_hop(1, 2), 1)
+        self.topology.remove_link(1, 1)
+        self.assertEqual(self.topology.next_hop(1, 2), 7)
+
+    def test_flood_ports_span_the_ring(self):
+        """Test the spanning tree leaves one link of the ring out and follows link changes"""
+        flood = {dpid: self.topology.flood_ports(dpid) for dpid in range(1, 6)}
+        self.assertEqual(flood, {1: {1, 2}, 2: {1, 2}, 3: {1}, 4: {1, 2}, 5: {1}})
+        self.assertIsNone(self.topology.flood_ports(9))
+        self.topology.remove_link(2, 2)
+        self.topology.remove_link(3, 1)
+        self.assertEqual(self.topology.flood_ports(3), {2})
+        self.assertEqual(self.topology.flood_ports(5), {1, 2})
+
+    def test_flood_ports_join_one_way_link(self):
+        """Test a link seen in one direction only still joins its switches to the tree"""
+        topology = Topology()
+        topology.add_link(1, 1, 2, 3)
+        self.assertEqual(topology.flood_ports(1), {1})
+        self.assertEqual(topology.flood_ports(2), {3})
+
+    def test_incremental_matches_full_rebuild(self):
+        """Test random link changes give the same distances as a BFS from scratch"""
+        rng = random.Random(7)
+        cables = [(a, b) for a in range(1, 9) for b in range(a + 1, 9)]
+        topology = Topology()
+        for _ in range(200):
+            a, b = rng.choice(cables)
+            if rng.random() < 0.6:
+                connect(topology, a, b, b, a)
+            else:
+                topology.remove_port(a, b)
+            for src in range(1, 9):
+                for dst in range(1, 9):
+                    port = topology.next_hop(src, dst)
+                    expected = hops(topology, src, dst)
+                    if src == dst or expected is None:
+                        self.assertIsNone(port)
+                        continue
+                    peer = topology.links[(src, port)][0]
+                    self.assertEqual(hops(topology, peer, dst), expected - 1)
+
+    def test_hosts_on_edge_ports(self):
+        """Test host locations give the edge port or the next hop to the host's switch"""
+        self.assertIsNone(self.topology.learn_host(A, 3, 9))
+        self.assertEqual(self.topology.host_port(3, A), 9)
+        self.assertEqual(self.topology.host_port(1, A), 1)
+        self.assertIsNone(self.topology.host_port(1, B))
+        self.assertEqual(self.topology.learn_host(A, 2, 9), (3, 9))
+        self.topology.forget_host(A, 3)
+        self.assertEqual(self.topology.hosts[A], (2, 9))
+        self.topology.forget_host(A)
+        self.assertNotIn(A, self.topology.hosts)
+
+    def test_hosts_forgotten_with_their_port(self):
+        """Test hosts behind a port that turns out to be a link, goes down or leaves are forgotten"""
+        self.topology.learn_host(A, 3, 9)
+        self.topology.learn_host(B, 4, 9)
+        self.topology.add_link(3, 9, 1, 9)
+        self.assertNotIn(A, self.topology.hosts)
+        self.topology.remove_switch(4)
+        self.assertNotIn(B, self.topology.hosts)
+
+
+if __name__ == '__main__':
+    unittest.main()